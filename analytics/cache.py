@@ -0,0 +1,72 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ReportsDataVersion
+
+VERSION_PK = 1
+
+
+def get_cache():
+    return caches[getattr(settings, "ANALYTICS_CACHE_ALIAS", "default")]
+
+
+# ------------------------------- Reports data version ----------------------------------
+def get_reports_version():
+    """
+    Global version of the reports data; every cached analytics payload is keyed by it.
+    It is a DB row rather than a cache key so that workers with a per-process cache
+    (LocMemCache) see each other's writes. A missing row starts from the current time in ms,
+    so it can never fall back to a version that old entries were stored under.
+    """
+    version = ReportsDataVersion.objects.filter(pk=VERSION_PK).values_list("version", flat=True).first()
+    if version is None:
+        try:
+            with transaction.atomic():
+                ReportsDataVersion.objects.create(pk=VERSION_PK, version=int(time.time() * 1000))
+        except IntegrityError:  # created concurrently
+            pass
+        version = ReportsDataVersion.objects.values_list("version", flat=True).get(pk=VERSION_PK)
+    return version
+
+
+def bump_reports_version():
+    """
+    Invalidate every cached analytics payload. Called in the transaction that writes reports:
+    other workers see the new version when they see the new data, at commit.
+    """
+    if not ReportsDataVersion.objects.filter(pk=VERSION_PK).update(version=F("version") + 1):
+        get_reports_version()
+
+
+# ------------------------------- Cached payloads ---------------------------------------
+def role_class(user):
+    """Cache partition for a user: their role when active, 'public' otherwise."""
+    if user.is_authenticated and user.status == 'active':
+        return user.role
+    return "public"
+
+
+def make_key(endpoint, params, role, version):
+    raw = json.dumps([endpoint, params, role], sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"analytics:{version}:{endpoint}:{digest}"
+
+
+def cached_payload(endpoint, params, role, compute):
+    """
+    Return compute() for (endpoint, params, role) under the current data version,
+    reusing a previously cached result when there is one.
+    """
+    cache = get_cache()
+    key = make_key(endpoint, params, role, get_reports_version())
+    payload = cache.get(key)
+    if payload is None:
+        payload = compute()
+        cache.set(key, payload, timeout=getattr(settings, "ANALYTICS_CACHE_TIMEOUT", 300))
+    return payload
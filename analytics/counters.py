@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from reports.models import Report
+from .models import ReportStatusCounter
+
+# Report columns needed to pick a status counter
+STATUS_SOURCE_COLS = ["status"]
+
+
+def status_key(status):
+    return str(status).strip() if status is not None else None
+
+
+def apply_status_delta(key, delta):
+    if not delta or key is None:
+        return
+    with transaction.atomic():
+        counter, _ = ReportStatusCounter.objects.get_or_create(status=key)
+        # update() skips auto_now: set it here, it is the public stats' Last-Modified
+        ReportStatusCounter.objects.filter(pk=counter.pk).update(count=F("count") + delta, updated_at=timezone.now())
+
+
+def apply_status_deltas(deltas):
+    # A handful of statuses: one UPDATE each
+    for key, delta in deltas.items():
+        apply_status_delta(key, delta)
+
+
+def rebuild_status_counters():
+    """Recompute every status counter from the Report table."""
+    totals = {}
+    for status, n in Report.objects.order_by().values_list("status").annotate(n=Count("pk")):
+        totals[status_key(status)] = totals.get(status_key(status), 0) + n
+    with transaction.atomic():
+        ReportStatusCounter.objects.exclude(status__in=totals).exclude(count=0).update(count=0, updated_at=timezone.now())
+        for status, n in totals.items():
+            ReportStatusCounter.objects.update_or_create(status=status, defaults={"count": n})
+    return len(totals)
+
+
+def get_status_counts(statuses):
+    """({status: count}, last change time) read from the counters, one small query."""
+    rows = list(ReportStatusCounter.objects.filter(status__in=statuses).values_list("status", "count", "updated_at"))
+    counts = {status: 0 for status in statuses}
+    counts.update({status: n for status, n, _ in rows})
+    last_modified = max((updated for _, _, updated in rows), default=None)
+    return counts, last_modified
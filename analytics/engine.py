@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, Trim
+
+from reports.models import Report
+from .models import ReportDailyRollup, ReportLocationRollup
+from .heatmap import get_heatmap_cells
+from .snapshot import get_snapshot_dataframe
+from .utils import (
+    MONTH_AR, MONTH_ORDER,
+    get_db_reports_dataframe, get_rollup_dataframe, get_created_rollup_dataframe, filter_dataframe,
+    get_kpis, get_charts, compute_recent_kpis, compute_recent_charts,
+)
+
+SOLVED_STATUS = "تم الحل"
+
+BACKENDS = ("rollup", "orm", "snapshot", "pandas")
+# Snapshot columns each dashboard reads, with filter_dataframe (heatmaps come from the cells)
+CLASSIC_COLS = ["location", "incident_date", "report_type", "status"]
+RECENT_COLS = ["location", "incident_date", "status", "severity", "created_at"]
+
+
+# ------------------------------- Queryset aggregation engine ---------------------------------
+class QuerysetAggregationEngine:
+    """
+    Runs the classic dashboard aggregations as SQL GROUP BY queries.
+    `weight` is the aggregate that turns a group into a number of reports:
+    Count('pk') over Report rows, Sum('count') over rollup rows.
+    `locations` is where per-location counts come from (default: `queryset`).
+    Output matches get_kpis / get_charts on the equivalent DataFrame.
+    """
+
+    def __init__(self, queryset, weight, locations=None):
+        self.queryset = queryset
+        self.weight = weight
+        self.locations = queryset if locations is None else locations
+
+    @classmethod
+    def for_reports(cls, year=None, location=None):
+        return cls(Report.objects.all(), Count("pk")).filter(year=year, location=location)
+
+    @classmethod
+    def for_rollups(cls, year=None):
+        """Over the rollups, which have no location: location filters go through for_reports."""
+        qs = ReportDailyRollup.objects.filter(count__gt=0)
+        locations = ReportLocationRollup.objects.filter(count__gt=0)
+        if year:
+            qs = qs.filter(incident_date__year=int(year))
+            locations = locations.filter(year=int(year))
+        return cls(qs, Sum("count"), locations)
+
+    def filter(self, year=None, location=None):
+        qs = self.queryset
+        if year:
+            qs = qs.filter(incident_date__year=int(year))
+        if location:
+            qs = qs.filter(location__icontains=location)
+        return type(self)(qs, self.weight)
+
+    # --- primitives ---
+    def total(self):
+        return self.queryset.aggregate(n=self.weight)["n"] or 0
+
+    def value_counts(self, field, queryset=None):
+        """{value: count} sorted by count descending, like Series.value_counts().to_dict()."""
+        rows = (
+            (self.queryset if queryset is None else queryset).order_by()
+            .annotate(key=Trim(field))
+            .values("key")
+            .annotate(n=self.weight)
+            .filter(n__gt=0)
+            .order_by("-n")
+            .values_list("key", "n")
+        )
+        return {key: n for key, n in rows}
+
+    def month_counts(self):
+        rows = (
+            self.queryset.order_by()
+            .annotate(month_num=ExtractMonth("incident_date"))
+            .values("month_num")
+            .annotate(n=self.weight)
+            .values_list("month_num", "n")
+        )
+        counts = {MONTH_AR[month]: n for month, n in rows}
+        return {month: counts.get(month, 0) for month in MONTH_ORDER}
+
+    # --- dashboard blocks ---
+    def kpis(self):
+        total = self.total()
+        if not total:
+            return {
+                "total_reports": 0,
+                "top_report_type": None,
+                "solved_percentage": 0,
+                "top_region": None,
+            }
+
+        solved = self.queryset.filter(status=SOLVED_STATUS).aggregate(n=self.weight)["n"] or 0
+        return {
+            "total_reports": total,
+            "top_report_type": next(iter(self.value_counts("report_type"))),
+            "solved_percentage": solved / total * 100,
+            "top_region": next(iter(self.value_counts("location", self.locations))),
+        }
+
+    def charts(self, heatmap=None):
+        if not self.total():
+            return {"monthly_reports": {}, "report_type_distribution": {}, "case_status_distribution": {}, "heatmap": []}
+
+        return {
+            "monthly_reports": self.month_counts(),
+            "report_type_distribution": self.value_counts("report_type"),
+            "case_status_distribution": self.value_counts("status"),
+            "heatmap": heatmap if heatmap is not None else [],
+        }
+
+
+# ------------------------------- Backend selection ---------------------------------------
+def get_backend():
+    backend = getattr(settings, "ANALYTICS_BACKEND", "rollup")
+    return backend if backend in BACKENDS else "rollup"
+
+
+def _reports_dataframe(backend, year, location, columns=None):
+    df = get_snapshot_dataframe(columns=columns) if backend == "snapshot" else get_db_reports_dataframe()
+    return filter_dataframe(df, year=year, location=location)
+
+
+def classic_dashboard(year=None, location=None, backend=None):
+    """
+    KPIs and charts for the classic dashboard.
+    - rollup: SQL GROUP BY over the daily rollups (default; orm when filtering by location)
+    - orm: SQL GROUP BY over the reports table
+    - snapshot: pandas over the memory-mapped columnar snapshot
+    - pandas: load every report into a DataFrame (legacy fallback)
+    """
+    backend = backend or get_backend()
+    if backend == "pandas":
+        df = _reports_dataframe(backend, year, location)
+        return get_kpis(df), get_charts(df)
+    if backend == "snapshot":
+        df = _reports_dataframe(backend, year, location, CLASSIC_COLS)
+        return get_kpis(df), get_charts(df, heatmap=get_heatmap_cells(year=year, location=location))
+
+    if backend == "orm" or location:
+        engine = QuerysetAggregationEngine.for_reports(year=year, location=location)
+    else:
+        engine = QuerysetAggregationEngine.for_rollups(year=year)
+    return engine.kpis(), engine.charts(heatmap=get_heatmap_cells(year=year, location=location))
+
+
+def _report_queryset(year, location):
+    qs = Report.objects.filter(location__icontains=location)
+    return qs.filter(incident_date__year=int(year)) if year else qs
+
+
+def recent_dashboard(year=None, location=None, period="daily", backend=None):
+    """
+    KPIs and charts for the recent dashboard: rollup frames unless a DataFrame backend is
+    selected. The rollups have no location, so location filters load the matching reports.
+    """
+    backend = backend or get_backend()
+    if backend == "pandas":
+        df = _reports_dataframe(backend, year, location)
+        return compute_recent_kpis(df), compute_recent_charts(df, period)
+
+    heatmap = get_heatmap_cells(year=year, location=location)
+    if backend == "snapshot":
+        df = _reports_dataframe(backend, year, location, RECENT_COLS)
+    elif location:
+        df = get_db_reports_dataframe(queryset=_report_queryset(year, location))
+    else:
+        df = get_rollup_dataframe(year=year)
+        charts_df = get_created_rollup_dataframe(year=year) if period == "daily" else df
+        return compute_recent_kpis(df), compute_recent_charts(charts_df, period, heatmap=heatmap)
+    return compute_recent_kpis(df), compute_recent_charts(df, period, heatmap=heatmap)
@@ -0,0 +1,159 @@
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast, Floor
+
+from reports.models import Report
+from .models import HeatmapCell
+from .rollups import _as_date, apply_bulk_deltas
+
+# Report columns needed to place a report in a heatmap cell
+HEATMAP_SOURCE_COLS = ["latitude", "longitude", "incident_date"]
+
+# Cells per map tile side: a 256px tile shows 8 x 8 cells (~32px each)
+CELLS_PER_TILE_BITS = 3
+
+
+def max_zoom():
+    return getattr(settings, "ANALYTICS_HEATMAP_MAX_ZOOM", 14)
+
+
+def default_zoom():
+    return getattr(settings, "ANALYTICS_HEATMAP_DEFAULT_ZOOM", 6)
+
+
+def cell_size(zoom):
+    """Cell edge in degrees at a zoom level (slippy-map zoom numbering)."""
+    return 360.0 / (2 ** (zoom + CELLS_PER_TILE_BITS))
+
+
+def clamp_zoom(zoom):
+    return max(0, min(int(zoom), max_zoom()))
+
+
+def _cell_index(value, offset, size):
+    # x counts from -180 lon, y from -90 lat, so indexes are never negative
+    limit = int(2 * offset / size) - 1
+    return min(max(int(math.floor((value + offset) / size)), 0), limit)
+
+
+def cell_key(latitude, longitude, incident_date):
+    """(year, x, y) of the finest cell holding a report, or None without coordinates."""
+    if latitude is None or longitude is None or incident_date is None:
+        return None
+    size = cell_size(max_zoom())
+    return (
+        _as_date(incident_date).year,
+        _cell_index(float(longitude), 180, size),
+        _cell_index(float(latitude), 90, size),
+    )
+
+
+def apply_cell_delta(key, delta):
+    if not delta or key is None:
+        return
+    year, x, y = key
+    with transaction.atomic():
+        cell, _ = HeatmapCell.objects.get_or_create(year=year, x=x, y=y)
+        HeatmapCell.objects.filter(pk=cell.pk).update(count=F("count") + delta)
+        if delta < 0:
+            HeatmapCell.objects.filter(pk=cell.pk, count__lte=0).delete()
+
+
+def apply_cell_deltas(deltas):
+    """Apply a {(year, x, y): delta} mapping (e.g. from a batch of reports)."""
+    apply_bulk_deltas(HeatmapCell, ["year", "x", "y"], deltas, apply_cell_delta, narrow_by=1)
+
+
+def rebuild_heatmap(chunk_size=2000):
+    """Recompute the whole cell index from the Report table. Returns the number of cells."""
+    counts = Counter()
+    qs = Report.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for values in qs.values_list(*HEATMAP_SOURCE_COLS).order_by().iterator(chunk_size=chunk_size):
+        counts[cell_key(*values)] += 1
+
+    with transaction.atomic():
+        HeatmapCell.objects.all().delete()
+        HeatmapCell.objects.bulk_create(
+            [HeatmapCell(year=year, x=x, y=y, count=n) for (year, x, y), n in counts.items()],
+            batch_size=chunk_size,
+        )
+    return len(counts)
+
+
+# ------------------------------- Queries ------------------------------------------------
+def parse_bbox(value):
+    """'minLon,minLat,maxLon,maxLat' -> tuple of floats (ValueError if malformed)."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox min values must not exceed max values")
+    return (max(min_lon, -180.0), max(min_lat, -90.0), min(max_lon, 180.0), min(max_lat, 90.0))
+
+
+def _cells_payload(rows, zoom):
+    size = cell_size(zoom)
+    return [
+        {
+            "latitude": round((int(cy) + 0.5) * size - 90, 6),
+            "longitude": round((int(cx) + 0.5) * size - 180, 6),
+            "count": n,
+        }
+        for cx, cy, n in rows
+    ]
+
+
+def get_heatmap_cells(zoom=None, bbox=None, year=None, location=None):
+    """
+    Aggregated heatmap cells [{latitude, longitude, count}] for a viewport.
+    The number of cells is bounded by the viewport size at `zoom`, whatever the report count.
+    Location filters cannot use the cell index and are binned from the reports table instead.
+    """
+    zoom = clamp_zoom(default_zoom() if zoom is None else zoom)
+    if location:
+        return _cells_payload(_bin_reports(zoom, bbox, year, location), zoom)
+
+    shift = 2 ** (max_zoom() - zoom)
+    fine = cell_size(max_zoom())
+    qs = HeatmapCell.objects.filter(count__gt=0)
+    if year:
+        qs = qs.filter(year=int(year))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        qs = qs.filter(
+            x__gte=_cell_index(min_lon, 180, fine), x__lte=_cell_index(max_lon, 180, fine),
+            y__gte=_cell_index(min_lat, 90, fine), y__lte=_cell_index(max_lat, 90, fine),
+        )
+    rows = (
+        qs.order_by()
+        .annotate(cx=F("x") / shift, cy=F("y") / shift)
+        .values("cx", "cy")
+        .annotate(n=Sum("count"))
+        .values_list("cx", "cy", "n")
+    )
+    return _cells_payload(rows, zoom)
+
+
+def _bin_reports(zoom, bbox, year, location):
+    size = cell_size(zoom)
+    qs = Report.objects.filter(latitude__isnull=False, longitude__isnull=False, location__icontains=location)
+    if year:
+        qs = qs.filter(incident_date__year=int(year))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        qs = qs.filter(longitude__gte=min_lon, longitude__lte=max_lon, latitude__gte=min_lat, latitude__lte=max_lat)
+    return (
+        qs.order_by()
+        .annotate(
+            cx=Floor((Cast("longitude", FloatField()) + 180.0) / size),
+            cy=Floor((Cast("latitude", FloatField()) + 90.0) / size),
+        )
+        .values("cx", "cy")
+        .annotate(n=Count("pk"))
+        .values_list("cx", "cy", "n")
+    )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.snapshot import build_snapshot, refresh_snapshot, verify_snapshot, load_snapshot
+
+
+class Command(BaseCommand):
+    help = "Build, incrementally refresh or verify the columnar analytics snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["build", "refresh", "verify"])
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Reports fetched per DB round trip.")
+
+    def handle(self, *args, **options):
+        action, chunk_size = options["action"], options["chunk_size"]
+        started = time.perf_counter()
+
+        if action == "verify":
+            problems = verify_snapshot(chunk_size=chunk_size)
+            if problems:
+                raise CommandError("Snapshot does not match the database:\n" + "\n".join(problems))
+            snap = load_snapshot()
+            self.stdout.write(self.style.SUCCESS(f"Snapshot {snap.generation} matches the database ({len(snap)} rows)."))
+            return
+
+        if action == "build":
+            meta = build_snapshot(chunk_size=chunk_size)
+        else:
+            meta = refresh_snapshot(chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        if meta is None:
+            self.stdout.write("Snapshot already up to date.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Snapshot {action} done: {meta['rows']} rows, max id {meta['max_id']} ({elapsed:.2f}s)."
+            ))
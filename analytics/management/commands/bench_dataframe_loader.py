@@ -0,0 +1,65 @@
+import time
+import tracemalloc
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytics.synthetic import generate_reports
+from analytics.utils import EXPECTED_COLS, clean_reports_dataframe, get_db_reports_dataframe
+from reports.models import Report
+
+
+class _Rollback(Exception):
+    pass
+
+
+def list_reports_dataframe():
+    """
+    Previous get_db_reports_dataframe (every row materialised as a dict), kept as the
+    reference (analytics.tests.DataFrameLoaderTests checks both give the same frame).
+    """
+    qs = Report.objects.values(*EXPECTED_COLS)
+    df = pd.DataFrame(list(qs), columns=EXPECTED_COLS)
+    return clean_reports_dataframe(df)
+
+
+def _measure(loader):
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = loader()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory and time of the list-based and chunked categorical report loaders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=0,
+                            help="Load N synthetic reports inside a rolled-back transaction.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["rows"]:
+                    generate_reports(options["rows"], seed=options["seed"])
+                self._bench(options["chunk_size"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _bench(self, chunk_size):
+        results = {
+            "list": _measure(list_reports_dataframe),
+            "chunked": _measure(lambda: get_db_reports_dataframe(chunk_size=chunk_size)),
+        }
+        for name, (df, elapsed, peak) in results.items():
+            frame_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+            self.stdout.write(
+                f"{name:8} rows={len(df)} time={elapsed:.3f}s peak={peak / 2 ** 20:.1f}MB frame={frame_mb:.1f}MB"
+            )
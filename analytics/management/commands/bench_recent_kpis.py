@@ -0,0 +1,111 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.utils import compute_recent_kpis
+from reports.models import CASE_STATUS, SEVERITY
+
+
+def masked_recent_kpis(df):
+    """
+    Previous compute_recent_kpis (one boolean mask per figure), kept as the reference
+    (analytics.tests.RecentKpiTests checks both give the same KPIs).
+    """
+    if df.empty:
+        return {
+            "total_reports": {"value": 0, "change": 0, "trend": "لا تغيير"},
+            "new_reports": {"value": 0, "change": 0, "trend": "لا تغيير"},
+            "under_review": {"value": 0, "change": 0, "trend": "لا تغيير"},
+            "critical_reports": {"value": 0, "change": 0, "trend": "لا تغيير"},
+        }
+
+    today = df['incident_date'].max().normalize()
+    four_months_ago = today - pd.DateOffset(months=4)
+    four_months_before_that = four_months_ago - pd.DateOffset(months=4)
+    yesterday = today - timedelta(days=1)
+
+    def calc_change(current, previous):
+        if previous == 0:
+            return (0, "لا تغيير") if current == 0 else (100, "زيادة")
+        change = ((current - previous) / previous) * 100
+        trend = "زيادة" if change > 0 else "انخفاض" if change < 0 else "لا تغيير"
+        return round(abs(change), 2), trend
+
+    total_reports_value = len(df)
+    recent_4m = len(df[df['incident_date'] >= four_months_ago])
+    prev_4m = len(df[(df['incident_date'] >= four_months_before_that) & (df['incident_date'] < four_months_ago)])
+    total_change, total_trend = calc_change(recent_4m, prev_4m)
+
+    new_reports_value = len(df[df['status'] == "تم استلام البلاغ"])
+    new_prev = len(df[df['incident_date'].dt.date == yesterday.date()])
+    new_change, new_trend = calc_change(new_reports_value, new_prev)
+
+    under_review_value = len(df[df['status'] == "قيد المراجعة"])
+    under_recent = len(df[(df['status'] == "قيد المراجعة") & (df['incident_date'] >= four_months_ago)])
+    under_prev = len(df[(df['status'] == "قيد المراجعة") & (df['incident_date'] >= four_months_before_that) & (df['incident_date'] < four_months_ago)])
+    under_change, under_trend = calc_change(under_recent, under_prev)
+
+    critical_value = len(df[df['severity'] == "حرج"])
+    critical_recent = len(df[(df['severity'] == "حرج") & (df['incident_date'].dt.date == today.date())])
+    critical_prev = len(df[(df['severity'] == "حرج") & (df['incident_date'].dt.date == yesterday.date())])
+    critical_change, critical_trend = calc_change(critical_recent, critical_prev)
+
+    return {
+        "total_reports": {"value": total_reports_value, "change": total_change, "trend": total_trend},
+        "new_reports": {"value": new_reports_value, "change": new_change, "trend": new_trend},
+        "under_review": {"value": under_review_value, "change": under_change, "trend": under_trend},
+        "critical_reports": {"value": critical_value, "change": critical_change, "trend": critical_trend},
+    }
+
+
+def synthetic_frame(rows, seed=0, categorical=False):
+    """Reports-like frame: ~2 years of incident dates, real status / severity values."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-01")
+    statuses = np.array([value for value, _ in CASE_STATUS], dtype=object)
+    severities = np.array([value for value, _ in SEVERITY] + [None], dtype=object)
+    df = pd.DataFrame({
+        "incident_date": pd.to_datetime(start + rng.integers(0, 730, rows).astype("timedelta64[D]")),
+        "status": statuses[rng.integers(0, len(statuses), rows)],
+        "severity": severities[rng.integers(0, len(severities), rows)],
+    })
+    if categorical:
+        df["status"] = pd.Categorical(df["status"], categories=list(statuses))
+        df["severity"] = pd.Categorical(df["severity"], categories=[s for s in severities if s])
+    return df
+
+
+def best_of(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = "Benchmark compute_recent_kpis against the previous mask-based version on synthetic rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>10} {'dtype':>12} {'masks (ms)':>12} {'single-pass (ms)':>17} {'speedup':>8}")
+        for rows in options["rows"]:
+            for categorical in (False, True):
+                df = synthetic_frame(rows, seed=options["seed"], categorical=categorical)
+                old_time, expected = best_of(masked_recent_kpis, df, options["repeat"])
+                new_time, actual = best_of(compute_recent_kpis, df, options["repeat"])
+                if actual != expected:
+                    raise CommandError(f"Output differs at {rows} rows:\n{expected}\n{actual}")
+                self.stdout.write(
+                    f"{rows:>10} {'categorical' if categorical else 'object':>12} "
+                    f"{old_time * 1000:>12.1f} {new_time * 1000:>17.1f} {old_time / new_time:>7.1f}x"
+                )
+        self.stdout.write(self.style.SUCCESS("Outputs identical."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from analytics.cache import bump_reports_version
+from analytics.counters import rebuild_status_counters
+from analytics.heatmap import rebuild_heatmap
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day analytics rollups, heatmap cell index and status counters from all reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Reports fetched per DB round trip.")
+
+    def handle(self, *args, **options):
+        seen, rows = rebuild_rollups(chunk_size=options["chunk_size"])
+        cells = rebuild_heatmap(chunk_size=options["chunk_size"])
+        rebuild_status_counters()
+        bump_reports_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows and {cells} heatmap cells from {seen} reports."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('incident_date', models.DateField()),
+                ('created_date', models.DateField()),
+                ('report_type', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('severity', models.CharField(blank=True, default='', max_length=20)),
+                ('location', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['incident_date'], name='analytics_r_inciden_2ee559_idx'), models.Index(fields=['created_date'], name='analytics_r_created_4d0f35_idx')],
+                'constraints': [models.UniqueConstraint(fields=('incident_date', 'created_date', 'report_type', 'status', 'severity', 'location'), name='unique_report_daily_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeatmapCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['x', 'y'], name='analytics_h_x_2cfedf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('year', 'x', 'y'), name='unique_heatmap_cell')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:30
+
+from django.db import migrations, models
+
+
+def clear_daily_rollups(apps, schema_editor):
+    # Rows of the wider key would collide under the narrower one; they are rebuilt from reports
+    apps.get_model('analytics', 'ReportDailyRollup').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_reportstatuscounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_daily_rollups, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ReportCreatedRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateField()),
+                ('incident_year', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReportLocationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('location', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='reportdailyrollup',
+            name='unique_report_daily_rollup_key',
+        ),
+        migrations.RemoveIndex(
+            model_name='reportdailyrollup',
+            name='analytics_r_created_4d0f35_idx',
+        ),
+        migrations.RemoveField(
+            model_name='reportdailyrollup',
+            name='created_date',
+        ),
+        migrations.RemoveField(
+            model_name='reportdailyrollup',
+            name='location',
+        ),
+        migrations.AddConstraint(
+            model_name='reportdailyrollup',
+            constraint=models.UniqueConstraint(fields=('incident_date', 'report_type', 'status', 'severity'), name='unique_report_daily_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportcreatedrollup',
+            constraint=models.UniqueConstraint(fields=('created_date', 'incident_year', 'status'), name='unique_report_created_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportlocationrollup',
+            constraint=models.UniqueConstraint(fields=('year', 'location'), name='unique_report_location_rollup_key'),
+        ),
+    ]
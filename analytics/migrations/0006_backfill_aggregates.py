@@ -0,0 +1,66 @@
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+# The aggregation is inlined against the historical models: analytics.rollups, heatmap and
+# counters follow the current models, which later migrations may change.
+CELLS_PER_TILE_BITS = 3
+BATCH_SIZE = 2000
+
+
+def _cell_index(value, offset, size):
+    limit = int(2 * offset / size) - 1
+    return min(max(int(math.floor((value + offset) / size)), 0), limit)
+
+
+def backfill_aggregates(apps, schema_editor):
+    Report = apps.get_model("reports", "Report")
+    models = {
+        name: apps.get_model("analytics", name)
+        for name in ("ReportDailyRollup", "ReportCreatedRollup", "ReportLocationRollup", "HeatmapCell", "ReportStatusCounter")
+    }
+    tz = timezone.get_current_timezone()
+    size = 360.0 / (2 ** (getattr(settings, "ANALYTICS_HEATMAP_MAX_ZOOM", 14) + CELLS_PER_TILE_BITS))
+
+    daily, created, locations, cells, statuses = Counter(), Counter(), Counter(), Counter(), Counter()
+    rows = Report.objects.order_by().values_list(
+        "incident_date", "report_type", "status", "severity", "created_at", "location", "latitude", "longitude",
+    )
+    for incident_date, report_type, status, severity, created_at, location, latitude, longitude in rows.iterator(chunk_size=BATCH_SIZE):
+        status = str(status).strip()
+        daily[incident_date, str(report_type).strip(), status, severity or ""] += 1
+        created[timezone.localtime(created_at, tz).date(), incident_date.year, status] += 1
+        locations[incident_date.year, str(location).strip()] += 1
+        if latitude is not None and longitude is not None:
+            cells[incident_date.year, _cell_index(float(longitude), 180, size), _cell_index(float(latitude), 90, size)] += 1
+        statuses[(status,)] += 1
+
+    for name, key_fields, counts in [
+        ("ReportDailyRollup", ["incident_date", "report_type", "status", "severity"], daily),
+        ("ReportCreatedRollup", ["created_date", "incident_year", "status"], created),
+        ("ReportLocationRollup", ["year", "location"], locations),
+        ("HeatmapCell", ["year", "x", "y"], cells),
+        ("ReportStatusCounter", ["status"], statuses),
+    ]:
+        model = models[name]
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            [model(count=n, **dict(zip(key_fields, key))) for key, n in counts.items()],
+            batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+    """Fill the rollups, heatmap cells and status counters from the reports already stored."""
+
+    dependencies = [
+        ('analytics', '0005_narrow_rollups'),
+        ('reports', '0008_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
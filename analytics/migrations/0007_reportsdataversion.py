@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_backfill_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportsDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -1,3 +1,117 @@
 from django.db import models
 
-# Create your models here.
+
+# Per-day report counts, maintained incrementally from Report writes (see analytics.rollups).
+# Each rollup keeps only the dimensions its dashboard blocks group by, so its size grows with
+# the number of days rather than the number of reports.
+class ReportDailyRollup(models.Model):
+    """How many reports share one (incident day, type, status, severity)."""
+    incident_date = models.DateField()
+    report_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    severity = models.CharField(max_length=20, blank=True, default="")  # "" => no severity yet
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["incident_date", "report_type", "status", "severity"],
+                name="unique_report_daily_rollup_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["incident_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.incident_date} {self.report_type} {self.status}: {self.count}"
+
+
+class ReportCreatedRollup(models.Model):
+    """
+    How many reports share one (creation day, incident year, status), for the daily chart.
+    created_date is the calendar day of Report.created_at in the TIME_ZONE setting.
+    """
+    created_date = models.DateField()
+    incident_year = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["created_date", "incident_year", "status"], name="unique_report_created_rollup_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.created_date} {self.status}: {self.count}"
+
+
+class ReportLocationRollup(models.Model):
+    """How many reports per (incident year, location), for the top region."""
+    year = models.PositiveSmallIntegerField()
+    location = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["year", "location"], name="unique_report_location_rollup_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.year} {self.location}: {self.count}"
+
+
+# Report counts per heatmap grid cell, maintained incrementally from Report writes
+class HeatmapCell(models.Model):
+    """
+    Finest-resolution grid cell (see analytics.heatmap) for one incident year.
+    Coarser zoom levels are derived at query time by integer-dividing x / y.
+    """
+    year = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["year", "x", "y"], name="unique_heatmap_cell"),
+        ]
+        indexes = [
+            models.Index(fields=["x", "y"]),
+        ]
+
+    def __str__(self):
+        return f"{self.year} ({self.x}, {self.y}): {self.count}"
+
+
+# Journal of changed reports, consumed by the columnar snapshot refresh
+class ReportChange(models.Model):
+    """
+    A report that was updated or deleted after insertion (new rows are found by id).
+    report_id NULL means a bulk change without ids: the next refresh rebuilds everything.
+    """
+    report_id = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} report {self.report_id}"
+
+
+# Running number of reports per status (public site stats)
+class ReportStatusCounter(models.Model):
+    status = models.CharField(max_length=20, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+
+# Version of the reports data that cached analytics payloads are keyed by (see analytics.cache).
+# In the DB, so a write in one worker process invalidates the payloads cached by all of them.
+class ReportsDataVersion(models.Model):
+    """Single row (pk=1), bumped in every transaction that writes reports."""
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,159 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from reports.models import Report
+from .models import ReportCreatedRollup, ReportDailyRollup, ReportLocationRollup
+
+# Report columns needed to compute each rollup key, and the rollup fields in key order
+ROLLUP_SOURCE_COLS = ["incident_date", "report_type", "status", "severity"]
+ROLLUP_KEY_FIELDS = ["incident_date", "report_type", "status", "severity"]
+CREATED_SOURCE_COLS = ["created_at", "incident_date", "status"]
+CREATED_KEY_FIELDS = ["created_date", "incident_year", "status"]
+LOCATION_SOURCE_COLS = ["incident_date", "location"]
+LOCATION_KEY_FIELDS = ["year", "location"]
+
+
+def _text(value):
+    # Same normalisation as clean_reports_dataframe (astype(str).str.strip())
+    return str(value).strip()
+
+
+def _as_date(value):
+    # Instances built in Python may still hold a datetime / ISO string
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def rollup_key(incident_date, report_type, status, severity):
+    """Build the ReportDailyRollup lookup for one report's values."""
+    return (_as_date(incident_date), _text(report_type), _text(status), severity or "")
+
+
+def created_rollup_key(created_at, incident_date, status):
+    """Build the ReportCreatedRollup lookup for one report's values."""
+    if created_at is None:
+        created_at = timezone.now()
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at, dt_timezone.utc)
+    # Calendar day in the current time zone (TIME_ZONE), like the daily chart's buckets
+    return (timezone.localtime(created_at).date(), _as_date(incident_date).year, _text(status))
+
+
+def location_rollup_key(incident_date, location):
+    """Build the ReportLocationRollup lookup for one report's values."""
+    return (_as_date(incident_date).year, _text(location))
+
+
+def _apply_delta(model, key_fields, key, delta):
+    """Add delta (+1 / -1 / +n) to the `model` row for key."""
+    if not delta or key is None:
+        return
+    with transaction.atomic():
+        row, _ = model.objects.get_or_create(**dict(zip(key_fields, key)))
+        model.objects.filter(pk=row.pk).update(count=F("count") + delta)
+        if delta < 0:
+            model.objects.filter(pk=row.pk, count__lte=0).delete()
+
+
+def apply_bulk_deltas(model, key_fields, deltas, apply_one, narrow_by=0, batch_size=500):
+    """
+    Add {key: delta} to the `count` of `model` rows in a few set-based queries:
+    missing rows are inserted with count 0 (ignore_conflicts), their ids are read back
+    through the indexed key field `key_fields[narrow_by]`, then one UPDATE count = count + d
+    runs per distinct delta. Rows brought down to 0 are deleted. A negative delta for a key
+    without a row (aggregates out of step) goes through `apply_one`.
+    """
+    deltas = {key: d for key, d in deltas.items() if key is not None and d}
+    if not deltas:
+        return
+
+    field = key_fields[narrow_by]
+    narrow = sorted({key[narrow_by] for key in deltas})
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key, d in deltas.items() if d > 0],
+            ignore_conflicts=True, batch_size=batch_size,
+        )
+        ids = {}
+        for start in range(0, len(narrow), batch_size):
+            rows = model.objects.filter(**{f"{field}__in": narrow[start:start + batch_size]}).values_list("pk", *key_fields)
+            ids.update({tuple(row[1:]): row[0] for row in rows})
+
+        by_delta = defaultdict(list)
+        for key, d in deltas.items():
+            if key in ids:
+                by_delta[d].append(ids[key])
+            else:
+                apply_one(key, d)
+        for d, pks in by_delta.items():
+            for start in range(0, len(pks), batch_size):
+                model.objects.filter(pk__in=pks[start:start + batch_size]).update(count=F("count") + d)
+                if d < 0:
+                    model.objects.filter(pk__in=pks[start:start + batch_size], count__lte=0).delete()
+
+
+def apply_rollup_delta(key, delta):
+    _apply_delta(ReportDailyRollup, ROLLUP_KEY_FIELDS, key, delta)
+
+
+def apply_rollup_deltas(deltas):
+    """Apply a {key: delta} mapping (e.g. from a batch of reports)."""
+    apply_bulk_deltas(ReportDailyRollup, ROLLUP_KEY_FIELDS, deltas, apply_rollup_delta)
+
+
+def apply_created_delta(key, delta):
+    _apply_delta(ReportCreatedRollup, CREATED_KEY_FIELDS, key, delta)
+
+
+def apply_created_deltas(deltas):
+    apply_bulk_deltas(ReportCreatedRollup, CREATED_KEY_FIELDS, deltas, apply_created_delta)
+
+
+def apply_location_delta(key, delta):
+    _apply_delta(ReportLocationRollup, LOCATION_KEY_FIELDS, key, delta)
+
+
+def apply_location_deltas(deltas):
+    apply_bulk_deltas(ReportLocationRollup, LOCATION_KEY_FIELDS, deltas, apply_location_delta)
+
+
+# (model, key fields, source columns, key function) of every rollup
+ROLLUPS = [
+    (ReportDailyRollup, ROLLUP_KEY_FIELDS, ROLLUP_SOURCE_COLS, rollup_key),
+    (ReportCreatedRollup, CREATED_KEY_FIELDS, CREATED_SOURCE_COLS, created_rollup_key),
+    (ReportLocationRollup, LOCATION_KEY_FIELDS, LOCATION_SOURCE_COLS, location_rollup_key),
+]
+
+
+# ------------------------------- Rebuild -----------------------------------------
+def rebuild_rollups(chunk_size=2000):
+    """
+    Recompute every rollup row from the Report table.
+    Streams the reports so memory stays bounded by the number of keys.
+    Returns (reports_seen, rollup_rows).
+    """
+    source_cols = list(dict.fromkeys(col for _, _, cols, _ in ROLLUPS for col in cols))
+    positions = [[source_cols.index(col) for col in cols] for _, _, cols, _ in ROLLUPS]
+    counts = [Counter() for _ in ROLLUPS]
+    seen = 0
+    qs = Report.objects.values_list(*source_cols).order_by()
+    for values in qs.iterator(chunk_size=chunk_size):
+        for (_, _, _, key), index, counter in zip(ROLLUPS, positions, counts):
+            counter[key(*(values[i] for i in index))] += 1
+        seen += 1
+
+    with transaction.atomic():
+        for (model, key_fields, _, _), counter in zip(ROLLUPS, counts):
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                [model(count=n, **dict(zip(key_fields, key))) for key, n in counter.items()],
+                batch_size=chunk_size,
+            )
+    return seen, sum(len(counter) for counter in counts)
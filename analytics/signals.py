@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from reports.models import Report
+from reports.signals import reports_bulk_changed
+from .cache import bump_reports_version
+from .models import ReportChange
+from .counters import STATUS_SOURCE_COLS, status_key, apply_status_delta, apply_status_deltas
+from .heatmap import HEATMAP_SOURCE_COLS, cell_key, apply_cell_delta, apply_cell_deltas
+from .rollups import (
+    ROLLUP_SOURCE_COLS, rollup_key, apply_rollup_delta, apply_rollup_deltas,
+    CREATED_SOURCE_COLS, created_rollup_key, apply_created_delta, apply_created_deltas,
+    LOCATION_SOURCE_COLS, location_rollup_key, apply_location_delta, apply_location_deltas,
+)
+
+# (source columns, key function, delta function, batch delta function) for each
+# incrementally maintained aggregate
+AGGREGATES = [
+    (ROLLUP_SOURCE_COLS, rollup_key, apply_rollup_delta, apply_rollup_deltas),
+    (CREATED_SOURCE_COLS, created_rollup_key, apply_created_delta, apply_created_deltas),
+    (LOCATION_SOURCE_COLS, location_rollup_key, apply_location_delta, apply_location_deltas),
+    (HEATMAP_SOURCE_COLS, cell_key, apply_cell_delta, apply_cell_deltas),
+    (STATUS_SOURCE_COLS, status_key, apply_status_delta, apply_status_deltas),
+]
+
+# Every Report column the incremental aggregates depend on
+TRACKED_COLS = list(dict.fromkeys(col for cols, *_ in AGGREGATES for col in cols))
+
+
+def _aggregate_keys(values):
+    """One key per aggregate for a {column: value} mapping."""
+    return [key(*(values[col] for col in cols)) for cols, key, *_ in AGGREGATES]
+
+
+def _instance_keys(instance):
+    return _aggregate_keys({col: getattr(instance, col) for col in TRACKED_COLS})
+
+
+# ------------------------- Keep aggregates in sync with Report writes -------------------------
+@receiver(pre_save, sender=Report)
+def remember_previous_keys(sender, instance, raw=False, **kwargs):
+    """Store the aggregate keys the report had before this save (None for new reports)."""
+    instance._previous_aggregate_keys = None
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*TRACKED_COLS).first()
+    if previous is not None:
+        instance._previous_aggregate_keys = _aggregate_keys(previous)
+
+
+@receiver(post_save, sender=Report)
+def update_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_aggregate_keys", None) or [None] * len(AGGREGATES)
+    current = _instance_keys(instance)
+    for (_, _, apply_delta, _), old, new in zip(AGGREGATES, previous, current):
+        if old != new:
+            apply_delta(old, -1)
+            apply_delta(new, +1)
+
+
+@receiver(post_delete, sender=Report)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    for (_, _, apply_delta, _), key in zip(AGGREGATES, _instance_keys(instance)):
+        apply_delta(key, -1)
+
+
+@receiver(reports_bulk_changed, sender=Report)
+def update_aggregates_on_bulk_change(sender, created=False, instances=None, previous=None, **kwargs):
+    """
+    Batches that pass the inserted reports, or the updated reports and their previous state,
+    are counted in a few queries per aggregate.
+    """
+    if not instances or not (created or previous):
+        return
+    for cols, key, _, apply_deltas in AGGREGATES:
+        deltas = Counter(key(*(getattr(report, col) for col in cols)) for report in instances)
+        if previous:
+            deltas.subtract(key(*(getattr(report, col) for col in cols)) for report in previous)
+        deltas.pop(None, None)
+        apply_deltas({k: d for k, d in deltas.items() if d})
+
+
+# ------------------------- Invalidate cached analytics payloads -------------------------
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+@receiver(reports_bulk_changed, sender=Report)
+def bump_version_on_write(sender, raw=False, **kwargs):
+    # In the write's transaction: the new version becomes visible together with the data
+    if not raw:
+        bump_reports_version()
+
+
+# ------------------------- Journal changes for the columnar snapshot -------------------------
+def _snapshot_enabled():
+    return getattr(settings, "ANALYTICS_SNAPSHOT_ENABLED", False)
+
+
+@receiver(post_save, sender=Report)
+def journal_report_update(sender, instance, created, raw=False, **kwargs):
+    # New rows are picked up by the id watermark, only updates need a journal entry
+    if _snapshot_enabled() and not created and not raw:
+        ReportChange.objects.create(report_id=instance.pk)
+
+
+@receiver(post_delete, sender=Report)
+def journal_report_delete(sender, instance, **kwargs):
+    if _snapshot_enabled():
+        ReportChange.objects.create(report_id=instance.pk)
+
+
+@receiver(reports_bulk_changed, sender=Report)
+def journal_bulk_change(sender, created=False, instances=None, **kwargs):
+    if not _snapshot_enabled() or created:
+        return
+    if instances:
+        ReportChange.objects.bulk_create([ReportChange(report_id=report.pk) for report in instances], batch_size=500)
+    else:
+        # Without ids we cannot patch rows: force a full rebuild on the next refresh
+        ReportChange.objects.create(report_id=None)
@@ -0,0 +1,368 @@
+"""
+Columnar on-disk snapshot of the analytics columns (EXPECTED_COLS).
+
+Each generation is a directory of .npy files (plus a UTF-8 blob for report_details)
+that readers open with mmap_mode='r', so gunicorn workers share the page cache
+instead of each holding its own copy. A CURRENT file names the live generation.
+
+Refreshes are incremental: rows with id above the stored watermark (and recently created
+ones, for transactions that commit late) are appended, and ids journalled in ReportChange
+since the last refresh are re-read or dropped. Each generation records the reports data
+version (analytics.cache) it was read at, so checking for staleness is a single-row query.
+"""
+import contextlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from reports.models import Report
+from .cache import get_reports_version
+from .models import ReportChange
+from .utils import CATEGORY_CHOICES, encode_values
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, thread lock only
+    fcntl = None
+
+# Dictionary-encoded text columns (codes on disk, values in meta.json)
+DICT_COLS = ["report_type", "status", "severity", "location"]
+NUMERIC_COLS = ["latitude", "longitude"]
+# report_details is stored as one UTF-8 blob plus n + 1 offsets
+DETAIL_COLS = ("report_details", "report_details_offsets")
+SOURCE_COLS = ["id", "location", "incident_date", "report_details", "report_type",
+               "status", "latitude", "longitude", "severity", "created_at"]
+# Columns of to_dataframe(), in clean_reports_dataframe order
+FRAME_COLS = ["location", "incident_date", "report_details", "report_type",
+              "status", "latitude", "longitude", "severity", "created_at"]
+
+_local_lock = threading.Lock()
+_mapped = {}  # generation path -> Snapshot
+
+
+def snapshot_dir():
+    return str(getattr(settings, "ANALYTICS_SNAPSHOT_DIR", os.path.join(settings.BASE_DIR, "var", "analytics_snapshot")))
+
+
+@contextlib.contextmanager
+def _build_lock():
+    """Serialise builders across threads and processes."""
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with _local_lock, open(os.path.join(snapshot_dir(), ".lock"), "w") as fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ------------------------------- In-memory representation ---------------------------------
+class Snapshot:
+    """Column arrays (memory-mapped when loaded from disk) plus metadata."""
+
+    def __init__(self, columns, meta, generation=None):
+        self.columns = columns
+        self.meta = meta
+        self.generation = generation
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def report_details(self):
+        offsets, blob = self.columns["report_details_offsets"], self.columns["report_details"]
+        raw = blob.tobytes() if len(blob) else b""
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    def to_dataframe(self, columns=None, include_details=False):
+        """
+        DataFrame shaped like clean_reports_dataframe output (categoricals for text), with only
+        `columns` when given (report_details also needs include_details when they are not).
+        Text codes and coordinates are read-only views of the mapped arrays; only the dates
+        (converted to ns) and report_details are copied.
+        """
+        cols = self.columns
+        dictionaries = self.meta["dictionaries"]
+        data = {}
+        for col in columns or [c for c in FRAME_COLS if include_details or c != "report_details"]:
+            if col in DICT_COLS:
+                data[col] = pd.Categorical.from_codes(np.asarray(cols[col]), categories=dictionaries[col])
+            elif col == "incident_date":
+                data[col] = np.asarray(cols[col]).astype("datetime64[ns]")
+            elif col == "created_at":
+                data[col] = pd.DatetimeIndex(np.asarray(cols[col]).astype("datetime64[ns]")).tz_localize("UTC")
+            elif col == "report_details":
+                data[col] = self.report_details()
+            else:
+                data[col] = np.asarray(cols[col])
+        return pd.DataFrame(data, copy=False)
+
+
+def _rows_to_columns(rows, dictionaries):
+    """Turn values_list rows (SOURCE_COLS order) into column arrays."""
+    by_col = dict(zip(SOURCE_COLS, zip(*rows))) if rows else {col: () for col in SOURCE_COLS}
+    details = [(d or "").encode("utf-8") for d in by_col["report_details"]]
+    lengths = np.fromiter((len(d) for d in details), dtype=np.int64, count=len(details))
+    columns = {
+        "id": np.array(by_col["id"], dtype=np.int64),
+        "incident_date": np.array(by_col["incident_date"], dtype="datetime64[D]"),
+        "created_at": np.array([v.replace(tzinfo=None) for v in by_col["created_at"]], dtype="datetime64[us]"),
+        "report_details_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "report_details": np.frombuffer(b"".join(details), dtype=np.uint8),
+    }
+    for col in NUMERIC_COLS:
+        columns[col] = np.array([np.nan if v is None else float(v) for v in by_col[col]], dtype=np.float64)
+    for col in DICT_COLS:
+        columns[col] = encode_values(by_col[col], dictionaries[col], nullable=(col == "severity"))
+    return columns
+
+
+def _concat(parts):
+    """Concatenate column dicts, rebasing report_details offsets."""
+    out = {}
+    for col in parts[0]:
+        if col == "report_details_offsets":
+            offsets, base = [np.zeros(1, dtype=np.int64)], 0
+            for part in parts:
+                offsets.append(part[col][1:] + base)
+                base += int(part[col][-1])
+            out[col] = np.concatenate(offsets)
+        else:
+            out[col] = np.concatenate([np.asarray(part[col]) for part in parts])
+    return out
+
+
+def _take(columns, index):
+    """Rows at integer positions `index` (in that order) from a column dict."""
+    out = {col: np.asarray(arr)[index] for col, arr in columns.items() if col not in DETAIL_COLS}
+    offsets, blob = columns["report_details_offsets"], np.asarray(columns["report_details"])
+    pieces = [blob[offsets[i]:offsets[i + 1]] for i in index]
+    lengths = np.fromiter((len(p) for p in pieces), dtype=np.int64, count=len(pieces))
+    out["report_details_offsets"] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    out["report_details"] = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.uint8)
+    return out
+
+
+def _fetch(qs, dictionaries, chunk_size):
+    parts, rows = [], []
+    for row in qs.values_list(*SOURCE_COLS).order_by("id").iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            parts.append(_rows_to_columns(rows, dictionaries))
+            rows = []
+    parts.append(_rows_to_columns(rows, dictionaries))
+    return _concat(parts)
+
+
+# ------------------------------- Disk layout --------------------------------------------
+def _current_generation():
+    try:
+        with open(os.path.join(snapshot_dir(), "CURRENT")) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _code_dtype(categories):
+    """The integer dtype pandas keeps Categorical codes in, so frames can view the stored codes."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(categories) < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write(columns, meta):
+    """Write a new generation and atomically point CURRENT at it."""
+    base = snapshot_dir()
+    previous = _current_generation()
+    number = int(previous.split("-")[1]) + 1 if previous else 1
+    generation = f"gen-{number:06d}"
+    tmp = os.path.join(base, generation + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for col, arr in columns.items():
+        if col in DICT_COLS:
+            arr = np.asarray(arr).astype(_code_dtype(meta["dictionaries"][col]), copy=False)
+        np.save(os.path.join(tmp, col + ".npy"), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    os.replace(tmp, os.path.join(base, generation))
+
+    with open(os.path.join(base, "CURRENT.tmp"), "w") as fh:
+        fh.write(generation)
+    os.replace(os.path.join(base, "CURRENT.tmp"), os.path.join(base, "CURRENT"))
+
+    # Keep the previous generation: workers may still be reading it
+    for name in os.listdir(base):
+        if name.startswith("gen-") and name not in (generation, previous):
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+    return generation
+
+
+def load_snapshot():
+    """Memory-mapped view of the live generation (None if never built)."""
+    generation = _current_generation()
+    if generation is None:
+        return None
+    path = os.path.join(snapshot_dir(), generation)
+    snap = _mapped.get(path)
+    if snap is None:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        columns = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+        snap = Snapshot(columns, meta, generation)
+        _mapped.clear()
+        _mapped[path] = snap
+    return snap
+
+
+# ------------------------------- Build / refresh ----------------------------------------
+def lookback():
+    return timedelta(seconds=getattr(settings, "ANALYTICS_SNAPSHOT_LOOKBACK", 300))
+
+
+def _journal():
+    """Unconsumed ReportChange rows as (pk, report_id): consumed ones are deleted."""
+    return list(ReportChange.objects.order_by("pk").values_list("pk", "report_id"))
+
+
+def _consume(changes, batch_size=500):
+    # Only the entries that were read: one committed meanwhile with a lower pk stays for next time
+    pks = [pk for pk, _ in changes]
+    for start in range(0, len(pks), batch_size):
+        ReportChange.objects.filter(pk__in=pks[start:start + batch_size]).delete()
+
+
+def build_snapshot(chunk_size=5000):
+    """Full rebuild from the Report table."""
+    with _build_lock():
+        return _build(chunk_size)
+
+
+def _build(chunk_size):
+    loaded_at = timezone.now()
+    with transaction.atomic():
+        # Read before the rows: a write committing in between only causes one extra refresh
+        version = get_reports_version()
+        changes = _journal()
+        dictionaries = {col: [value for value, _ in CATEGORY_CHOICES.get(col, [])] for col in DICT_COLS}
+        columns = _fetch(Report.objects.all(), dictionaries, chunk_size)
+    meta = {
+        "rows": int(len(columns["id"])),
+        "max_id": int(columns["id"].max()) if len(columns["id"]) else 0,
+        "loaded_at": loaded_at.isoformat(),
+        "data_version": version,
+        "dictionaries": dictionaries,
+    }
+    _write(columns, meta)
+    _consume(changes)
+    return meta
+
+
+def _since(meta):
+    return datetime.fromisoformat(meta["loaded_at"]) - lookback()
+
+
+def is_stale(snap):
+    """
+    True when the reports data version moved since the snapshot was read. Every report write
+    bumps it in its own transaction, so late commits below the watermark are seen too.
+    """
+    meta = snap.meta
+    return "loaded_at" not in meta or meta.get("data_version") != get_reports_version()
+
+
+def refresh_snapshot(chunk_size=5000):
+    """
+    Bring the snapshot up to date: append new rows, patch updated / deleted ones.
+    New rows are those above the id watermark plus, re-read every time, the rows created within
+    ANALYTICS_SNAPSHOT_LOOKBACK seconds before the last load: a transaction that commits after
+    a higher id was read is picked up by the next refresh instead of being skipped for good.
+    Falls back to a full build when there is no snapshot or a bulk change without ids.
+    Returns the new meta, or None when nothing changed.
+    """
+    with _build_lock():
+        snap = load_snapshot()
+        if snap is None or "loaded_at" not in snap.meta:
+            return _build(chunk_size)
+
+        meta = snap.meta
+        loaded_at = timezone.now()
+        with transaction.atomic():
+            version = get_reports_version()
+            changes = _journal()
+            if any(report_id is None for _, report_id in changes):
+                return _build(chunk_size)
+            changed_ids = sorted({report_id for _, report_id in changes})
+            dictionaries = {col: list(values) for col, values in meta["dictionaries"].items()}
+            fresh = _fetch(
+                Report.objects.filter(Q(id__gt=meta["max_id"]) | Q(created_at__gte=_since(meta)) | Q(id__in=changed_ids)),
+                dictionaries, chunk_size,
+            )
+
+        ids = np.asarray(snap.columns["id"])
+        if not changes and np.isin(fresh["id"], ids).all() and meta.get("data_version") == version:
+            return None
+
+        # Rows re-read (or deleted) replace their old version
+        replaced = np.union1d(fresh["id"], np.array(changed_ids, dtype=np.int64))
+        columns = _take(snap.columns, np.flatnonzero(~np.isin(ids, replaced)))
+        columns = _concat([columns, fresh])
+        order = np.argsort(columns["id"], kind="stable")
+        if np.any(order != np.arange(len(order))):
+            columns = _take(columns, order)
+        meta = {
+            "rows": int(len(columns["id"])),
+            "max_id": max(meta["max_id"], int(fresh["id"].max()) if len(fresh["id"]) else 0),
+            "loaded_at": loaded_at.isoformat(),
+            "data_version": version,
+            "dictionaries": dictionaries,
+        }
+        _write(columns, meta)
+        _consume(changes)
+        return meta
+
+
+def get_snapshot_dataframe(refresh=True, columns=None):
+    """Reports DataFrame (see Snapshot.to_dataframe) served from the snapshot, refreshing it first when stale."""
+    snap = load_snapshot()
+    if snap is None or (refresh and is_stale(snap)):
+        refresh_snapshot()
+        snap = load_snapshot()
+    return snap.to_dataframe(columns)
+
+
+# ------------------------------- Verification -------------------------------------------
+def verify_snapshot(chunk_size=5000):
+    """Compare the live snapshot with the Report table; returns a list of problems."""
+    snap = load_snapshot()
+    if snap is None:
+        return ["no snapshot has been built"]
+
+    dictionaries = {col: list(values) for col, values in snap.meta["dictionaries"].items()}
+    expected = _fetch(Report.objects.all(), dictionaries, chunk_size)
+    problems = []
+    if len(snap) != len(expected["id"]):
+        problems.append(f"row count {len(snap)} != {len(expected['id'])} in the database")
+    elif not np.array_equal(np.asarray(snap.columns["id"]), expected["id"]):
+        problems.append("report ids differ")
+    else:
+        for col, arr in expected.items():
+            actual = np.asarray(snap.columns[col])
+            same = np.array_equal(actual, arr, equal_nan=True) if arr.dtype.kind == "f" else np.array_equal(actual, arr)
+            if not same:
+                problems.append(f"column {col} differs")
+    return problems
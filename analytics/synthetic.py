@@ -0,0 +1,35 @@
+import random
+from datetime import date, timedelta
+
+from reports.models import Report, REPORT_TYPES, CASE_STATUS, SEVERITY
+from reports.tracking_codes import allocate_tracking_codes
+
+# Synthetic data for the analytics comparison / benchmark commands
+LOCATIONS = ["القاهرة, مصر", "الجيزة, مصر", "الإسكندرية, مصر", "أسوان, مصر", " المنصورة, مصر "]
+
+
+def generate_reports(count, seed=0, batch_size=1000):
+    """Bulk-insert `count` synthetic reports (skewed choices so top values rarely tie)."""
+    rnd = random.Random(seed)
+
+    def pick(values):
+        return rnd.choices(values, weights=range(len(values), 0, -1))[0]
+
+    start = date.today() - timedelta(days=3 * 365)
+    for offset in range(0, count, batch_size):
+        codes = allocate_tracking_codes(min(batch_size, count - offset))
+        Report.objects.bulk_create([
+            Report(
+                location=pick(LOCATIONS),
+                incident_date=start + timedelta(days=rnd.randrange(3 * 365)),
+                report_details="بلاغ تجريبي",
+                report_type=pick([value for value, _ in REPORT_TYPES]),
+                status=pick([value for value, _ in CASE_STATUS]),
+                severity=pick([value for value, _ in SEVERITY] + [None]),
+                latitude=rnd.uniform(22, 31.5) if rnd.random() > 0.1 else None,
+                longitude=rnd.uniform(25, 35) if rnd.random() > 0.1 else None,
+                tracking_code=code,
+                is_fake=True,
+            )
+            for code in codes
+        ])
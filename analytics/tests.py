@@ -1,3 +1,293 @@
+import importlib
+import tempfile
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.apps import apps as django_apps
+from django.conf import settings
 from django.test import TestCase
+from django.urls import reverse
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from reports.models import Report
+from .cache import bump_reports_version
+from .counters import rebuild_status_counters
+from .engine import BACKENDS, QuerysetAggregationEngine, classic_dashboard, recent_dashboard
+from .heatmap import rebuild_heatmap
+from .management.commands.bench_dataframe_loader import list_reports_dataframe
+from .management.commands.bench_recent_kpis import masked_recent_kpis, synthetic_frame
+from .models import HeatmapCell, ReportCreatedRollup, ReportDailyRollup, ReportLocationRollup, ReportStatusCounter
+from .rollups import rebuild_rollups
+from .snapshot import build_snapshot, is_stale, load_snapshot, refresh_snapshot, verify_snapshot
+from .synthetic import generate_reports
+from .utils import compute_recent_kpis, get_db_reports_dataframe
+
+AGGREGATE_MODELS = [ReportDailyRollup, ReportCreatedRollup, ReportLocationRollup, HeatmapCell, ReportStatusCounter]
+
+
+def _normalize(kpis, charts):
+    charts = dict(charts)
+    # Raw points (pandas) vs aggregated cells: compare how many reports they cover
+    charts["heatmap"] = sum(p.get("count", 1) for p in charts["heatmap"])
+    if isinstance(kpis.get("solved_percentage"), float):
+        kpis = dict(kpis, solved_percentage=round(kpis["solved_percentage"], 9))
+    return kpis, charts
+
+
+def _sorted_frame(df):
+    # Categoricals compared by value (missing as None), rows in one order
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df.sort_values(["created_at", "location", "incident_date"]).reset_index(drop=True)
+
+
+def _aggregate_rows():
+    return {
+        model.__name__: sorted(
+            (row for row in model.objects.values_list(*[f.attname for f in model._meta.fields if f.attname not in ("id", "updated_at")])
+             if row[-1]),  # counters rebuilt to 0 are kept, rollup rows at 0 are deleted
+            key=str,
+        )
+        for model in AGGREGATE_MODELS
+    }
+
+
+class SyntheticReportsMixin:
+    @classmethod
+    def setUpTestData(cls):
+        generate_reports(600, seed=3)
+        # Spread creation times over the last nine days (all distinct, so pandas keeps every row)
+        now = timezone.now()
+        reports = list(Report.objects.order_by("pk"))
+        for i, report in enumerate(reports):
+            report.created_at = now - timedelta(days=i % 9, seconds=i)
+        Report.objects.bulk_update(reports, ["created_at"])
+        rebuild_rollups()
+        rebuild_heatmap()
+        rebuild_status_counters()
+
+    def scenarios(self):
+        year = str(Report.objects.dates("incident_date", "year")[1].year)
+        return [(None, None), (year, None), (None, "القاهرة"), (year, "مصر")]
+
+
+class SnapshotDirMixin:
+    snapshot_settings = {}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        snapshot_settings = override_settings(ANALYTICS_SNAPSHOT_DIR=tmp.name, **self.snapshot_settings)
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
+        build_snapshot()
+
+
+class BackendParityTests(SyntheticReportsMixin, SnapshotDirMixin, TestCase):
+    """Every backend returns what the pandas implementation returns on the same reports."""
+
+    def assertSameKpis(self, expected, actual, year, location):
+        # top_* may differ between values with the same count
+        tie_fields = {"top_report_type": "report_type", "top_region": "location"}
+        for key, value in expected.items():
+            if key in tie_fields and value != actual[key]:
+                engine = QuerysetAggregationEngine.for_reports(year=year, location=location)
+                counts = engine.value_counts(tie_fields[key])
+                self.assertEqual(counts[value], counts[actual[key]], key)
+            else:
+                self.assertEqual(value, actual[key], key)
+
+    def test_classic_dashboard(self):
+        for year, location in self.scenarios():
+            expected = _normalize(*classic_dashboard(year=year, location=location, backend="pandas"))
+            self.assertTrue(expected[0]["total_reports"])
+            for backend in BACKENDS:
+                with self.subTest(backend=backend, year=year, location=location):
+                    kpis, charts = _normalize(*classic_dashboard(year=year, location=location, backend=backend))
+                    self.assertSameKpis(expected[0], kpis, year, location)
+                    self.assertEqual(expected[1], charts)
+
+    def test_recent_dashboard(self):
+        for period in ("daily", "weekly", "monthly"):
+            for year, location in self.scenarios():
+                expected = _normalize(*recent_dashboard(year=year, location=location, period=period, backend="pandas"))
+                if year is None and location is None:
+                    self.assertTrue(sum(expected[1]["bar_chart"].values()))
+                for backend in BACKENDS:
+                    with self.subTest(backend=backend, period=period, year=year, location=location):
+                        actual = _normalize(*recent_dashboard(year=year, location=location, period=period, backend=backend))
+                        self.assertEqual(expected, actual)
+
+    @override_settings(TIME_ZONE="Africa/Cairo")
+    def test_recent_daily_follows_time_zone(self):
+        rebuild_rollups()
+        expected = _normalize(*recent_dashboard(period="daily", backend="pandas"))
+        self.assertEqual(expected, _normalize(*recent_dashboard(period="daily", backend="rollup")))
+
+
+class DataFrameLoaderTests(TestCase):
+    """The chunked categorical loader returns the frame the list-based loader did."""
+
+    def test_matches_list_based_loader(self):
+        generate_reports(50, seed=5)
+        reports = list(Report.objects.order_by("pk")[:6])
+        reports[0].status = "حالة غير معروفة"  # not in the choices: appended to the categories
+        reports[1].report_details, reports[1].location = "  مسافات  ", " الأقصر, مصر "
+        reports[2].severity, reports[2].latitude, reports[2].longitude = None, None, None
+        Report.objects.bulk_update(reports[:3], ["status", "report_details", "location", "severity", "latitude", "longitude"])
+        # Rows equal in every loaded column are dropped, as with drop_duplicates() before
+        reports[3].pk, reports[3].tracking_code = None, "TESTDUP00001"
+        reports[4].pk, reports[4].tracking_code = None, "TESTDUP00002"
+        Report.objects.bulk_create(reports[3:5])
+        for source in Report.objects.order_by("pk")[3:5]:
+            Report.objects.filter(report_details=source.report_details, incident_date=source.incident_date,
+                                  location=source.location).update(created_at=source.created_at)
+
+        expected = _sorted_frame(list_reports_dataframe())
+        actual = _sorted_frame(get_db_reports_dataframe(chunk_size=7))
+        self.assertEqual(len(actual), 50)
+        self.assertIsInstance(get_db_reports_dataframe()["severity"].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(expected, actual)
+
+
+class RecentKpiTests(TestCase):
+    """compute_recent_kpis (one bincount) gives what the mask-per-figure version did."""
+
+    def assertSameKpis(self, df):
+        for categorical in (False, True):
+            frame = df.copy()
+            if categorical:
+                frame["status"], frame["severity"] = frame["status"].astype("category"), frame["severity"].astype("category")
+            with self.subTest(categorical=categorical):
+                self.assertEqual(masked_recent_kpis(frame), compute_recent_kpis(frame))
+
+    def test_synthetic_frames(self):
+        for seed in range(3):
+            self.assertSameKpis(synthetic_frame(2000, seed=seed))
+
+    def test_empty(self):
+        self.assertSameKpis(synthetic_frame(0))
+
+    def test_single_category(self):
+        df = synthetic_frame(300, seed=1)
+        df["status"], df["severity"] = "قيد المراجعة", "حرج"
+        self.assertSameKpis(df)
+
+    def test_unseen_categories(self):
+        df = synthetic_frame(300, seed=2)
+        df.loc[::3, "status"] = "حالة غير معروفة"
+        df.loc[::4, "severity"] = "غير مصنف"
+        df.loc[::5, "severity"] = None
+        self.assertSameKpis(df)
+        # Categories the data does not use
+        df["status"] = pd.Categorical(df["status"], categories=["أخرى", *df["status"].unique()])
+        self.assertEqual(masked_recent_kpis(df), compute_recent_kpis(df))
+
+
+class IncrementalAggregateTests(SyntheticReportsMixin, TestCase):
+    """Aggregates kept up to date by the Report signals equal a rebuild from scratch."""
+
+    def test_writes_match_rebuild(self):
+        template = Report.objects.filter(latitude__isnull=False).first()
+        template.pk, template.tracking_code = None, "TESTNEW00001"
+        template.save()
+        updated = Report.objects.exclude(pk=template.pk).order_by("pk")[:3]
+        for report, status in zip(updated, ["تم الحل", "قيد المراجعة", "تم الحل"]):
+            report.status, report.severity, report.location = status, "حرج", "الجيزة, مصر"
+            report.save()
+        Report.objects.order_by("-pk")[1].delete()
+
+        incremental = _aggregate_rows()
+        rebuild_rollups()
+        rebuild_heatmap()
+        rebuild_status_counters()
+        self.assertEqual(incremental, _aggregate_rows())
+
+    def test_backfill_migration_matches_rebuild(self):
+        rebuilt = _aggregate_rows()
+        for model in AGGREGATE_MODELS:
+            model.objects.all().delete()
+        backfill = importlib.import_module("analytics.migrations.0006_backfill_aggregates")
+        backfill.backfill_aggregates(django_apps, None)
+        self.assertEqual(rebuilt, _aggregate_rows())
+
+
+class SnapshotRefreshTests(SyntheticReportsMixin, SnapshotDirMixin, TestCase):
+    snapshot_settings = {"ANALYTICS_SNAPSHOT_ENABLED": True}
+
+    def test_refresh_picks_up_late_commits_and_journal(self):
+        # A transaction that got its id before the last refresh but committed after it:
+        # refresh without the row, then insert it below the watermark without a journal entry
+        late = Report.objects.order_by("pk")[10]
+        late_id = late.pk
+        late.delete()
+        refresh_snapshot()
+        self.assertEqual(verify_snapshot(), [])
+        late.pk, late.created_at = late_id, timezone.now()
+        Report.objects.bulk_create([late])
+
+        updated = Report.objects.order_by("pk")[20]
+        updated.status = "تم الحل"
+        updated.save()
+        Report.objects.order_by("pk")[30].delete()
+
+        self.assertTrue(is_stale(load_snapshot()))
+        self.assertIsNotNone(refresh_snapshot())
+        self.assertEqual(verify_snapshot(), [])
+        self.assertFalse(is_stale(load_snapshot()))
+        self.assertIsNone(refresh_snapshot())
+
+    def test_staleness_is_one_query_and_frames_share_the_mapped_columns(self):
+        snap = load_snapshot()
+        with self.assertNumQueries(1):
+            self.assertFalse(is_stale(snap))
+
+        df = snap.to_dataframe(["status", "latitude"])
+        self.assertEqual(list(df.columns), ["status", "latitude"])
+        self.assertTrue(np.shares_memory(df["status"].cat.codes.to_numpy(), snap.columns["status"]))
+        self.assertTrue(np.shares_memory(df["latitude"].to_numpy(), snap.columns["latitude"]))
+        self.assertFalse(df["latitude"].to_numpy().flags.writeable)
+        pd.testing.assert_frame_equal(df, snap.to_dataframe()[["status", "latitude"]])
+
+        Report.objects.order_by("pk").first().delete()
+        self.assertTrue(is_stale(snap))
+
+
+class PublicSiteStatsTests(TestCase):
+    def create_report(self, code):
+        Report.objects.create(
+            tracking_code=code, location="القاهرة, مصر", incident_date="2024-05-01",
+            report_details="x", report_type="سرقة",
+        )
+
+    def test_last_modified_follows_counter_updates(self):
+        self.create_report("TESTSTATS001")
+        # As if the counters last changed an hour ago
+        ReportStatusCounter.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        bump_reports_version()
+        first = self.client.get(reverse("public_site_stats"))
+        self.assertEqual(first.json()["site_stats"]["received_reports"], 1)
+
+        self.create_report("TESTSTATS002")
+        second = self.client.get(reverse("public_site_stats"), HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()["site_stats"]["received_reports"], 2)
+        self.assertNotEqual(second["Last-Modified"], first["Last-Modified"])
+
+    def test_write_in_another_worker_invalidates_cached_payload(self):
+        self.create_report("TESTSTATS001")
+        first = self.client.get(reverse("public_site_stats"))
+        self.assertEqual(first.json()["site_stats"]["received_reports"], 1)
+
+        # Another worker process: its own LocMemCache, on-commit hooks run
+        other_worker = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "other-worker"}
+        with override_settings(CACHES={**settings.CACHES, settings.ANALYTICS_CACHE_ALIAS: other_worker}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_report("TESTSTATS002")
 
-# Create your tests here.
+        second = self.client.get(reverse("public_site_stats"))
+        self.assertEqual(second.json()["site_stats"]["received_reports"], 2)
@@ -8,5 +8,8 @@ urlpatterns = [
     # Recent dashboard
     path("analytics/recent/", views.dashboard_recent_data, name="dashboard_recent_data"),
 
+    # Heatmap cells for a map viewport
+    path("analytics/heatmap/", views.dashboard_heatmap, name="dashboard_heatmap"),
+
     path("analytics/site_stats/", views.public_site_stats, name="public_site_stats"),
 ]
@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
-from datetime import timedelta
-from reports.models import Report
+from django.db.models import Sum
+from django.utils import timezone
+from reports.models import Report, REPORT_TYPES, CASE_STATUS, SEVERITY
+from .models import ReportCreatedRollup, ReportDailyRollup
 
 EXPECTED_COLS = [
     "location",
@@ -16,6 +19,24 @@ EXPECTED_COLS = [
 
 TEXT_COLS = ["location", "report_details", "report_type", "status"]
 
+# Low-cardinality columns loaded as pandas Categorical; choices come first, unexpected
+# values found in the data are appended so nothing turns into NaN
+CATEGORY_CHOICES = {
+    "report_type": REPORT_TYPES,
+    "status": CASE_STATUS,
+    "severity": SEVERITY,
+}
+CATEGORICAL_COLS = ["location", "report_type", "status", "severity"]
+
+LOADER_CHUNK_SIZE = 2000
+
+MONTH_AR = {
+    1: "يناير", 2: "فبراير", 3: "مارس", 4: "أبريل",
+    5: "مايو", 6: "يونيو", 7: "يوليو", 8: "أغسطس",
+    9: "سبتمبر", 10: "أكتوبر", 11: "نوفمبر", 12: "ديسمبر"
+}
+MONTH_ORDER = list(MONTH_AR.values())
+
 def clean_reports_dataframe(df):
     df['incident_date'] = pd.to_datetime(df['incident_date'], errors='coerce')
     df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
@@ -25,10 +46,96 @@ def clean_reports_dataframe(df):
         df.loc[:, col] = df[col].astype(str).str.strip()
     return df
 
-def get_db_reports_dataframe():
-    qs = Report.objects.values(*EXPECTED_COLS)
-    df = pd.DataFrame(list(qs))
-    return clean_reports_dataframe(df)
+def encode_values(values, categories, nullable=False):
+    """
+    Integer codes of values in `categories`, appending unseen values to it.
+    Text is normalised like clean_reports_dataframe; None is code -1 when nullable.
+    """
+    index = {v: i for i, v in enumerate(categories)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None and nullable:
+            codes[i] = -1
+            continue
+        value = value if nullable else str(value).strip()
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(categories)
+            categories.append(value)
+        codes[i] = code
+    return codes
+
+class _ColumnBuffers:
+    """Preallocated typed arrays for the EXPECTED_COLS columns, filled chunk by chunk."""
+
+    def __init__(self, capacity):
+        self.size = 0
+        self.categories = {col: [value for value, _ in CATEGORY_CHOICES.get(col, [])] for col in CATEGORICAL_COLS}
+        self.arrays = {}
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity):
+        dtypes = {
+            "incident_date": "datetime64[D]",
+            "created_at": "datetime64[us]",
+            "latitude": np.float64,
+            "longitude": np.float64,
+            "report_details": object,
+        }
+        for col in EXPECTED_COLS:
+            new = np.empty(capacity, dtype=dtypes.get(col, np.int32))
+            old = self.arrays.get(col)
+            if old is not None:
+                new[:self.size] = old[:self.size]
+            self.arrays[col] = new
+
+    def append(self, rows):
+        start, end = self.size, self.size + len(rows)
+        if end > len(self.arrays["incident_date"]):
+            self._allocate(max(end, 2 * len(self.arrays["incident_date"])))  # rows added since count()
+        a = self.arrays
+        for col, values in zip(EXPECTED_COLS, zip(*rows)):
+            if col in CATEGORICAL_COLS:
+                a[col][start:end] = encode_values(values, self.categories[col], nullable=(col == "severity"))
+            elif col == "created_at":
+                a[col][start:end] = [v.replace(tzinfo=None) if v is not None else None for v in values]
+            elif col == "report_details":
+                a[col][start:end] = [str(v).strip() for v in values]
+            else:
+                a[col][start:end] = values  # dates; Decimal / None -> float / NaN
+        self.size = end
+
+    def to_dataframe(self):
+        n, a = self.size, self.arrays
+        data = {}
+        for col in EXPECTED_COLS:
+            if col in CATEGORICAL_COLS:
+                data[col] = pd.Categorical.from_codes(a[col][:n], categories=self.categories[col])
+            elif col == "incident_date":
+                data[col] = a[col][:n].astype("datetime64[ns]")
+            elif col == "created_at":
+                data[col] = pd.DatetimeIndex(a[col][:n].astype("datetime64[ns]")).tz_localize("UTC")
+            else:
+                data[col] = a[col][:n]
+        return pd.DataFrame(data)
+
+def get_db_reports_dataframe(chunk_size=LOADER_CHUNK_SIZE, queryset=None):
+    """
+    Reports (all, or those in `queryset`) as a DataFrame, streamed from the DB in chunks
+    into preallocated typed columns (categoricals for location / type / status / severity).
+    Same content as clean_reports_dataframe(pd.DataFrame(Report.objects.values(...))).
+    """
+    qs = (Report.objects.all() if queryset is None else queryset).values_list(*EXPECTED_COLS).order_by()
+    buffers = _ColumnBuffers(qs.count())
+    chunk = []
+    for row in qs.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            buffers.append(chunk)
+            chunk = []
+    if chunk:
+        buffers.append(chunk)
+    return buffers.to_dataframe().drop_duplicates()
 
 def get_combined_reports_dataframe():
     # For future use; currently same as DB
@@ -42,6 +149,57 @@ def filter_dataframe(df, year=None, location=None):
         df = df[df['location'].str.contains(location, case=False)]
     return df
 
+# --------------------------------- Rollup-backed data --------------------------------------
+ROLLUP_COLS = ["incident_date", "status", "severity", "count"]
+CREATED_ROLLUP_COLS = ["created_date", "status", "count"]
+
+def get_rollup_dataframe(year=None):
+    """
+    Weighted DataFrame (incident_date, status, severity, count) for the recent KPIs and the
+    weekly / monthly charts. Each row stands for `count` reports, so its size depends on days,
+    not reports.
+    """
+    qs = ReportDailyRollup.objects.filter(count__gt=0)
+    if year:
+        qs = qs.filter(incident_date__year=int(year))
+    rows = qs.order_by().values("incident_date", "status", "severity").annotate(n=Sum("count"))
+    df = pd.DataFrame(list(rows.values_list("incident_date", "status", "severity", "n")), columns=ROLLUP_COLS)
+    df['incident_date'] = pd.to_datetime(df['incident_date'])
+    df['severity'] = df['severity'].replace("", None)
+    return df
+
+def get_created_rollup_dataframe(year=None):
+    """Weighted DataFrame (created_at, status, count) for the daily chart."""
+    qs = ReportCreatedRollup.objects.filter(count__gt=0)
+    if year:
+        qs = qs.filter(incident_year=int(year))
+    rows = qs.order_by().values("created_date", "status").annotate(n=Sum("count"))
+    df = pd.DataFrame(list(rows.values_list("created_date", "status", "n")), columns=CREATED_ROLLUP_COLS)
+    # Local noon keeps the calendar day stable through the tz conversions in compute_recent_charts
+    tz = timezone.get_current_timezone_name()
+    df['created_at'] = (pd.to_datetime(df['created_date']) + pd.Timedelta(hours=12)).dt.tz_localize(tz)
+    return df.drop(columns=['created_date'])
+
+# Frames from get_rollup_dataframe carry a `count` weight per row, raw frames count each row once
+def _weights(df):
+    if 'count' in df.columns:
+        return df['count']
+    return pd.Series(1, index=df.index)
+
+def _total(df):
+    return int(_weights(df).sum())
+
+def _count(df, mask):
+    return int(_weights(df)[mask].sum())
+
+def _value_counts(df, col):
+    # Categorical columns list unused categories too, so zero counts are dropped
+    if 'count' in df.columns:
+        counts = df.groupby(col, sort=False, observed=True)['count'].sum()
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+    counts = df[col].value_counts()
+    return counts[counts > 0]
+
 # --------------------------------- Classic Dashboard Helpers --------------------------------------
 def get_kpis(df):
     if df.empty:
@@ -53,39 +211,49 @@ def get_kpis(df):
         }
 
     return {
-        "total_reports": len(df),
-        "top_report_type": df['report_type'].value_counts().idxmax(),
-        "solved_percentage": (df['status'] == "تم الحل").mean() * 100,
-        "top_region": df['location'].value_counts().idxmax(),
+        "total_reports": _total(df),
+        "top_report_type": _value_counts(df, 'report_type').idxmax(),
+        "solved_percentage": _count(df, df['status'] == "تم الحل") / _total(df) * 100,
+        "top_region": _value_counts(df, 'location').idxmax(),
     }
 
 
-def get_charts(df):
+def get_charts(df, heatmap=None):
     if df.empty:
         return {"monthly_reports": {}, "report_type_distribution": {}, "case_status_distribution": {}, "heatmap": []}
 
 
     df['month_num'] = df['incident_date'].dt.month
-    month_ar = {
-        1: "يناير", 2: "فبراير", 3: "مارس", 4: "أبريل",
-        5: "مايو", 6: "يونيو", 7: "يوليو", 8: "أغسطس",
-        9: "سبتمبر", 10: "أكتوبر", 11: "نوفمبر", 12: "ديسمبر"
-    }
-    df['month'] = df['month_num'].map(month_ar)
+    df['month'] = df['month_num'].map(MONTH_AR)
 
-    month_order = ["يناير","فبراير","مارس","أبريل","مايو","يونيو",
-                   "يوليو","أغسطس","سبتمبر","أكتوبر","نوفمبر","ديسمبر"]
+    monthly_counts = _value_counts(df, 'month').reindex(MONTH_ORDER, fill_value=0).to_dict()
 
-    monthly_counts = df['month'].value_counts().reindex(month_order, fill_value=0).to_dict()
+    if heatmap is None:
+        heatmap = df[['latitude', 'longitude']].dropna().to_dict(orient='records')
 
     return {
         "monthly_reports": monthly_counts,
-        "report_type_distribution": df['report_type'].value_counts().to_dict(),
-        "case_status_distribution": df['status'].value_counts().to_dict(),
-        "heatmap": df[['latitude', 'longitude']].dropna().to_dict(orient='records')
+        "report_type_distribution": _value_counts(df, 'report_type').to_dict(),
+        "case_status_distribution": _value_counts(df, 'status').to_dict(),
+        "heatmap": heatmap
     }
 
 # -------------------------- Recent Dashboard Helpers ----------------------------------------
+# Window codes for compute_recent_kpis, by day offset from the latest incident date
+WINDOW_TODAY, WINDOW_YESTERDAY, WINDOW_RECENT, WINDOW_PREVIOUS, WINDOW_OLDER = range(5)
+
+def _category_codes(series, wanted):
+    """Index of each value in `wanted` (len(wanted) for anything else), one hash pass."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    lookup = np.full(len(uniques) + 1, len(wanted), dtype=np.int64)  # last slot: NaN (code -1)
+    for i, value in enumerate(uniques):
+        if value in wanted:
+            lookup[i] = wanted.index(value)
+    return lookup[codes]
+
 def compute_recent_kpis(df):
     if df.empty:
         return {
@@ -95,12 +263,6 @@ def compute_recent_kpis(df):
             "critical_reports": {"value": 0, "change": 0, "trend": "لا تغيير"},
         }
 
-    today = df['incident_date'].max().normalize()
-    four_months_ago = today - pd.DateOffset(months=4)
-    four_months_before_that = four_months_ago - pd.DateOffset(months=4)
-    yesterday = today - timedelta(days=1)
-    day_before_yesterday = yesterday - timedelta(days=1)
-
     def calc_change(current, previous):
         if previous == 0:
             return (0, "لا تغيير") if current == 0 else (100, "زيادة")
@@ -108,28 +270,46 @@ def compute_recent_kpis(df):
         trend = "زيادة" if change > 0 else "انخفاض" if change < 0 else "لا تغيير"
         return round(abs(change), 2), trend
 
+    # Integer day offsets from the latest incident date (0 = today, 1 = yesterday)
+    days = df['incident_date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    valid = ~np.isnat(days)
+    today = days[valid].max() if valid.any() else np.datetime64('NaT', 'D')
+    four_months_ago = pd.Timestamp(today) - pd.DateOffset(months=4)
+    four_months_before_that = four_months_ago - pd.DateOffset(months=4)
+    recent_days = (pd.Timestamp(today) - four_months_ago).days
+    previous_days = (pd.Timestamp(today) - four_months_before_that).days
+
+    offsets = np.where(valid, (today - days).astype(np.int64), np.iinfo(np.int64).max)
+    window = np.searchsorted(np.array([0, 1, recent_days, previous_days]), offsets, side='left')
+
+    # One bincount over (window, status, severity) gives every KPI below
+    status = _category_codes(df['status'], ["تم استلام البلاغ", "قيد المراجعة"])
+    critical = _category_codes(df['severity'], ["حرج"])
+    bins = (window * 3 + status) * 2 + critical
+    weights = df['count'].to_numpy() if 'count' in df.columns else None
+    counts = np.bincount(bins, weights=weights, minlength=5 * 3 * 2).reshape(5, 3, 2)
+    counts = counts.round().astype(np.int64)
+
+    def total(window=slice(None), status=slice(None), severity=slice(None)):
+        return int(counts[window, status, severity].sum())
+
+    recent = slice(WINDOW_TODAY, WINDOW_PREVIOUS)
+
     # --- Total Reports KPI ---
-    total_reports_value = len(df)
-    recent_4m = len(df[df['incident_date'] >= four_months_ago])
-    prev_4m = len(df[(df['incident_date'] >= four_months_before_that) & (df['incident_date'] < four_months_ago)])
-    total_change, total_trend = calc_change(recent_4m, prev_4m)
+    total_reports_value = total()
+    total_change, total_trend = calc_change(total(recent), total(WINDOW_PREVIOUS))
 
     # --- New Reports KPI ---
-    new_reports_value = len(df[df['status'] == "تم استلام البلاغ"])
-    new_prev = len(df[df['incident_date'].dt.date == yesterday.date()])
-    new_change, new_trend = calc_change(new_reports_value, new_prev)
+    new_reports_value = total(status=0)
+    new_change, new_trend = calc_change(new_reports_value, total(WINDOW_YESTERDAY))
 
     # --- Under Review KPI ---
-    under_review_value = len(df[df['status'] == "قيد المراجعة"])
-    under_recent = len(df[(df['status'] == "قيد المراجعة") & (df['incident_date'] >= four_months_ago)])
-    under_prev = len(df[(df['status'] == "قيد المراجعة") & (df['incident_date'] >= four_months_before_that) & (df['incident_date'] < four_months_ago)])
-    under_change, under_trend = calc_change(under_recent, under_prev)
+    under_review_value = total(status=1)
+    under_change, under_trend = calc_change(total(recent, 1), total(WINDOW_PREVIOUS, 1))
 
     # --- Critical Reports KPI ---
-    critical_value = len(df[df['severity'] == "حرج"])
-    critical_recent = len(df[(df['severity'] == "حرج") & (df['incident_date'].dt.date == today.date())])
-    critical_prev = len(df[(df['severity'] == "حرج") & (df['incident_date'].dt.date == yesterday.date())])
-    critical_change, critical_trend = calc_change(critical_recent, critical_prev)
+    critical_value = total(severity=0)
+    critical_change, critical_trend = calc_change(total(WINDOW_TODAY, severity=0), total(WINDOW_YESTERDAY, severity=0))
 
     return {
         "total_reports": {"value": total_reports_value, "change": total_change, "trend": total_trend},
@@ -138,7 +318,7 @@ def compute_recent_kpis(df):
         "critical_reports": {"value": critical_value, "change": critical_change, "trend": critical_trend},
     }
 
-def compute_recent_charts(df, period="daily"):
+def compute_recent_charts(df, period="daily", heatmap=None):
     if df.empty:
         return {"bar_chart": {}, "status_distribution": {}, "heatmap": []}
 
@@ -150,14 +330,15 @@ def compute_recent_charts(df, period="daily"):
     else:  # weekly أو monthly
         date_col = 'incident_date'
 
-    # Convert column to Cairo time to avoid wrong day problems
+    # Convert column to local time (TIME_ZONE) to avoid wrong day problems
     if df_filtered[date_col].dt.tz is not None:
         df_filtered[date_col] = df_filtered[date_col].dt.tz_convert(None)
 
     if period == "daily":
-        # Convert to UTC then Cairo timezone
-        df_filtered[date_col] = df_filtered[date_col].dt.tz_localize('UTC').dt.tz_convert('Africa/Cairo')
-        today = pd.Timestamp.today(tz='Africa/Cairo').normalize()
+        # Convert to UTC then the local timezone, the one the created-date rollup is bucketed in
+        tz = timezone.get_current_timezone_name()
+        df_filtered[date_col] = df_filtered[date_col].dt.tz_localize('UTC').dt.tz_convert(tz)
+        today = pd.Timestamp.today(tz=tz).normalize()
         start_date = today - pd.Timedelta(days=6)
         df_filtered = df_filtered[df_filtered[date_col] >= start_date]
 
@@ -173,7 +354,7 @@ def compute_recent_charts(df, period="daily"):
         }
         df_filtered['bucket'] = df_filtered[date_col].dt.day_name().map(en_to_ar_days)
         day_order = ["الاثنين","الثلاثاء","الأربعاء","الخميس","الجمعة","السبت","الأحد"]
-        bar_chart = df_filtered['bucket'].value_counts().reindex(day_order, fill_value=0).to_dict()
+        bar_chart = _value_counts(df_filtered, 'bucket').reindex(day_order, fill_value=0).to_dict()
 
     elif period == "weekly":
         today = pd.Timestamp.today().normalize()
@@ -183,7 +364,7 @@ def compute_recent_charts(df, period="daily"):
         df_filtered['week_number'] = ((today - df_filtered[date_col]).dt.days // 7 + 1)
         df_filtered['bucket'] = "الأسبوع " + df_filtered['week_number'].astype(str)
         week_order = ["الأسبوع 4","الأسبوع 3","الأسبوع 2","الأسبوع 1"]  # ترتيب من الأقدم للأحدث
-        bar_chart = df_filtered['bucket'].value_counts().reindex(week_order, fill_value=0).to_dict()
+        bar_chart = _value_counts(df_filtered, 'bucket').reindex(week_order, fill_value=0).to_dict()
 
     else:  # monthly
         today = pd.Timestamp.today().normalize()
@@ -198,13 +379,14 @@ def compute_recent_charts(df, period="daily"):
         df_filtered['bucket'] = df_filtered[date_col].dt.month.map(month_ar)
         month_order = ["يناير","فبراير","مارس","أبريل","مايو","يونيو",
                        "يوليو","أغسطس","سبتمبر","أكتوبر","نوفمبر","ديسمبر"]
-        bar_chart = df_filtered['bucket'].value_counts().reindex(month_order, fill_value=0).to_dict()
+        bar_chart = _value_counts(df_filtered, 'bucket').reindex(month_order, fill_value=0).to_dict()
 
     # Distribution of cases
-    status_distribution = df_filtered['status'].value_counts().to_dict()
+    status_distribution = _value_counts(df_filtered, 'status').to_dict()
 
     # heatmap
-    heatmap = df[['latitude', 'longitude']].dropna().to_dict(orient='records')
+    if heatmap is None:
+        heatmap = df[['latitude', 'longitude']].dropna().to_dict(orient='records')
 
     return {
         "bar_chart": bar_chart,
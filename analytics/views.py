@@ -1,8 +1,18 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
 from django.http import JsonResponse
-from .utils import get_db_reports_dataframe, filter_dataframe, get_kpis, get_charts, compute_recent_kpis, compute_recent_charts
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+import hashlib
+import json
+from datetime import date
+from .counters import get_status_counts
+from .engine import classic_dashboard, recent_dashboard
+from .heatmap import get_heatmap_cells, parse_bbox, clamp_zoom, default_zoom
+from .cache import cached_payload, role_class
 
 # ---------------------------- Custom Permission ----------------------------
 def is_active_user(user):
@@ -16,17 +26,16 @@ def dashboard_data(request):
     - Public 'site_stats' if user not authenticated or inactive
     - Other KPIs/charts require active user
     """
-    df = get_db_reports_dataframe()
-    df = filter_dataframe(df, year=request.GET.get("year"), location=request.GET.get("location"))
-
-    full_kpis = get_kpis(df)
+    year, location = request.GET.get("year"), request.GET.get("location")
 
     user = request.user
     if is_active_user(user):
-        return Response({
-            "kpis": full_kpis,
-            "charts": get_charts(df),
-        })
+        def compute():
+            kpis, charts = classic_dashboard(year=year, location=location)
+            return {"kpis": kpis, "charts": charts}
+
+        params = {"year": year, "location": location}
+        return Response(cached_payload("dashboard_data", params, role_class(user), compute))
     else:
         # Public access returns empty KPIs/charts
         return Response({
@@ -42,22 +51,50 @@ def dashboard_recent_data(request):
     - Only active users can see KPIs and charts
     - Public access returns empty KPIs/charts
     """
-    df = get_db_reports_dataframe()
-    df = filter_dataframe(df, year=request.GET.get("year"), location=request.GET.get("location"))
+    year, location = request.GET.get("year"), request.GET.get("location")
     period = request.GET.get("period", "daily")
 
     user = request.user
     if is_active_user(user):
-        return Response({
-            "kpis": compute_recent_kpis(df),
-            "charts": compute_recent_charts(df, period)
-        })
+        def compute():
+            kpis, charts = recent_dashboard(year=year, location=location, period=period)
+            return {"kpis": kpis, "charts": charts}
+
+        # Buckets are relative to today, so the day is part of the key
+        params = {"year": year, "location": location, "period": period, "today": date.today().isoformat()}
+        return Response(cached_payload("dashboard_recent_data", params, role_class(user), compute))
     else:
         return Response({
             "kpis": {},
             "charts": {}
         })
 
+# --------------------------- Heatmap ------------------------------------
+@api_view(['GET'])
+def dashboard_heatmap(request):
+    """
+    Heatmap API: report counts aggregated into grid cells.
+    - bbox=minLon,minLat,maxLon,maxLat limits the viewport (optional)
+    - zoom sets the cell size (map zoom level)
+    - Only active users can see it
+    """
+    user = request.user
+    if not is_active_user(user):
+        return Response({"cells": []})
+
+    try:
+        bbox = parse_bbox(request.GET["bbox"]) if request.GET.get("bbox") else None
+        zoom = clamp_zoom(request.GET.get("zoom", default_zoom()))
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    year, location = request.GET.get("year"), request.GET.get("location")
+
+    def compute():
+        return {"zoom": zoom, "cells": get_heatmap_cells(zoom=zoom, bbox=bbox, year=year, location=location)}
+
+    params = {"bbox": bbox, "zoom": zoom, "year": year, "location": location}
+    return Response(cached_payload("dashboard_heatmap", params, role_class(user), compute))
+
 # --------------------------------Public Site Stats -------------------------------------------------
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -65,16 +102,31 @@ def public_site_stats(request):
     """
     Public site stats endpoint.
     No authentication required.
-    Computes stats based on all reports.
+    Reads the maintained per-status counters (no table scan), is cached per data
+    version and supports conditional GETs (ETag / Last-Modified -> 304).
     """
-    df = get_db_reports_dataframe()
-    
-    data = {
-        "site_stats": {
-            "received_reports": len(df[df['status'] == "تم استلام البلاغ"]),
-            "in_progress_reports": len(df[df['status'] == "قيد المعالجة"]),
-            "closed_reports": len(df[df['status'] == "تم الإغلاق"]),
-            "collaborating_entities": 20  # fixed value
+    def compute():
+        statuses = ["تم استلام البلاغ", "قيد المعالجة", "تم الإغلاق"]
+        counts, last_modified = get_status_counts(statuses)
+        data = {
+            "site_stats": {
+                "received_reports": counts["تم استلام البلاغ"],
+                "in_progress_reports": counts["قيد المعالجة"],
+                "closed_reports": counts["تم الإغلاق"],
+                "collaborating_entities": 20  # fixed value
+            }
         }
-    }
-    return JsonResponse(data)
+        etag = '"%s"' % hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        return {"data": data, "etag": etag, "last_modified": int(last_modified.timestamp()) if last_modified else None}
+
+    cached = cached_payload("public_site_stats", {}, "public", compute)
+    etag, last_modified = cached["etag"], cached["last_modified"]
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(cached["data"])
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=getattr(settings, "PUBLIC_STATS_MAX_AGE", 60))
+    return response
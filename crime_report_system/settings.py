@@ -35,6 +35,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Anonymous resumable uploads (see reports.uploads): sessions opened / chunk requests per client
+    'DEFAULT_THROTTLE_RATES': {
+        'uploads': '30/hour',
+        'upload_chunks': '1200/hour',
+    },
 }
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
@@ -193,3 +198,114 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MEDIA_URL = '/media/' 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  
 
+
+# Analytics
+# Where the classic dashboard aggregates come from: rollup | orm | pandas (legacy fallback)
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "rollup")
+
+# Analytics responses are cached per data version (see analytics.cache). The version is a DB
+# row, so every worker stops serving a payload as soon as a write commits, whatever the backend.
+# LocMemCache evicts least-recently-used entries past MAX_ENTRIES; set REDIS_URL to share
+# one cache between gunicorn workers (configure Redis with maxmemory + allkeys-lru).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "analytics": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "analytics",
+        "OPTIONS": {"MAX_ENTRIES": 500, "CULL_FREQUENCY": 4},
+    },
+}
+
+if os.getenv("REDIS_URL"):
+    CACHES["analytics"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+        "KEY_PREFIX": "securereport",
+    }
+
+ANALYTICS_CACHE_ALIAS = "analytics"
+ANALYTICS_CACHE_TIMEOUT = int(os.getenv("ANALYTICS_CACHE_TIMEOUT", 300))
+
+# Heatmap grid: cells are stored at MAX_ZOOM and merged for coarser zoom levels
+ANALYTICS_HEATMAP_MAX_ZOOM = 14
+ANALYTICS_HEATMAP_DEFAULT_ZOOM = 6
+
+# Columnar snapshot (ANALYTICS_BACKEND=snapshot): build it with `manage.py analytics_snapshot build`
+ANALYTICS_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'var', 'analytics_snapshot')
+ANALYTICS_SNAPSHOT_ENABLED = ANALYTICS_BACKEND == "snapshot"
+# Refreshes re-read reports created up to LOOKBACK seconds before the previous load
+ANALYTICS_SNAPSHOT_LOOKBACK = 300
+
+# Browser / CDN cache lifetime (seconds) of the public site stats
+PUBLIC_STATS_MAX_AGE = 60
+
+# Report list / archive endpoints (cursor pagination, ?page_size= up to the max)
+REPORTS_PAGE_SIZE = 50
+REPORTS_MAX_PAGE_SIZE = 200
+
+# Public tracking endpoint (see reports.tracking): misses newer than MAX_AGE seconds are
+# answered from the in-process Bloom filter; payloads are kept in an LRU for CACHE_TTL seconds.
+# The version key and changelog that tell workers about each other's writes live in this cache alias.
+# Reloads re-read codes created up to LOOKBACK seconds before the previous load.
+TRACKING_CACHE_ALIAS = "analytics"
+TRACKING_CACHE_SIZE = 10000
+TRACKING_CACHE_TTL = 60
+TRACKING_INDEX_MAX_AGE = 5
+TRACKING_INDEX_LOOKBACK = 300
+
+# Tracking code numbers reserved per round trip by each process (see reports.tracking_codes)
+TRACKING_CODE_BLOCK_SIZE = 100
+
+# Largest accepted POST /api/reports/batch/
+REPORTS_BATCH_MAX_ITEMS = 500
+
+# Resumable attachment uploads (see reports.uploads): largest file, largest PUT chunk,
+# seconds a chunk write may hold an upload, and age at which unattached uploads are purged
+# (hourly by run_jobs, or with `manage.py purge_uploads`)
+REPORTS_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+REPORTS_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024
+REPORTS_UPLOAD_LEASE = 300
+REPORTS_UPLOAD_TTL = 24 * 60 * 60
+
+# Background jobs (`manage.py run_jobs`, see reports.jobs): parallel workers, retries,
+# seconds a worker may hold a job before another one takes it over, and how long finished
+# jobs are kept before run_jobs deletes them
+JOBS_WORKERS = 2
+JOBS_MAX_ATTEMPTS = 3
+JOBS_LEASE = 600
+JOBS_POLL_INTERVAL = 2.0
+JOBS_DONE_TTL = 7 * 24 * 60 * 60
+
+# Audio attachments (see reports.audio): compact Opus copy made with ffmpeg when it is installed
+FFMPEG_BINARY = "ffmpeg"
+AUDIO_TRANSCODE = True
+AUDIO_COMPACT_BITRATE = "24k"
+
+# Severity classifier (see reports.ml_model): fine-tuned BERT directory, loaded on first use.
+# SEVERITY_MODEL_WARMUP=1 loads it at boot instead; with gunicorn's preload_app (gunicorn.conf.py)
+# that is once in the master, and the workers share the weights.
+SEVERITY_MODEL_DIR = os.getenv("SEVERITY_MODEL_DIR", os.path.join(BASE_DIR, "reports", "final_trained_model_severity"))
+SEVERITY_MODEL_WARMUP = os.getenv("SEVERITY_MODEL_WARMUP", "") == "1"
+
+# predict_severity() micro-batching: concurrent calls in a process are grouped into one forward
+# pass of up to SEVERITY_BATCH_SIZE texts, waiting at most SEVERITY_BATCH_WAIT_MS for company.
+# Callers give up after SEVERITY_BATCH_TIMEOUT seconds (the first call also loads the weights).
+# SEVERITY_TORCH_THREADS sets torch's intra-op threads per process (None: torch's default).
+SEVERITY_BATCHING = True
+SEVERITY_BATCH_SIZE = 16
+SEVERITY_BATCH_WAIT_MS = 5
+SEVERITY_BATCH_TIMEOUT = 60
+SEVERITY_TORCH_THREADS = int(os.getenv("SEVERITY_TORCH_THREADS", 0)) or None
+
+# SEVERITY_INFERENCE_MODE: "fp32" or "int8" (dynamic int8 quantization of the Linear layers, CPU).
+# Compare both with `manage.py eval_severity_modes` before switching. Texts are truncated to
+# SEVERITY_MAX_LENGTH tokens.
+SEVERITY_INFERENCE_MODE = os.getenv("SEVERITY_INFERENCE_MODE", "fp32")
+SEVERITY_MAX_LENGTH = 256
+
+# New reports without a severity are scored by the job worker (reports.severity), in batches.
+# Opt in with SEVERITY_AUTO_SCORE=1 where the model weights are deployed.
+SEVERITY_AUTO_SCORE = os.getenv("SEVERITY_AUTO_SCORE", "") == "1"
+SEVERITY_JOB_BATCH = 32
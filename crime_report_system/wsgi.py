@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crime_report_system.settings')
 
 application = get_wsgi_application()
+
+# Load the tracking-code filter (and the severity model, if configured) before the first
+# request: with preload_app this runs once in the gunicorn master, before the workers fork
+from django.db import connections  # noqa: E402
+from reports.ml_model import warm_models  # noqa: E402
+from reports.tracking import warm_tracking_index  # noqa: E402
+warm_tracking_index()
+warm_models()
+connections.close_all()  # forked workers must not share the master's DB connections
@@ -0,0 +1,7 @@
+# gunicorn reads this file from the working directory (see Procfile).
+# preload_app imports the app (wsgi.py: tracking index, severity model weights) once in the
+# master; the forked workers then share those pages copy-on-write instead of each loading a copy.
+import os
+
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
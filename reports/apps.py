@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connect Report signal handlers)
+        from . import audio, severity  # noqa: F401  (register background job handlers)
@@ -0,0 +1,152 @@
+"""
+Background processing of audio attachments (an "audio.process" job per new audio blob).
+
+One ffmpeg run decodes the recording once and writes two outputs: a compact mono Opus/OGG
+transcode for listening, and 8 kHz mono PCM read from a pipe in small blocks to get the
+duration (browser WebM recordings carry none in their header) and the waveform preview.
+Without ffmpeg, WAV files still get a duration and waveform via the wave module;
+other formats are left unprocessed.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .jobs import enqueue, job_handler
+from .models import AttachmentBlob, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+AUDIO_JOB = "audio.process"
+COMPACT_DIR = "audio/compact"
+PCM_RATE = 8000
+PEAK_WINDOW = 0.1  # seconds per peak before downsampling to the preview
+WAVEFORM_POINTS = 100
+READ_SIZE = 64 * 1024
+
+
+def ffmpeg_binary():
+    return shutil.which(getattr(settings, "FFMPEG_BINARY", "ffmpeg"))
+
+
+class _PeakMeter:
+    """Peak level of every PEAK_WINDOW of a stream of int16 samples, fed in arbitrary blocks."""
+
+    def __init__(self, rate, channels=1):
+        self.window = max(1, int(rate * PEAK_WINDOW)) * channels
+        self.rate, self.channels = rate, channels
+        self.pending = np.empty(0, dtype=np.int32)
+        self.peaks = []
+        self.samples = 0
+
+    def feed(self, data):
+        samples = np.frombuffer(data, dtype="<i2").astype(np.int32)
+        self.samples += len(samples)
+        buf = np.concatenate([self.pending, np.abs(samples)])
+        whole = len(buf) - len(buf) % self.window
+        if whole:
+            self.peaks.extend(buf[:whole].reshape(-1, self.window).max(axis=1).tolist())
+        self.pending = buf[whole:]
+
+    def finish(self):
+        """(duration in seconds, waveform of WAVEFORM_POINTS levels 0-100)."""
+        if len(self.pending):
+            self.peaks.append(int(self.pending.max()))
+        duration = self.samples / self.channels / self.rate
+        if not self.peaks:
+            return duration, []
+        peaks = np.array(self.peaks, dtype=np.float64)
+        buckets = np.array_split(peaks, min(WAVEFORM_POINTS, len(peaks)))
+        levels = np.array([b.max() for b in buckets])
+        loudest = levels.max()
+        if loudest > 0:
+            levels = levels * 100 / loudest
+        return duration, [int(round(v)) for v in levels]
+
+
+def _decode_ffmpeg(ffmpeg, path, compact_path=None):
+    cmd = [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-vn"]
+    if compact_path:
+        bitrate = getattr(settings, "AUDIO_COMPACT_BITRATE", "24k")
+        cmd += ["-map", "0:a:0", "-ac", "1", "-c:a", "libopus", "-b:a", bitrate, "-f", "ogg", "-y", compact_path]
+    cmd += ["-map", "0:a:0", "-ac", "1", "-ar", str(PCM_RATE), "-f", "s16le", "pipe:1"]
+
+    meter = _PeakMeter(PCM_RATE)
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors)
+        with proc.stdout:
+            carry = b""
+            for block in iter(lambda: proc.stdout.read(READ_SIZE), b""):
+                block = carry + block
+                cut = len(block) - len(block) % 2
+                meter.feed(block[:cut])
+                carry = block[cut:]
+        if proc.wait():
+            errors.seek(0)
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {errors.read().decode(errors='replace')[-2000:]}")
+    return meter.finish()
+
+
+def _decode_wav(path):
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files can be read without ffmpeg.")
+        meter = _PeakMeter(w.getframerate(), w.getnchannels())
+        frames = READ_SIZE // (2 * w.getnchannels())
+        for block in iter(lambda: w.readframes(frames), b""):
+            meter.feed(block)
+    return meter.finish()
+
+
+@job_handler(AUDIO_JOB)
+def process_audio_blob(digest):
+    """Fill duration, waveform and compact_name of an audio blob."""
+    blob = AttachmentBlob.objects.filter(pk=digest).first()
+    if blob is None:
+        return  # every attachment of it was deleted meanwhile
+    path = default_storage.path(blob.name)
+    ffmpeg = ffmpeg_binary()
+    compact_name = ""
+
+    if ffmpeg:
+        transcode = getattr(settings, "AUDIO_TRANSCODE", True)
+        with tempfile.TemporaryDirectory() as tmp:
+            compact_path = os.path.join(tmp, "compact.ogg") if transcode else None
+            duration, waveform = _decode_ffmpeg(ffmpeg, path, compact_path)
+            if compact_path:
+                target = f"{COMPACT_DIR}/{digest[:2]}/{digest}.ogg"
+                if default_storage.exists(target):
+                    default_storage.delete(target)  # a previous attempt got this far
+                with open(compact_path, "rb") as f:
+                    compact_name = default_storage.save(target, File(f))
+    elif blob.content_type == "audio/wav":
+        duration, waveform = _decode_wav(path)
+    else:
+        logger.warning("ffmpeg not found: %s (%s) left unprocessed", blob.name, blob.content_type)
+        return
+
+    updated = AttachmentBlob.objects.filter(pk=digest).update(
+        duration=duration, waveform=waveform, compact_name=compact_name,
+    )
+    if not updated and compact_name:
+        default_storage.delete(compact_name)  # released while we were working
+
+
+def enqueue_unprocessed_audio():
+    """Queue audio blobs that were never processed (e.g. stored before the worker existed)."""
+    queued = BackgroundJob.objects.filter(kind=AUDIO_JOB, status__in=["pending", "running"]).values("object_id")
+    digests = list(
+        AttachmentBlob.objects.filter(content_type__startswith="audio/", duration__isnull=True)
+        .exclude(pk__in=queued)
+        .values_list("pk", flat=True)
+    )
+    for digest in digests:
+        enqueue(AUDIO_JOB, digest)
+    return len(digests)
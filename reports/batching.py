@@ -0,0 +1,108 @@
+"""
+In-process micro-batching: concurrent single-item calls are grouped into one batch call.
+
+Callers put (item, Future) on a queue and wait. One daemon thread per process takes the
+first queued item, keeps collecting until `max_batch` items or `max_wait` seconds have
+passed, runs `handler(items)` once and hands each caller its own result. If the batch call
+fails, its items are retried one by one so each caller gets its own result or exception;
+if it returns the wrong number of results, every caller of the batch gets an exception.
+Callers wait at most `timeout` seconds (None: forever) unless they pass their own.
+The thread is started on first use and again after a fork (gunicorn workers), since
+threads do not survive fork.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, handler, max_batch=16, max_wait=0.005, name="batcher", timeout=None):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stats = {"batches": 0, "items": 0, "largest_batch": 0}
+
+    def submit(self, item):
+        """Queue one item; returns a Future of its result."""
+        future = Future()
+        self._ensure_worker().put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(self.timeout if timeout is None else timeout)
+
+    def map(self, items, timeout=None):
+        """
+        Results of several items, in order; they are batched with whatever else is queued.
+        Raises concurrent.futures.TimeoutError when they take longer than `timeout` in total.
+        """
+        futures = [self.submit(item) for item in items]
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return [future.result(None if deadline is None else max(deadline - time.monotonic(), 0)) for future in futures]
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["mean_batch"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else None
+        stats["queued"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return stats
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._stats = {"batches": 0, "items": 0, "largest_batch": 0}
+                    thread = threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True)
+                    thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def _collect(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.handler(items))
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_one_by_one(batch)  # one bad item must not fail its neighbours
+            else:
+                if len(results) != len(batch):  # results can no longer be matched to their callers
+                    error = RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(batch)} items")
+                    for _, future in batch:
+                        future.set_exception(error)
+                else:
+                    for (_, future), result in zip(batch, results):
+                        future.set_result(result)
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def _run_one_by_one(self, batch):
+        for item, future in batch:
+            try:
+                future.set_result(self.handler([item])[0])
+            except Exception as e:
+                future.set_exception(e)
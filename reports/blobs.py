@@ -0,0 +1,145 @@
+"""
+Content-addressed attachment storage.
+
+Every attachment's content is hashed (SHA-256) in a single read pass that also keeps the
+first bytes for type sniffing. The content is written once, as blobs/<h[:2]>/<h[2:4]>/<h>.<ext>,
+the first time that hash is seen; later uploads of the same evidence only bump the
+blob's ref_count. Django's on-disk temporary uploads and finished resumable uploads are
+moved into place rather than copied. Deleting the last Attachment of a blob deletes it.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .audio import AUDIO_JOB
+from .jobs import enqueue
+from .models import Attachment, AttachmentBlob
+
+BLOB_DIR = "blobs"
+SNIFF_BYTES = 64
+
+# (checks, content type, extension): every (offset, bytes) check must match
+MAGIC = [
+    (((0, b"ID3"),), "audio/mpeg", ".mp3"),
+    (((0, b"OggS"),), "audio/ogg", ".ogg"),
+    (((0, b"fLaC"),), "audio/flac", ".flac"),
+    (((0, b"#!AMR"),), "audio/amr", ".amr"),
+    (((0, b"RIFF"), (8, b"WAVE")), "audio/wav", ".wav"),
+    (((0, b"\x1aE\xdf\xa3"),), "audio/webm", ".webm"),  # Matroska/WebM: the in-browser recorder format
+    (((4, b"ftypM4A "),), "audio/mp4", ".m4a"),
+    (((4, b"ftyp"),), "video/mp4", ".mp4"),
+    (((0, b"%PDF-"),), "application/pdf", ".pdf"),
+    (((0, b"\x89PNG\r\n\x1a\n"),), "image/png", ".png"),
+    (((0, b"\xff\xd8\xff"),), "image/jpeg", ".jpg"),
+    (((0, b"GIF87a"),), "image/gif", ".gif"),
+    (((0, b"GIF89a"),), "image/gif", ".gif"),
+    (((0, b"RIFF"), (8, b"WEBP")), "image/webp", ".webp"),
+    (((0, b"PK\x03\x04"),), "application/zip", ".zip"),  # also docx / xlsx
+    (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),), "application/msword", ".doc"),
+]
+UNKNOWN_TYPE = ("application/octet-stream", ".bin")
+
+
+def sniff(head):
+    """(content type, extension) from the leading bytes of a file."""
+    for checks, content_type, extension in MAGIC:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in checks):
+            return content_type, extension
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:  # MPEG audio frame sync
+        return ("audio/aac", ".aac") if head[1] & 0x06 == 0 else ("audio/mpeg", ".mp3")
+    return UNKNOWN_TYPE
+
+
+def is_audio(blob):
+    return blob.content_type.startswith("audio/")
+
+
+def blob_name(digest, extension):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def scan(chunks):
+    """One pass over the content: (sha256 hex digest, size, first SNIFF_BYTES bytes)."""
+    sha, size, head = hashlib.sha256(), 0, b""
+    for chunk in chunks:
+        sha.update(chunk)
+        if len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+        size += len(chunk)
+    return sha.hexdigest(), size, head
+
+
+def _acquire(content, digest, size, head):
+    """Take a reference on the blob for `digest`, writing `content` only if it is new."""
+    with transaction.atomic():
+        if AttachmentBlob.objects.filter(pk=digest).update(ref_count=F("ref_count") + 1):
+            return AttachmentBlob.objects.get(pk=digest)
+        content_type, extension = sniff(head)
+        name = blob_name(digest, extension)
+        # Left over by a rolled back transaction or a released blob: same hash, same bytes
+        saved = not default_storage.exists(name)
+        if saved:
+            name = default_storage.save(name, content)
+        try:
+            with transaction.atomic():
+                blob = AttachmentBlob.objects.create(
+                    sha256=digest, name=name, size=size, content_type=content_type, ref_count=1,
+                )
+        except IntegrityError:
+            # Stored concurrently by another request: use theirs
+            if saved and name != blob_name(digest, extension):
+                default_storage.delete(name)
+            AttachmentBlob.objects.filter(pk=digest).update(ref_count=F("ref_count") + 1)
+            return AttachmentBlob.objects.get(pk=digest)
+        if is_audio(blob):
+            enqueue(AUDIO_JOB, digest)  # duration, waveform and compact copy (see audio.py)
+        return blob
+
+
+def store_file(f):
+    """Blob for a Django File / UploadedFile (temporary uploads on disk are moved, not copied)."""
+    digest, size, head = scan(f.chunks())
+    return _acquire(f, digest, size, head)
+
+
+class _LocalFile(File):
+    # FileSystemStorage moves files that expose temporary_file_path() instead of copying them
+    def temporary_file_path(self):
+        return self.name
+
+
+def store_path(path):
+    """Blob for a file on local disk; the file is moved into the store or, if known, deleted."""
+    with open(path, "rb") as f:
+        digest, size, head = scan(File(f).chunks())
+        blob = _acquire(_LocalFile(f, name=path), digest, size, head)
+    if os.path.exists(path):
+        os.remove(path)
+    return blob
+
+
+def new_attachment(report, blob):
+    """Unsaved Attachment of `report` pointing at `blob` (audio or file by sniffed type)."""
+    field = "audio_recording" if is_audio(blob) else "file"
+    return Attachment(report=report, blob=blob, **{field: blob.name})
+
+
+def release_blob(digest):
+    """Drop one reference; the last one deletes the blob (its file once the transaction commits)."""
+    AttachmentBlob.objects.filter(pk=digest, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+    blob = AttachmentBlob.objects.filter(pk=digest, ref_count=0, attachments=None).first()
+    if blob is None:
+        return
+    blob.delete()
+
+    def delete_file():
+        if not AttachmentBlob.objects.filter(pk=digest).exists():  # not stored again meanwhile
+            default_storage.delete(blob.name)
+            if blob.compact_name:
+                default_storage.delete(blob.compact_name)
+
+    transaction.on_commit(delete_file)
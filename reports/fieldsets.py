@@ -0,0 +1,94 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .models import Report, Attachment
+
+# Report columns the cursor paginator may order by; always loaded so the cursor can be built
+KEY_COLUMNS = ("id", "created_at")
+
+REPORT_COLUMNS = {f.name for f in Report._meta.concrete_fields}
+# Relation -> prefetch (attachments bring their blob's metadata along)
+REPORT_RELATIONS = {
+    "criminal_infos": "criminal_infos",
+    "attachments": Prefetch("attachments", queryset=Attachment.objects.select_related("blob")),
+}
+
+
+def requested_fields(request, serializer_class):
+    """
+    Fields named in ?fields=a,b (in the serializer's order), or all of its fields.
+    Unknown names are a 400, so typos do not silently return empty objects.
+    """
+    available = list(serializer_class.Meta.fields)
+    raw = request.query_params.get("fields") if request is not None else None
+    if not raw:
+        return available
+    wanted = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = sorted(wanted - set(available))
+    if unknown:
+        raise ValidationError({"fields": f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}."})
+    return [name for name in available if name in wanted]
+
+
+def project(queryset, fields):
+    """Load only the requested columns, and prefetch only the requested relations."""
+    columns = [name for name in fields if name in REPORT_COLUMNS]
+    queryset = queryset.only(*dict.fromkeys(list(KEY_COLUMNS) + columns))
+    relations = [REPORT_RELATIONS[name] for name in fields if name in REPORT_RELATIONS]
+    return queryset.prefetch_related(*relations) if relations else queryset
+
+
+class SparseFieldsSerializerMixin:
+    """Serializer mixin: pass fields=[...] to drop every other declared field."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+# ------------------------ values() fast path for read-only projections ------------------------
+def _passthrough(value):
+    return value
+
+
+class ValuesProjection:
+    """
+    Serialize rows of Report.objects.values(...) exactly like `serializer_class`
+    would serialize model instances, without building model objects or running
+    DRF's per-field attribute lookup. Only for serializers of plain, read-only columns.
+    """
+    # Field types whose representation of a DB value is the value itself
+    PASSTHROUGH = (serializers.CharField, serializers.ChoiceField, serializers.IntegerField, serializers.BooleanField)
+
+    def __init__(self, serializer_class, fields):
+        declared = serializer_class().fields
+        self.fields = fields
+        self.columns = list(dict.fromkeys(list(KEY_COLUMNS) + fields))
+        self.converters = [
+            _passthrough if isinstance(declared[name], self.PASSTHROUGH) else declared[name].to_representation
+            for name in fields
+        ]
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def render_one(self, row):
+        return {
+            name: None if row[name] is None else convert(row[name])
+            for name, convert in zip(self.fields, self.converters)
+        }
+
+    def render(self, rows):
+        return [self.render_one(row) for row in rows]
+
+
+@lru_cache(maxsize=64)
+def values_projection(serializer_class, fields):
+    """Cached ValuesProjection for a serializer class and a tuple of field names."""
+    return ValuesProjection(serializer_class, list(fields))
@@ -0,0 +1,52 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+# query param -> model field, values may be comma separated (?status=a,b)
+CHOICE_FILTERS = {
+    "status": "status",
+    "report_type": "report_type",
+    "severity": "severity",
+}
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValidationError({name: "Use YYYY-MM-DD."})
+    return parsed
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_reports(queryset, params):
+    """
+    Apply the list filters from the query string, all in SQL:
+    status / report_type / severity, incident date range (date_from, date_to)
+    and creation date range (created_from, created_to). Date bounds are inclusive.
+    """
+    for param, field in CHOICE_FILTERS.items():
+        values = [v.strip() for v in params.get(param, "").split(",") if v.strip()]
+        if values:
+            queryset = queryset.filter(**{f"{field}__in": values})
+
+    date_from, date_to = _date_param(params, "date_from"), _date_param(params, "date_to")
+    if date_from:
+        queryset = queryset.filter(incident_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(incident_date__lte=date_to)
+
+    # Compare created_at to datetimes, not created_at__date, so an index can be used
+    created_from, created_to = _date_param(params, "created_from"), _date_param(params, "created_to")
+    if created_from:
+        queryset = queryset.filter(created_at__gte=_day_start(created_from))
+    if created_to:
+        queryset = queryset.filter(created_at__lt=_day_start(created_to + timedelta(days=1)))
+    return queryset
@@ -0,0 +1,156 @@
+"""
+Chunked CSV import of reports (see `manage.py import_reports`).
+
+The file is streamed in chunks; each chunk is converted and validated column-wise with
+pandas, then written with one bulk_create inside its own transaction together with the
+import checkpoint, so an interrupted import resumes exactly after the last committed chunk.
+"""
+import os
+import time
+
+import pandas as pd
+from django.db import transaction
+
+from .models import Report, CriminalInfo, ImportCheckpoint, REPORT_TYPES, CASE_STATUS, SEVERITY
+from .signals import reports_bulk_changed
+from .tracking_codes import allocate_tracking_codes
+
+REQUIRED_COLS = ["location", "incident_date", "report_details", "report_type", "status"]
+OPTIONAL_COLS = ["location_link", "contact_info", "latitude", "longitude", "severity"]
+TEXT_COLS = ["location", "location_link", "report_details", "contact_info", "report_type", "status", "severity"]
+
+# Spellings found in exported data -> canonical choice values
+STATUS_ALIASES = {"تم الاغلاق": "تم الإغلاق"}
+
+MAX_LENGTHS = {
+    f.name: f.max_length for f in Report._meta.concrete_fields if f.name in TEXT_COLS and f.max_length
+}
+
+
+def _choices(choices):
+    return [value for value, _ in choices]
+
+
+def prepare_chunk(df, date_format=None):
+    """
+    Convert and validate a chunk of raw CSV rows (all strings).
+    Returns (valid, rejected): `valid` has one typed column per Report field,
+    `rejected` keeps the raw rows plus the first failed check in `reason`.
+    """
+    raw = df.reindex(columns=REQUIRED_COLS + OPTIONAL_COLS, fill_value="")
+    text = {col: raw[col].fillna("").astype(str).str.strip() for col in TEXT_COLS}
+    text["status"] = text["status"].replace(STATUS_ALIASES)
+    incident_date = pd.to_datetime(raw["incident_date"], errors="coerce", format=date_format)
+    latitude = pd.to_numeric(raw["latitude"], errors="coerce")
+    longitude = pd.to_numeric(raw["longitude"], errors="coerce")
+
+    reason = pd.Series("", index=raw.index)
+
+    def reject(mask, why):
+        reason[mask & (reason == "")] = why
+
+    reject(text["location"] == "", "missing location")
+    reject(text["report_details"] == "", "missing report_details")
+    reject(incident_date.isna(), "invalid incident_date")
+    reject(~text["report_type"].isin(_choices(REPORT_TYPES)), "unknown report_type")
+    reject(~text["status"].isin(_choices(CASE_STATUS)), "unknown status")
+    reject((text["severity"] != "") & ~text["severity"].isin(_choices(SEVERITY)), "unknown severity")
+    for col, name, limit in (("latitude", latitude, 90), ("longitude", longitude, 180)):
+        given = raw[col].fillna("").astype(str).str.strip() != ""
+        reject(given & ~name.between(-limit, limit), f"invalid {col}")
+    for col, limit in MAX_LENGTHS.items():
+        reject(text[col].str.len() > limit, f"{col} too long")
+
+    ok = reason == ""
+
+    def optional(series):
+        series = series[ok].astype(object)
+        return series.where(series.notna() & (series != ""), None)
+
+    valid = pd.DataFrame({
+        "location": text["location"][ok],
+        "location_link": optional(text["location_link"]),
+        "latitude": optional(latitude),
+        "longitude": optional(longitude),
+        "incident_date": incident_date[ok].dt.date,
+        "report_details": text["report_details"][ok],
+        "contact_info": optional(text["contact_info"]),
+        "report_type": text["report_type"][ok],
+        "status": text["status"][ok],
+        "severity": optional(text["severity"]),
+    })
+    rejected = df[~ok].assign(reason=reason[~ok])
+    return valid, rejected
+
+
+def bulk_insert_reports(reports, criminal_infos=None):
+    """
+    Insert unsaved Report objects with bulk inserts (call inside a transaction):
+    tracking codes are assigned here, `criminal_infos` holds one list of CriminalInfo
+    field dicts per report. Aggregates and caches are notified with the new instances.
+    """
+    for report, code in zip(reports, allocate_tracking_codes(len(reports))):
+        report.tracking_code = code
+    Report.objects.bulk_create(reports, batch_size=1000)
+
+    if criminal_infos and any(criminal_infos):
+        if any(report.pk is None for report in reports):  # backends that cannot return ids
+            ids = dict(Report.objects.filter(tracking_code__in=[r.tracking_code for r in reports])
+                       .values_list("tracking_code", "id"))
+            for report in reports:
+                report.pk = ids[report.tracking_code]
+        CriminalInfo.objects.bulk_create(
+            [CriminalInfo(report=report, **info) for report, infos in zip(reports, criminal_infos) for info in infos],
+            batch_size=1000,
+        )
+
+    reports_bulk_changed.send(sender=Report, created=True, instances=reports)
+    return reports
+
+
+def build_reports(valid, is_fake=False):
+    columns = list(valid.columns)
+    return [Report(**dict(zip(columns, values)), is_fake=is_fake) for values in valid.itertuples(index=False, name=None)]
+
+
+def import_reports_csv(path, chunk_size=5000, resume=False, is_fake=False, date_format=None,
+                       rejects_path=None, progress=None):
+    """
+    Import a reports CSV in chunks. Returns the ImportCheckpoint with the final counts.
+    With resume=True the import continues after the last committed chunk of `path`.
+    `progress(checkpoint, rows_per_second)` is called after every chunk.
+    """
+    source = os.path.abspath(path)
+    file_size = os.path.getsize(source)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+    if not resume:
+        checkpoint.next_row = checkpoint.imported = checkpoint.rejected = 0
+    elif checkpoint.file_size and checkpoint.file_size != file_size:
+        raise ValueError(f"{source} changed since its checkpoint was written; import it again without resume.")
+    checkpoint.file_size = file_size
+    checkpoint.save()
+
+    columns = pd.read_csv(source, nrows=0).columns
+    missing = [col for col in REQUIRED_COLS if col not in columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    chunks = pd.read_csv(
+        source, dtype=str, keep_default_na=False, chunksize=chunk_size,
+        skiprows=range(1, checkpoint.next_row + 1),  # keep the header line
+    )
+    for chunk in chunks:
+        started = time.perf_counter()
+        valid, rejected = prepare_chunk(chunk, date_format=date_format)
+        with transaction.atomic():
+            reports = bulk_insert_reports(build_reports(valid, is_fake=is_fake))
+            checkpoint.next_row += len(chunk)
+            checkpoint.imported += len(reports)
+            checkpoint.rejected += len(rejected)
+            checkpoint.save()
+
+        if rejects_path and len(rejected):
+            rejected.to_csv(rejects_path, mode="a", index=False, header=not os.path.exists(rejects_path))
+        if progress:
+            progress(checkpoint, len(chunk) / max(time.perf_counter() - started, 1e-9))
+    return checkpoint
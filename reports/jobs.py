@@ -0,0 +1,235 @@
+"""
+DB-backed background jobs.
+
+A job is a (kind, object_id) row in BackgroundJob; `manage.py run_jobs` claims pending rows
+and calls the handler registered for their kind. Claims are conditional UPDATEs, so any
+number of worker threads and processes can share the table. A running job holds a lease:
+if its worker dies, the job is picked up again once the lease expires (a visibility timeout),
+and the outcome is only recorded while the claim still holds the lease. Finished jobs are
+deleted after JOBS_DONE_TTL (prune_jobs).
+Failures are retried with exponential backoff up to JOBS_MAX_ATTEMPTS times. Kinds registered
+with a batch size are claimed and handled up to that many at a time.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(object_id), or handler([object_id, ...]) for kinds in BATCH_SIZES
+HANDLERS = {}
+BATCH_SIZES = {}
+
+
+def job_handler(kind, batch_size=None):
+    """
+    Register the decorated function as the handler of `kind` jobs.
+    With `batch_size`, it receives a list of up to that many object ids per call.
+    """
+    def register(func):
+        HANDLERS[kind] = func
+        if batch_size:
+            BATCH_SIZES[kind] = batch_size
+        return func
+    return register
+
+
+def max_attempts():
+    return getattr(settings, "JOBS_MAX_ATTEMPTS", 3)
+
+
+def lease_seconds():
+    return getattr(settings, "JOBS_LEASE", 600)
+
+
+def done_ttl():
+    return getattr(settings, "JOBS_DONE_TTL", 7 * 24 * 60 * 60)
+
+
+def enqueue(kind, object_id, delay=0):
+    """Queue a job (written in the caller's transaction, so it only exists if that commits)."""
+    return BackgroundJob.objects.create(
+        kind=kind, object_id=str(object_id), run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(kind, object_ids):
+    run_after = timezone.now()
+    BackgroundJob.objects.bulk_create(
+        [BackgroundJob(kind=kind, object_id=str(pk), run_after=run_after) for pk in object_ids], batch_size=500,
+    )
+
+
+def _runnable(now, kinds=None):
+    qs = BackgroundJob.objects.filter(
+        Q(status="pending", run_after__lte=now) | Q(status="running", locked_until__lt=now)
+    )
+    return qs.filter(kind__in=kinds) if kinds else qs
+
+
+def claim(kinds=None, limit=1, scan=20):
+    """Lease up to `limit` of the oldest runnable jobs (a list, empty when there is nothing to do)."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    candidates = _runnable(now, kinds).order_by("run_after", "id").values_list("pk", flat=True)
+    claimed = []
+    for pk in candidates[:max(scan, limit * 2)]:
+        won = _runnable(now, kinds).filter(pk=pk).update(
+            status="running",
+            attempts=F("attempts") + 1,
+            locked_until=now + timedelta(seconds=lease_seconds()),
+            locked_by=token,
+        )
+        if won:  # otherwise another worker was faster
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return list(BackgroundJob.objects.filter(pk__in=claimed).order_by("run_after", "id"))
+
+
+def claim_next(kinds=None, scan=20):
+    """Lease the oldest runnable job, or return None when there is nothing to do."""
+    jobs = claim(kinds, 1, scan)
+    return jobs[0] if jobs else None
+
+
+def _leased(jobs):
+    """
+    Rows of the claimed jobs that are still held by their claim, grouped by claim token
+    (a job whose lease expired and was taken over by another worker is left out).
+    """
+    tokens = {}
+    for job in jobs:
+        tokens.setdefault(job.locked_by, []).append(job.pk)
+    for token, pks in tokens.items():
+        yield pks, BackgroundJob.objects.filter(pk__in=pks, status="running", locked_by=token)
+
+
+def _done(jobs):
+    for pks, rows in _leased(jobs):
+        updated = rows.update(status="done", locked_until=None, error="", updated_at=timezone.now())
+        if updated < len(pks):
+            logger.warning("%d of jobs %s finished after their lease was taken over", len(pks) - updated, pks)
+
+
+def _call(handler, job_or_jobs):
+    if isinstance(job_or_jobs, list):
+        handler([job.object_id for job in job_or_jobs])
+    else:
+        handler(job_or_jobs.object_id if job_or_jobs.kind not in BATCH_SIZES else [job_or_jobs.object_id])
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns True if it succeeded."""
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        error = f"No handler registered for {job.kind!r}."
+    elif job.attempts > max_attempts():
+        error = "Lease expired too many times (worker killed while running it?)."
+    else:
+        try:
+            _call(handler, job)
+        except Exception:
+            logger.exception("Job %s failed", job)
+            error = traceback.format_exc()
+        else:
+            _done([job])
+            return True
+    _failed(job, error, retry=handler is not None)
+    return False
+
+
+def run_batch(jobs):
+    """
+    Run claimed jobs of one batched kind with a single handler call. If that call fails the
+    batch is split in halves and retried, so one bad object only fails (and delays) its own job.
+    Returns the number that succeeded.
+    """
+    handler = HANDLERS.get(jobs[0].kind)
+    runnable = [job for job in jobs if job.attempts <= max_attempts()]
+    for job in jobs:
+        if job not in runnable or handler is None:
+            run_job(job)  # records why it cannot run
+    if handler is None or not runnable:
+        return 0
+    return _run_bisecting(handler, runnable)
+
+
+def _run_bisecting(handler, jobs):
+    try:
+        _call(handler, jobs)
+    except Exception:
+        if len(jobs) == 1:
+            logger.exception("Job %s failed", jobs[0])
+            _failed(jobs[0], traceback.format_exc())
+            return 0
+        middle = len(jobs) // 2
+        return _run_bisecting(handler, jobs[:middle]) + _run_bisecting(handler, jobs[middle:])
+    _done(jobs)
+    return len(jobs)
+
+
+def _failed(job, error, retry=True):
+    retry = retry and job.attempts < max_attempts()
+    updated = BackgroundJob.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by).update(
+        status="pending" if retry else "failed",
+        run_after=timezone.now() + timedelta(seconds=30 * 2 ** job.attempts),
+        locked_until=None,
+        error=error[-10000:],
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        logger.warning("Job %s failed after its lease was taken over; outcome not recorded", job)
+
+
+def run_pending(kinds=None, limit=None):
+    """Run runnable jobs in this thread until none is left (or `limit` ran). Returns the count."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next(kinds)
+        if job is None:
+            break
+        if job.kind in BATCH_SIZES:
+            jobs = [job] + claim([job.kind], BATCH_SIZES[job.kind] - 1)
+            run_batch(jobs)
+            count += len(jobs)
+        else:
+            run_job(job)
+            count += 1
+    return count
+
+
+def prune_jobs(max_age=None):
+    """Delete jobs that finished more than `max_age` seconds ago (default JOBS_DONE_TTL). Returns the count."""
+    cutoff = timezone.now() - timedelta(seconds=done_ttl() if max_age is None else max_age)
+    deleted, _ = BackgroundJob.objects.filter(status="done", updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def backlog():
+    """
+    Queue depth per kind: runnable, delayed (waiting for a retry), running and failed jobs,
+    and the age in seconds of the oldest runnable one.
+    """
+    now = timezone.now()
+    depth = {}
+    rows = (
+        BackgroundJob.objects.exclude(status="done")
+        .values("kind", "status", delayed=Q(status="pending", run_after__gt=now))
+        .annotate(n=Count("id"), oldest=Min("run_after"))
+        .order_by()
+    )
+    for row in rows:
+        kind = depth.setdefault(row["kind"], {"runnable": 0, "delayed": 0, "running": 0, "failed": 0, "oldest_runnable_age": None})
+        state = "delayed" if row["delayed"] else ("runnable" if row["status"] == "pending" else row["status"])
+        kind[state] += row["n"]
+        if state == "runnable":
+            kind["oldest_runnable_age"] = round((now - row["oldest"]).total_seconds(), 1)
+    return depth
@@ -0,0 +1,48 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.severity import backfill_severity
+
+
+class Command(BaseCommand):
+    help = "Predict the severity of unscored reports in batches (bulk updates, resumable after a failure)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=32,
+                            help="Texts per predict_severities() call (forward passes hold up to SEVERITY_BATCH_SIZE).")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Reports per transaction / checkpoint.")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many reports.")
+        parser.add_argument("--dry-run", action="store_true", help="Predict and report, write nothing.")
+        parser.add_argument("--restart", action="store_true", help="Start from the first report, not the checkpoint.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--batch-size and --chunk-size must be positive.")
+        started = time.perf_counter()
+        predicted = Counter()
+
+        def progress(checkpoint, labels, rate):
+            predicted.update(labels.values())
+            self.stdout.write(
+                f"id {checkpoint.last_id}: {checkpoint.processed} processed, "
+                f"{checkpoint.written} written ({rate:,.0f} reports/s)"
+            )
+
+        try:
+            checkpoint = backfill_severity(
+                batch_size=options["batch_size"], chunk_size=options["chunk_size"], limit=options["limit"],
+                dry_run=options["dry_run"], restart=options["restart"], progress=progress,
+            )
+        except (ImportError, OSError) as e:
+            raise CommandError(f"Severity model unavailable: {e}")
+
+        elapsed = time.perf_counter() - started
+        for label, count in predicted.most_common():
+            self.stdout.write(f"  {label}: {count}")
+        verb = "Would score" if options["dry_run"] else "Scored"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(predicted.values())} reports in {elapsed:.1f}s; "
+            f"checkpoint at id {checkpoint.last_id} ({checkpoint.written} written in total)."
+        ))
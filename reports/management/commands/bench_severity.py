@@ -0,0 +1,111 @@
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.batching import MicroBatcher
+from reports.ml_model import SEVERITY_MODEL, length_bucket, registry
+
+SENTENCES = [
+    "تعرضت لسرقة الهاتف المحمول أثناء ركوب المواصلات العامة.",
+    "قام شخص مجهول بالاعتداء علي بالضرب أمام المنزل ثم فر هاربا.",
+    "أتلقى رسائل تهديد وابتزاز منذ أسبوعين من حساب مجهول يطلب مبالغ مالية.",
+    "حدثت مشادة كلامية تطورت إلى تشابك بالأيدي في الشارع الرئيسي.",
+    "تحرش لفظي متكرر من مجموعة شباب بالقرب من محطة المترو في أوقات المساء.",
+]
+
+
+def synthetic_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(SENTENCES) for _ in range(rng.choice([1, 1, 2, 3, 6, 12]))) for _ in range(count)]
+
+
+class SimulatedClassifier:
+    """
+    Stand-in with the cost shape of a CPU forward pass: a fixed cost per call plus a cost per
+    padded token, one call at a time (the CPU is the shared resource). No torch needed.
+    """
+
+    def __init__(self, call_ms, token_us):
+        self.call_ms, self.token_us = call_ms, token_us
+        self._cpu = threading.Lock()
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        buckets = {}
+        for text in texts:
+            buckets.setdefault(length_bucket(len(text.split()) * 2), []).append(len(text.split()) * 2)
+        with self._cpu:
+            for lengths in buckets.values():
+                time.sleep(self.call_ms / 1000 + max(lengths) * len(lengths) * self.token_us / 1e6)
+        return ["متوسطة"] * len(texts)
+
+
+class Command(BaseCommand):
+    help = "Throughput and latency of predict_severity with and without micro-batching, under concurrent callers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=16, help="Concurrent callers.")
+        parser.add_argument("--requests", type=int, default=256, help="Texts classified per mode.")
+        parser.add_argument("--batch-size", type=int, default=getattr(settings, "SEVERITY_BATCH_SIZE", 16))
+        parser.add_argument("--wait-ms", type=float, default=getattr(settings, "SEVERITY_BATCH_WAIT_MS", 5))
+        parser.add_argument("--threads", type=int, default=getattr(settings, "SEVERITY_TORCH_THREADS", None),
+                            help="torch.set_num_threads for the run.")
+        parser.add_argument("--simulate", action="store_true",
+                            help="Use a cost model instead of the real weights (no torch needed).")
+        parser.add_argument("--sim-call-ms", type=float, default=25.0, help="Simulated fixed cost per forward pass.")
+        parser.add_argument("--sim-token-us", type=float, default=150.0, help="Simulated cost per padded token.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2 or options["clients"] < 1:
+            raise CommandError("--requests must be at least 2 (for the latency percentiles) and --clients at least 1.")
+        if options["simulate"]:
+            classifier = SimulatedClassifier(options["sim_call_ms"], options["sim_token_us"])
+        else:
+            try:
+                classifier = registry.get(SEVERITY_MODEL)
+            except Exception as e:
+                raise CommandError(f"Severity model unavailable ({e}); use --simulate to benchmark the batcher alone.")
+            if options["threads"]:
+                import torch
+                torch.set_num_threads(options["threads"])
+
+        texts = synthetic_texts(options["requests"])
+        classifier.predict(texts[0])  # warm-up
+        batcher = MicroBatcher(classifier.predict_batch, options["batch_size"], options["wait_ms"] / 1000, "bench")
+        for label, call in (("unbatched", classifier.predict), ("micro-batched", batcher)):
+            rate, latencies = self._run(call, texts, options["clients"])
+            q = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{label:14} {rate:7.1f} texts/s   latency p50 {q[49]:7.1f} ms  p95 {q[94]:7.1f} ms  p99 {q[98]:7.1f} ms"
+            )
+        self.stdout.write(f"batches: {batcher.stats()}")
+
+    def _run(self, call, texts, clients):
+        latencies, lock = [], threading.Lock()
+        todo = iter(texts)
+
+        def client():
+            while True:
+                with lock:
+                    text = next(todo, None)
+                if text is None:
+                    return
+                started = time.perf_counter()
+                call(text)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(texts) / (time.perf_counter() - started), latencies
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import CustomUser
+from reports.synthetic import seed_reports
+from reports.views import ReportListCreateView
+
+
+class _Rollback(Exception):
+    pass
+
+
+class ModelSerializerListView(ReportListCreateView):
+    """The Viewer list without the values() fast path, for comparison."""
+
+    def get_values_projection(self):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Requests/second of the Viewer report list with the values() fast path vs the ModelSerializer path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=400, help="Synthetic reports (half of them active).")
+        parser.add_argument("--page-size", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                seed_reports(options["rows"], related=0)
+                viewer = CustomUser.objects.create_user(email="bench-viewer@example.com", password=None, role="Viewer")
+                for label, view in (("values fast path", ReportListCreateView), ("ModelSerializer", ModelSerializerListView)):
+                    rate = self._bench(view.as_view(), viewer, options)
+                    self.stdout.write(f"{label:17} {rate:8.1f} req/s")
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _bench(self, view, user, options):
+        factory = APIRequestFactory()
+        url = f"/api/reports/?page_size={options['page_size']}"
+        started = time.perf_counter()
+        for _ in range(options["repeat"]):
+            request = factory.get(url)
+            force_authenticate(request, user)
+            view(request).render()
+        return options["repeat"] / (time.perf_counter() - started)
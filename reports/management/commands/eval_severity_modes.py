@@ -0,0 +1,140 @@
+import gc
+import io
+import multiprocessing
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from reports.ml_model import INFERENCE_MODES, load_severity_classifier, process_memory
+from reports.models import Report
+
+
+def weight_bytes(model):
+    """Size of the serialized state dict: what the weights cost in memory, packed int8 included."""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def evaluate_mode(mode, texts, batch_size, max_length, latency_samples, model_dir=None):
+    """Load the classifier in `mode`, label every text in batches and time single-text calls."""
+    rss_before = process_memory().get("rss")
+    started = time.perf_counter()
+    classifier = load_severity_classifier(mode=mode, max_length=max_length, model_dir=model_dir)
+    load_seconds = time.perf_counter() - started
+    rss_after = process_memory().get("rss")
+    classifier.predict(texts[0])  # warm-up
+
+    started = time.perf_counter()
+    labels = []
+    for i in range(0, len(texts), batch_size):
+        labels.extend(classifier.predict_batch(texts[i:i + batch_size]))
+    rate = len(texts) / (time.perf_counter() - started)
+
+    latencies = []
+    for text in texts[:latency_samples]:
+        started = time.perf_counter()
+        classifier.predict(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    result = {
+        "mode": mode,
+        "labels": labels,
+        "load_seconds": load_seconds,
+        "weight_bytes": weight_bytes(classifier.model),
+        "rss_growth": rss_after - rss_before if rss_before and rss_after else None,
+        "p50": q[49],
+        "p99": q[98],
+        "rate": rate,
+    }
+    del classifier
+    gc.collect()
+    return result
+
+
+class Command(BaseCommand):
+    help = "Compare the fp32 and int8 severity models: label agreement, latency and memory on a held-out sample."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", default=None,
+                            help="Held-out CSV with report_details (and optionally severity) instead of a DB sample.")
+        parser.add_argument("--sample", type=int, default=500, help="Texts to classify.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=getattr(settings, "SEVERITY_JOB_BATCH", 32))
+        parser.add_argument("--max-length", type=int, default=getattr(settings, "SEVERITY_MAX_LENGTH", 256))
+        parser.add_argument("--latency-samples", type=int, default=200, help="Single-text calls timed per mode.")
+        parser.add_argument("--model-dir", default=None, help="Weights directory (default: SEVERITY_MODEL_DIR).")
+
+    def handle(self, *args, **options):
+        if min(options["sample"], options["batch_size"], options["latency_samples"]) < 1:
+            raise CommandError("--sample, --batch-size and --latency-samples must be positive.")
+        texts, expected = self._sample(options)
+        if not texts:
+            raise CommandError("No texts to evaluate.")
+        self.stdout.write(f"{len(texts)} texts, max_length {options['max_length']}, batch size {options['batch_size']}")
+
+        results = {}
+        for mode in INFERENCE_MODES:
+            try:
+                results[mode] = self._isolated(
+                    evaluate_mode, mode, texts, options["batch_size"], options["max_length"],
+                    options["latency_samples"], options["model_dir"],
+                )
+            except (ImportError, OSError) as e:
+                raise CommandError(f"Severity model unavailable in {mode} mode: {e}")
+
+        self.stdout.write(f"{'mode':5} {'load s':>7} {'weights MB':>11} {'RSS +MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>8}")
+        for mode, r in results.items():
+            growth = f"{r['rss_growth'] / 2 ** 20:8.1f}" if r["rss_growth"] is not None else f"{'-':>8}"
+            self.stdout.write(
+                f"{mode:5} {r['load_seconds']:7.1f} {r['weight_bytes'] / 2 ** 20:11.1f} {growth} "
+                f"{r['p50']:8.1f} {r['p99']:8.1f} {r['rate']:8.1f}"
+            )
+
+        reference, quantized = results["fp32"]["labels"], results["int8"]["labels"]
+        agree = sum(a == b for a, b in zip(reference, quantized))
+        self.stdout.write(f"label agreement int8 vs fp32: {agree}/{len(texts)} ({100 * agree / len(texts):.2f}%)")
+        changed = Counter((a, b) for a, b in zip(reference, quantized) if a != b)
+        for (a, b), count in changed.most_common():
+            self.stdout.write(f"  {a} -> {b}: {count}")
+        if expected:
+            for mode, r in results.items():
+                scored = [(label, truth) for label, truth in zip(r["labels"], expected) if truth]
+                correct = sum(label == truth for label, truth in scored)
+                self.stdout.write(f"accuracy {mode}: {correct}/{len(scored)} ({100 * correct / max(len(scored), 1):.2f}%)")
+
+    def _sample(self, options):
+        """(texts, expected severities or None), a seeded random sample."""
+        rng = random.Random(options["seed"])
+        if options["csv"]:
+            try:
+                frame = pd.read_csv(options["csv"], dtype=str, keep_default_na=False)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+            if "report_details" not in frame.columns:
+                raise CommandError("The CSV needs a report_details column.")
+            frame = frame[frame["report_details"].str.strip() != ""]
+            rows = frame.sample(n=min(options["sample"], len(frame)), random_state=options["seed"])
+            texts = rows["report_details"].tolist()
+            return texts, rows["severity"].tolist() if "severity" in rows.columns else None
+        ids = list(Report.objects.exclude(report_details="").values_list("pk", flat=True))
+        chosen = rng.sample(ids, min(options["sample"], len(ids)))
+        texts = dict(Report.objects.filter(pk__in=chosen).values_list("pk", "report_details"))
+        return [texts[pk] for pk in chosen], None
+
+    def _isolated(self, func, *args):
+        # Each mode in a fresh forked process, so RSS growth and timings do not include the other model
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return func(*args)
+        connections.close_all()  # not shared with the child
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+            return pool.submit(func, *args).result()
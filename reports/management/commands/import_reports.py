@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.importing import import_reports_csv
+
+
+class Command(BaseCommand):
+    help = "Import reports from a CSV file in chunks (bulk inserts, resumable after a failure)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per chunk / transaction.")
+        parser.add_argument("--resume", action="store_true", help="Continue after the last committed chunk.")
+        parser.add_argument("--fake", action="store_true", help="Mark imported reports as is_fake (demo data).")
+        parser.add_argument("--date-format", default=None, help="strftime format of incident_date (inferred if omitted).")
+        parser.add_argument("--rejects", default=None, help="Append rejected rows and the reason to this CSV.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(checkpoint, rate):
+            self.stdout.write(
+                f"row {checkpoint.next_row}: {checkpoint.imported} imported, "
+                f"{checkpoint.rejected} rejected ({rate:,.0f} rows/s)"
+            )
+
+        try:
+            checkpoint = import_reports_csv(
+                options["path"], chunk_size=options["chunk_size"], resume=options["resume"],
+                is_fake=options["fake"], date_format=options["date_format"],
+                rejects_path=options["rejects"], progress=progress,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {checkpoint.imported} reports ({checkpoint.rejected} rejected) in {elapsed:.1f}s "
+            f"({checkpoint.next_row / max(elapsed, 1e-9):,.0f} rows/s overall)."
+        ))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reports.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads that were never attached to a report (and their part files)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age", type=int, default=getattr(settings, "REPORTS_UPLOAD_TTL", 24 * 60 * 60),
+                            help="Seconds since the last chunk (default REPORTS_UPLOAD_TTL).")
+
+    def handle(self, *args, **options):
+        count = purge_stale_uploads(options["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} stale upload(s)."))
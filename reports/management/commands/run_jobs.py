@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from reports.audio import enqueue_unprocessed_audio
+from reports.jobs import backlog, prune_jobs, run_pending
+from reports.uploads import purge_stale_uploads
+
+PRUNE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (audio processing, severity scoring, ...) from the BackgroundJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=getattr(settings, "JOBS_WORKERS", 2),
+                            help="Jobs run in parallel (threads; ffmpeg work runs in subprocesses).")
+        parser.add_argument("--kind", action="append", dest="kinds", help="Only run jobs of this kind (repeatable).")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of polling.")
+        parser.add_argument("--poll", type=float, default=getattr(settings, "JOBS_POLL_INTERVAL", 2.0),
+                            help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--enqueue-unprocessed-audio", action="store_true",
+                            help="First queue audio attachments that were never processed.")
+        parser.add_argument("--backlog", action="store_true", help="Print the queue depth per kind and exit.")
+        parser.add_argument("--keep-done", type=int, default=getattr(settings, "JOBS_DONE_TTL", 7 * 24 * 60 * 60),
+                            help="Seconds finished jobs are kept before being deleted (default JOBS_DONE_TTL).")
+
+    def handle(self, *args, **options):
+        if options["backlog"]:
+            for kind, depth in sorted(backlog().items()):
+                self.stdout.write(f"{kind}: " + ", ".join(f"{k}={v}" for k, v in depth.items()))
+            return
+        if options["enqueue_unprocessed_audio"]:
+            self.stdout.write(f"Queued {enqueue_unprocessed_audio()} audio blob(s).")
+        self.prune(options)
+        next_prune = time.monotonic() + PRUNE_INTERVAL
+
+        stop = threading.Event()
+        counts = [0] * max(1, options["workers"])
+
+        def work(slot):
+            try:
+                while not stop.is_set():
+                    ran = run_pending(options["kinds"])
+                    counts[slot] += ran
+                    if not ran:
+                        if options["once"]:
+                            return
+                        stop.wait(options["poll"])
+            finally:
+                connection.close()  # each thread has its own DB connection
+
+        threads = [threading.Thread(target=work, args=(slot,), daemon=True) for slot in range(len(counts))]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+                    if time.monotonic() >= next_prune:  # keep the table from growing while polling
+                        self.prune(options)
+                        next_prune = time.monotonic() + PRUNE_INTERVAL
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write("Stopping after the running jobs...")
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Ran {sum(counts)} job(s)."))
+
+    def prune(self, options):
+        """Delete old finished jobs and uploads never attached to a report."""
+        jobs = prune_jobs(options["keep_done"])
+        uploads = purge_stale_uploads(getattr(settings, "REPORTS_UPLOAD_TTL", 24 * 60 * 60))
+        self.stdout.write(f"Deleted {jobs} finished job(s) and {uploads} stale upload(s).")
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('status__in', ['تم الحل', 'تم الإغلاق']), _negated=True), fields=['id'], name='report_active_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('status__in', ['تم الحل', 'تم الإغلاق'])), fields=['id'], name='report_archived_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('status__in', ['تم الحل', 'تم الإغلاق']), _negated=True), fields=['created_at', 'id'], name='report_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('status__in', ['تم الحل', 'تم الإغلاق'])), fields=['created_at', 'id'], name='report_archived_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['created_at'], name='report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['incident_date'], name='report_incident_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['report_type', 'incident_date'], name='report_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['severity', 'incident_date'], name='report_severity_date_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+                ('key', models.CharField(max_length=64)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
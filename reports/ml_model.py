@@ -1,35 +1,244 @@
+"""
+Severity classifier (fine-tuned BERT) behind a lazy model registry.
+
+Nothing heavy happens at import: torch / transformers are imported and the weights read from
+settings.SEVERITY_MODEL_DIR on first use, once per process, under a lock. With
+SEVERITY_MODEL_WARMUP the weights are loaded at boot instead (wsgi.py); run under gunicorn
+with preload_app (gunicorn.conf.py) this happens once in the master and the forked workers
+share the weights copy-on-write. Warm-up only reads the weights: running torch in the master
+before fork could leave its thread pools unusable in the workers.
+
+SEVERITY_INFERENCE_MODE picks fp32 (the weights as trained) or int8: the Linear layers are
+dynamically quantized for CPU when the model is loaded, which makes those weights about 4x
+smaller and usually faster with nearly the same labels.
+`manage.py eval_severity_modes` compares the two on a sample before switching.
+"""
+import logging
 import os
-os.environ["TRANSFORMERS_NO_TF"] = "1" 
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .batching import MicroBatcher
+
+os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_MODEL = "severity"
+INFERENCE_MODES = ("fp32", "int8")
+
+
+class ModelRegistry:
+    """Named models, each built by its loader on first get() (thread-safe, once per process)."""
+
+    def __init__(self):
+        self._loaders = {}
+        self._locks = {}
+        self._models = {}
+        self._status = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"loaded": False, "load_seconds": None, "loaded_at": None, "loaded_by_pid": None, "error": None}
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                model = self._load(name)
+        return model
+
+    def _load(self, name):
+        started = time.perf_counter()
+        try:
+            model = self._loaders[name]()
+        except Exception as e:
+            # Not cached: the next get() tries again (e.g. once the weights are deployed)
+            self._status[name]["error"] = f"{type(e).__name__}: {e}"
+            raise
+        self._status[name].update(
+            loaded=True,
+            load_seconds=round(time.perf_counter() - started, 3),
+            loaded_at=timezone.now().isoformat(),
+            loaded_by_pid=os.getpid(),
+            error=None,
+        )
+        self._models[name] = model
+        return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Load `names` (default: all) now; failures are logged and left to the first get()."""
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception:
+                logger.warning("Model %r not warmed up, it will be loaded on first use.", name, exc_info=True)
+
+    def status(self):
+        pid = os.getpid()
+        return {
+            name: dict(status, shared_from_parent=status["loaded_by_pid"] not in (None, pid))
+            for name, status in self._status.items()
+        }
+
+
+def length_bucket(length):
+    """Token lengths are grouped by powers of two, so a batch pads each text to < 2x its length."""
+    return max(length - 1, 1).bit_length()
+
+
+def inference_settings():
+    mode = getattr(settings, "SEVERITY_INFERENCE_MODE", "fp32")
+    if mode not in INFERENCE_MODES:
+        raise ImproperlyConfigured(f"SEVERITY_INFERENCE_MODE must be one of {', '.join(INFERENCE_MODES)}, not {mode!r}.")
+    return {"mode": mode, "max_length": getattr(settings, "SEVERITY_MAX_LENGTH", 256)}
+
 
-import torch
-from transformers import BertTokenizer, BertForSequenceClassification
+def quantize_int8(model):
+    """Copy of `model` with every torch.nn.Linear dynamically quantized to int8 (CPU only)."""
+    import torch
 
-MODEL_DIR = r"D:\summer2025\Digitopea\DIGITOPIA\backend\crime_report_system\reports\final_trained_model_severity"
+    if torch.backends.quantized.engine == "none":
+        supported = torch.backends.quantized.supported_engines
+        torch.backends.quantized.engine = next(e for e in ("x86", "fbgemm", "qnnpack") if e in supported)
+    # Single-threaded, so quantizing during a preloading master's warm-up starts no thread pool
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    finally:
+        torch.set_num_threads(threads)
+
+
+class SeverityClassifier:
+    def __init__(self, tokenizer, model, mode="fp32", max_length=None):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.mode = mode
+        self.max_length = max_length  # tokens per text, None: the tokenizer's limit (512 for BERT)
+        self._threads_pid = None
+
+    def _set_threads(self):
+        # Per process: the intra-op pool of a forked worker is its own
+        threads = getattr(settings, "SEVERITY_TORCH_THREADS", None)
+        if threads and self._threads_pid != os.getpid():
+            import torch
+
+            torch.set_num_threads(threads)
+            self._threads_pid = os.getpid()
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        """One label per text; texts of similar token length share a forward pass."""
+        import torch
+
+        self._set_threads()
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_length)
+        buckets = {}
+        for i, ids in enumerate(encoded["input_ids"]):
+            buckets.setdefault(length_bucket(len(ids)), []).append(i)
+
+        labels = [None] * len(texts)
+        for indexes in buckets.values():
+            batch = self.tokenizer.pad(
+                {key: [values[i] for i in indexes] for key, values in encoded.items()}, return_tensors="pt",
+            )
+            with torch.inference_mode():
+                predicted = self.model(**batch).logits.argmax(dim=-1).tolist()
+            for i, class_id in zip(indexes, predicted):
+                labels[i] = self.model.config.id2label[class_id]
+        return labels
+
+
+def load_severity_classifier(mode=None, max_length=None, model_dir=None):
+    """A new classifier; arguments left out come from the settings."""
+    from transformers import BertTokenizer, BertForSequenceClassification
+
+    configured = inference_settings()
+    mode = mode or configured["mode"]
+    max_length = max_length or configured["max_length"]
+    model_dir = model_dir or settings.SEVERITY_MODEL_DIR
+    tokenizer = BertTokenizer.from_pretrained(model_dir, local_files_only=True)
+    model = BertForSequenceClassification.from_pretrained(model_dir, local_files_only=True)
+    model.eval()
+    if mode == "int8":
+        model = quantize_int8(model)
+    return SeverityClassifier(tokenizer, model, mode=mode, max_length=max_length)
+
+
+def _load_severity_classifier():
+    return load_severity_classifier()
+
+
+registry = ModelRegistry()
+registry.register(SEVERITY_MODEL, _load_severity_classifier)
+
+
+def _predict_severity_batch(texts):
+    return registry.get(SEVERITY_MODEL).predict_batch(texts)
+
+
+severity_batcher = MicroBatcher(
+    _predict_severity_batch,
+    max_batch=getattr(settings, "SEVERITY_BATCH_SIZE", 16),
+    max_wait=getattr(settings, "SEVERITY_BATCH_WAIT_MS", 5) / 1000,
+    name="severity-batcher",
+    timeout=getattr(settings, "SEVERITY_BATCH_TIMEOUT", 60),
+)
 
-tokenizer = BertTokenizer.from_pretrained(MODEL_DIR, local_files_only=True)
-model = BertForSequenceClassification.from_pretrained(MODEL_DIR, local_files_only=True)
 
 def predict_severity(text: str) -> str:
     """يتوقع مستوى الخطورة للنص"""
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predicted_class_id = outputs.logits.argmax().item()
-    return model.config.id2label[predicted_class_id]
+    return predict_severities([text])[0]
+
 
+def predict_severities(texts):
+    """One label per text. With SEVERITY_BATCHING, concurrent callers share forward passes."""
+    if getattr(settings, "SEVERITY_BATCHING", True):
+        return severity_batcher.map(texts)
+    return registry.get(SEVERITY_MODEL).predict_batch(texts)
 
-# ------------------------------------------------------------------------------------------------------------
 
-# from reports.models import Report
-# from reports.ml_model import predict_severity
+def warm_models():
+    """Load the models at boot if SEVERITY_MODEL_WARMUP is set (see the module docstring)."""
+    if getattr(settings, "SEVERITY_MODEL_WARMUP", False):
+        registry.warm_up()
 
-# # جلب كل البلاغات اللي severity فاضية
-# reports = Report.objects.filter(severity__isnull=True)
 
-# for report in reports:
-#     text = report.report_details 
-#     severity_pred = predict_severity(text) 
-#     report.severity = severity_pred
-#     report.save(update_fields=["severity"])
+def process_memory():
+    """Memory of this process in bytes: rss, and its shared / private split where the OS tells."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        return {
+            "rss": fields.get("Rss"),
+            "pss": fields.get("Pss"),
+            "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        }
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {"rss": None}
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"peak_rss": peak if os.uname().sysname == "Darwin" else peak * 1024}
 
-# print(f"✅ Done! Updated {reports.count()} reports with predicted severity.")
@@ -1,5 +1,7 @@
 import uuid
+
 from django.db import models
+from django.utils import timezone
 
 REPORT_TYPES = [
     ('اعتداء', 'اعتداء'),
@@ -17,6 +19,9 @@ CASE_STATUS = [
     ('تم الإغلاق', 'تم الإغلاق'),
 ]
 
+# Statuses of closed cases: shown in the archive, hidden from the active list
+ARCHIVED_STATUSES = ['تم الحل', 'تم الإغلاق']
+
 SEVERITY = [
     ("حرج", "حرج"),
     ("عالية", "عالية"),
@@ -45,7 +50,8 @@ class Report(models.Model):
     def save(self, *args, **kwargs):
         """Generate tracking code if not exists before saving."""
         if not self.tracking_code:
-            self.tracking_code = uuid.uuid4().hex[:12].upper()
+            from .tracking_codes import new_tracking_code
+            self.tracking_code = new_tracking_code()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -53,7 +59,21 @@ class Report(models.Model):
     
     # class Meta:
     #     ordering = ["+created_at"]
-    
+
+    class Meta:
+        # Partial indexes follow the active / archive split of the list endpoints,
+        # keyed on the cursor orderings (id, created_at); reports.tests.QueryPlanTests guards them
+        indexes = [
+            models.Index(fields=["id"], condition=~models.Q(status__in=ARCHIVED_STATUSES), name="report_active_id_idx"),
+            models.Index(fields=["id"], condition=models.Q(status__in=ARCHIVED_STATUSES), name="report_archived_id_idx"),
+            models.Index(fields=["created_at", "id"], condition=~models.Q(status__in=ARCHIVED_STATUSES), name="report_active_created_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(status__in=ARCHIVED_STATUSES), name="report_archived_created_idx"),
+            models.Index(fields=["created_at"], name="report_created_idx"),
+            models.Index(fields=["incident_date"], name="report_incident_date_idx"),
+            models.Index(fields=["report_type", "incident_date"], name="report_type_date_idx"),
+            models.Index(fields=["severity", "incident_date"], name="report_severity_date_idx"),
+        ]
+
 
 # Table for criminal information related to a report
 class CriminalInfo(models.Model):
@@ -66,10 +86,110 @@ class CriminalInfo(models.Model):
         return self.name
     
 
+# Attachment content stored once under its SHA-256 (see blobs.py)
+class AttachmentBlob(models.Model):
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)  # storage path, e.g. blobs/ab/cd/abcd....webm
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)  # sniffed from the magic bytes
+    ref_count = models.PositiveIntegerField(default=0)  # attachments pointing at this blob
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Filled in the background for audio (see audio.py)
+    duration = models.FloatField(null=True, blank=True)  # seconds
+    waveform = models.JSONField(null=True, blank=True)  # peak levels 0-100, oldest first
+    compact_name = models.CharField(max_length=255, blank=True)  # Opus/OGG transcode, if ffmpeg is available
+
+    def __str__(self):
+        return f"{self.name} x{self.ref_count}"
+
+
 # Table for attachments related to a report
 class Attachment(models.Model):
     report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name="attachments")
     audio_recording = models.FileField(upload_to="attachments/audio/", blank=True, null=True)  # => Audio files folder
     file = models.FileField(upload_to="attachments/files/", blank=True, null=True)  # => Other files folder
+    # Shared content; the file field above then holds the blob's name (older attachments have none)
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="attachments")
     def __str__(self):
         return f"Attachment for {self.report.tracking_code}"
+
+
+# Block-allocated counter behind tracking codes (see tracking_codes.py)
+class TrackingCodeSequence(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    # Feistel key (hex); must never change once codes have been issued
+    key = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"{self.name} @ {self.next_value}"
+
+
+# Progress of a chunked CSV import, committed with each chunk (see importing.py)
+class ImportCheckpoint(models.Model):
+    source = models.CharField(max_length=500, unique=True)  # absolute file path
+    file_size = models.BigIntegerField(default=0)
+    next_row = models.BigIntegerField(default=0)  # data rows (after the header) already processed
+    imported = models.BigIntegerField(default=0)
+    rejected = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ row {self.next_row}"
+
+
+# Resumable attachment upload: chunks are written to a part file under MEDIA_ROOT (see uploads.py)
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # doubles as the upload secret
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()  # total bytes announced by the client
+    offset = models.BigIntegerField(default=0)  # bytes received and acknowledged
+    lease_until = models.DateTimeField(null=True, blank=True)  # set while a request is writing a chunk
+    attachment = models.OneToOneField(
+        Attachment, on_delete=models.SET_NULL, null=True, blank=True, related_name="upload_session"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+# Progress of a resumable pass over the reports table by id (see severity.backfill_severity)
+class BackfillCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)  # every report up to this id has been processed
+    processed = models.BigIntegerField(default=0)
+    written = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ id {self.last_id}"
+
+
+JOB_STATUS = [
+    ('pending', 'pending'),
+    ('running', 'running'),
+    ('done', 'done'),
+    ('failed', 'failed'),
+]
+
+
+# Work done outside the request/response cycle by `manage.py run_jobs` (see jobs.py)
+class BackgroundJob(models.Model):
+    kind = models.CharField(max_length=50)  # handler name, e.g. "audio.process"
+    object_id = models.CharField(max_length=64)  # pk of the object the job works on
+    status = models.CharField(max_length=10, choices=JOB_STATUS, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease of the worker running it
+    locked_by = models.CharField(max_length=32, blank=True)  # token of the claim holding the lease
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind}({self.object_id}) {self.status}"
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"], name="job_status_run_after_idx")]
@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ReportCursorPagination(CursorPagination):
+    """
+    Keyset pagination for report lists: the cursor holds the last seen position,
+    so every page is one indexed range query no matter how deep it is.
+    ?ordering= picks the key (id / created_at, '-' for descending); ties break on id.
+    """
+    page_size = getattr(settings, "REPORTS_PAGE_SIZE", 50)
+    max_page_size = getattr(settings, "REPORTS_MAX_PAGE_SIZE", 200)
+    page_size_query_param = "page_size"
+    ordering = ("id",)
+    ordering_param = "ordering"
+    allowed_orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "created_at": ("created_at", "id"),
+        "-created_at": ("-created_at", "-id"),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.allowed_orderings.get(request.query_params.get(self.ordering_param), self.ordering)
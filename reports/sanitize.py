@@ -0,0 +1,34 @@
+"""
+Text sanitization for report intake: every HTML tag is stripped.
+
+bleach.clean() builds a new Cleaner (and html5lib parser / serializer) on every call;
+here one Cleaner per thread is reused (Cleaner instances are not thread safe).
+Text without markup characters is returned as is: for such input the cleaner's output
+is identical, so the parser is skipped entirely.
+"""
+import re
+import threading
+
+import bleach
+
+# Characters bleach may change: markup, and C0 controls other than tab / newline
+_NEEDS_CLEANING = re.compile(r"[<>&\x00-\x08\x0b-\x1f]")
+
+_local = threading.local()
+
+
+def get_cleaner():
+    cleaner = getattr(_local, "cleaner", None)
+    if cleaner is None:
+        cleaner = _local.cleaner = bleach.Cleaner(tags=[], attributes={}, strip=True)
+    return cleaner
+
+
+def sanitize_text(value):
+    """Same result as bleach.clean(str(value), tags=[], attributes={}, strip=True); falsy values pass through."""
+    if not value:
+        return value
+    value = str(value)
+    if not _NEEDS_CLEANING.search(value):
+        return value
+    return get_cleaner().clean(value)
@@ -1,7 +1,13 @@
 import json
-import bleach
+import os
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
-from .models import Report, CriminalInfo, Attachment
+from .fieldsets import SparseFieldsSerializerMixin
+from .models import Report, CriminalInfo, Attachment, UploadSession
+from .sanitize import sanitize_text
+from .blobs import new_attachment, store_file
+from .uploads import max_upload_size
 
 # --------------------Nested serializer for CriminalInfo-----------------------------
 class CriminalInfoNestedSerializer(serializers.ModelSerializer):
@@ -9,14 +15,26 @@ class CriminalInfoNestedSerializer(serializers.ModelSerializer):
         model = CriminalInfo
         fields = ["name", "description", "other_info"]
 
+    def validate_name(self, value):
+        return sanitize_text(value)
+
+    def validate_description(self, value):
+        return sanitize_text(value)
+
+    def validate_other_info(self, value):
+        return sanitize_text(value)
+
 # ------------------Nested serializer for Attachments------------------------------
 class AttachmentNestedSerializer(serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
     url = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
+    waveform = serializers.SerializerMethodField()
+    compact_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Attachment
-        fields = ["type", "url"]
+        fields = ["type", "url", "duration", "waveform", "compact_url"]
 
     def get_type(self, obj):
         """Return 'audio' if the attachment is audio, otherwise 'file'."""
@@ -24,32 +42,42 @@ class AttachmentNestedSerializer(serializers.ModelSerializer):
 
     def get_url(self, obj):
         """Build absolute URL for the file or audio, if request context is available."""
-        request = self.context.get("request")
         file_obj = obj.file or obj.audio_recording
         if not file_obj:
             return None
-        url = file_obj.url
-        return request.build_absolute_uri(url) if request else url
+        return self._absolute(file_obj.url)
 
-# -------------------Serializer for Report with nested criminal_infos and attachments---------------------
-class ReportNestedSerializer(serializers.ModelSerializer):
-    criminal_infos = CriminalInfoNestedSerializer(many=True, required=False)
-    attachments = AttachmentNestedSerializer(many=True, required=False)
+    # Audio metadata is filled in by the background worker: null until it has run
+    def get_duration(self, obj):
+        return obj.blob.duration if obj.blob_id else None
 
-    class Meta:
-        model = Report
-        fields = [
-            "id", "tracking_code","status", "location", "latitude", "location_link", "longitude", "report_type",
-            "incident_date", "report_details", "contact_info", "severity",
-            "criminal_infos", "attachments", "created_at"
-        ]
-        read_only_fields = ("id", "tracking_code")
+    def get_waveform(self, obj):
+        return obj.blob.waveform if obj.blob_id else None
+
+    def get_compact_url(self, obj):
+        """Small Opus/OGG copy of an audio recording, for listening in the browser."""
+        if not obj.blob_id or not obj.blob.compact_name:
+            return None
+        return self._absolute(default_storage.url(obj.blob.compact_name))
+
+    def _absolute(self, url):
+        request = self.context.get("request")
+        if not request:
+            return url
+        if "://" in url:  # storage already returned an absolute URL
+            return url
+        # Build scheme://host once per response instead of once per attachment
+        base = self.context.get("absolute_base")
+        if base is None:
+            base = self.context["absolute_base"] = request.build_absolute_uri("/").rstrip("/")
+        return base + url if url.startswith("/") else request.build_absolute_uri(url)
 
 # ----------------------Sanitization methods----------------------------------------------------------
+class SanitizedReportTextMixin:
+    """Strip every HTML tag from the free-text report fields."""
+
     def _sanitize(self, value):
-        if not value: 
-            return value
-        return bleach.clean(str(value), tags=[], attributes={}, strip=True)
+        return sanitize_text(value)
 
     def validate_location(self, value):
         return self._sanitize(value)
@@ -60,43 +88,107 @@ class ReportNestedSerializer(serializers.ModelSerializer):
     def validate_contact_info(self, value):
         return self._sanitize(value)
 
+# -------------------Serializer for Report with nested criminal_infos and attachments---------------------
+class ReportNestedSerializer(SanitizedReportTextMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    criminal_infos = CriminalInfoNestedSerializer(many=True, required=False)
+    attachments = AttachmentNestedSerializer(many=True, required=False)
+
+    class Meta:
+        model = Report
+        fields = [
+            "id", "tracking_code","status", "location", "latitude", "location_link", "longitude", "report_type",
+            "incident_date", "report_details", "contact_info", "severity",
+            "criminal_infos", "attachments", "created_at"
+        ]
+        read_only_fields = ("id", "tracking_code")
+
 # ------------------------Create method with nested criminal_infos and attachments-------------------------
     def create(self, validated_data):
-        criminal_infos_data = self.initial_data.get("criminal_infos", [])
+        criminal_infos_data = validated_data.pop("criminal_infos", None)
+        if criminal_infos_data is None:
+            criminal_infos_data = self._parse_criminal_infos(self.initial_data.get("criminal_infos", []))
         attachments_files = self.context['request'].FILES.getlist("attachments")
 
         # Create Report
         report = Report.objects.create(**validated_data)
 
         # Create CriminalInfo
-        try:
-            criminal_infos_data = json.loads(criminal_infos_data)
-        except Exception:
-            criminal_infos_data = []
         CriminalInfo.objects.bulk_create([CriminalInfo(report=report, **c) for c in criminal_infos_data])
 
-        # Create Attachments
-        attachments_to_create = []
-        for f in attachments_files:
-            if "audio" in f.name.lower() or f.name.lower().endswith((".mp3", ".wav", ".webm", ".ogg")):
-                attachments_to_create.append(Attachment(report=report, audio_recording=f))
-            else:
-                attachments_to_create.append(Attachment(report=report, file=f))
-        Attachment.objects.bulk_create(attachments_to_create)
+        # Create Attachments (content stored once per hash, audio or file by sniffed type)
+        Attachment.objects.bulk_create([new_attachment(report, store_file(f)) for f in attachments_files])
 
         return report
 
+    def _parse_criminal_infos(self, raw):
+        """Multipart forms send criminal_infos as a JSON string: validate (and sanitize) it like nested data."""
+        try:
+            items = json.loads(raw)
+        except Exception:
+            return []
+        if not isinstance(items, list):
+            return []
+        nested = CriminalInfoNestedSerializer(data=items, many=True)
+        if not nested.is_valid():
+            raise serializers.ValidationError({"criminal_infos": nested.errors})
+        return nested.validated_data
+
+# ---------------------------Serializer for one item of a batch submission---------------------------------
+class ReportBatchItemSerializer(SanitizedReportTextMixin, serializers.ModelSerializer):
+    """
+    Validates one report of a batch (JSON, no attachments).
+    Only validates: the batch view writes all valid items with bulk inserts.
+    """
+    criminal_infos = CriminalInfoNestedSerializer(many=True, required=False)
+
+    class Meta:
+        model = Report
+        fields = [
+            "status", "location", "latitude", "location_link", "longitude", "report_type",
+            "incident_date", "report_details", "contact_info", "severity", "criminal_infos",
+        ]
+
 # ---------------------------Serializer for tracking a report using tracking_code---------------------------------
-class ReportTrackingSerializer(serializers.ModelSerializer):
+class ReportTrackingSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    values_fast_path = True  # plain read-only columns: list/detail views render values() rows
+
     class Meta:
         model = Report
         fields = ["id", "tracking_code", "status", "report_type", "created_at"]
 
 # -----------------------------Serializer for read-only view for Viewer role---------------------------------------
-class ReportViewerSerializer(serializers.ModelSerializer):
+class ReportViewerSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Limited serializer for Viewer role to see only basic report info.
     """
+    values_fast_path = True
+
     class Meta:
         model = Report
         fields = ["id", "tracking_code", "status", "report_type", "created_at"]
+
+# -----------------------------Serializer for resumable attachment uploads---------------------------------------
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Open an upload with {filename, size}; `offset` is where the next chunk must start.
+    """
+    complete = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size", "offset", "complete", "attachment"]
+        read_only_fields = ("id", "offset", "attachment")
+
+    def get_complete(self, obj):
+        return obj.offset >= obj.size
+
+    def validate_filename(self, value):
+        value = get_valid_filename(os.path.basename(value))
+        if not value:
+            raise serializers.ValidationError("Invalid file name.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= max_upload_size():
+            raise serializers.ValidationError(f"Must be between 1 and {max_upload_size()} bytes.")
+        return value
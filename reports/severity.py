@@ -0,0 +1,119 @@
+"""
+Severity scoring off the submission path.
+
+New reports without a severity get a "severity.score" job (see jobs.py); `manage.py run_jobs`
+runs them in batches of SEVERITY_JOB_BATCH, through the severity micro-batcher so that worker
+threads share forward passes (see ml_model.predict_severities). Scores are only written to
+reports that are still unscored, so a severity set by staff meanwhile wins.
+
+Reports that predate the queue are scored by `manage.py backfill_severity` (backfill_severity).
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .jobs import enqueue_many, job_handler
+from .ml_model import predict_severities
+from .models import BackfillCheckpoint, Report
+from .signals import reports_bulk_changed
+
+SEVERITY_JOB = "severity.score"
+
+
+def auto_score_enabled():
+    return getattr(settings, "SEVERITY_AUTO_SCORE", False)
+
+
+def queue_severity_scoring(reports):
+    """Queue scoring for the given (saved) reports that have no severity yet."""
+    if not auto_score_enabled():
+        return
+    enqueue_many(SEVERITY_JOB, [r.pk for r in reports if not r.severity and r.report_details])
+
+
+def set_severities(labels):
+    """Write {report id: severity} to reports that are still unscored. Returns the number written."""
+    written = 0
+    with transaction.atomic():
+        # save() keeps the analytics aggregates and caches in step through the Report signals
+        for report in Report.objects.select_for_update().filter(pk__in=list(labels), severity__isnull=True):
+            report.severity = labels[report.pk]
+            report.save(update_fields=["severity"])
+            written += 1
+    return written
+
+
+@job_handler(SEVERITY_JOB, batch_size=getattr(settings, "SEVERITY_JOB_BATCH", 32))
+def score_reports(report_ids):
+    rows = list(
+        Report.objects.filter(pk__in=[int(pk) for pk in report_ids], severity__isnull=True)
+        .values_list("pk", "report_details")
+    )
+    if not rows:
+        return  # scored or deleted meanwhile
+    labels = predict_severities([text for _, text in rows])
+    set_severities({pk: label for (pk, _), label in zip(rows, labels)})
+
+
+BACKFILL_CHECKPOINT = "severity"
+
+
+def _write_backfill_chunk(labels, checkpoint, last_id, processed):
+    """Bulk-write {report id: severity} to the still-unscored reports and move the checkpoint."""
+    with transaction.atomic():
+        reports = list(Report.objects.select_for_update().filter(pk__in=list(labels), severity__isnull=True).order_by("pk"))
+        previous = [copy.copy(report) for report in reports]
+        for report in reports:
+            report.severity = labels[report.pk]
+        if reports:
+            Report.objects.bulk_update(reports, ["severity"], batch_size=500)
+            reports_bulk_changed.send(sender=Report, instances=reports, previous=previous)
+        checkpoint.last_id = last_id
+        checkpoint.processed += processed
+        checkpoint.written += len(reports)
+        checkpoint.save()
+
+
+def backfill_severity(batch_size=32, chunk_size=1000, limit=None, dry_run=False, restart=False, progress=None):
+    """
+    Score unscored reports in id order, `chunk_size` per transaction and `batch_size` texts per
+    predict_severities() call (forward passes hold up to SEVERITY_BATCH_SIZE of them).
+    Returns the BackfillCheckpoint. Runs continue after the last committed chunk unless
+    restart=True; dry_run=True predicts without writing reports or the checkpoint.
+    `progress(checkpoint, labels, reports_per_second)` is called after every chunk, with the
+    chunk's {report id: predicted severity}.
+    """
+    checkpoint = BackfillCheckpoint.objects.filter(name=BACKFILL_CHECKPOINT).first()
+    if checkpoint is None or restart:
+        checkpoint = checkpoint or BackfillCheckpoint(name=BACKFILL_CHECKPOINT)
+        checkpoint.last_id = checkpoint.processed = checkpoint.written = 0
+    if not dry_run:
+        checkpoint.save()
+    last_id, seen = checkpoint.last_id, 0
+    while limit is None or seen < limit:
+        started = time.perf_counter()
+        take = chunk_size if limit is None else min(chunk_size, limit - seen)
+        rows = list(
+            Report.objects.filter(pk__gt=last_id, severity__isnull=True)
+            .order_by("pk").values_list("pk", "report_details")[:take]
+        )
+        if not rows:
+            break
+        # Similar lengths in one model call keep the padding small; empty texts stay unscored
+        rows_by_length = sorted((row for row in rows if row[1]), key=lambda row: len(row[1]))
+        labels = {}
+        for i in range(0, len(rows_by_length), batch_size):
+            batch = rows_by_length[i:i + batch_size]
+            labels.update(zip((pk for pk, _ in batch), predict_severities([text for _, text in batch])))
+
+        last_id, seen = rows[-1][0], seen + len(rows)
+        if dry_run:
+            checkpoint.last_id = last_id
+            checkpoint.processed += len(rows)
+        else:
+            _write_backfill_chunk(labels, checkpoint, last_id, len(rows))
+        if progress:
+            progress(checkpoint, labels, len(rows) / max(time.perf_counter() - started, 1e-9))
+    return checkpoint
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .blobs import release_blob
+from .models import Report, Attachment
+from .tracking import PAYLOAD_FIELDS, tracking_index
+
+# Sent after reports are written without going through Report.save()/delete()
+# (bulk imports, queryset updates), so caches and aggregates can catch up.
+# Pass created=True when the batch only inserted new reports, and instances=[...]
+# (the inserted Report objects) so aggregates can be updated instead of rebuilt.
+# For in-place updates pass instances=[...] (as saved) and previous=[...] (the same
+# reports before the change, in the same order).
+reports_bulk_changed = Signal()
+
+
+# ------------------------- Keep the tracking index in sync -------------------------
+@receiver(pre_save, sender=Report)
+def remember_tracking_payload(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Store the tracked columns the report had before this save (None when not needed)."""
+    instance._previous_tracking_payload = None
+    if raw or instance.pk is None or (update_fields is not None and not set(update_fields) & set(PAYLOAD_FIELDS)):
+        return
+    instance._previous_tracking_payload = sender.objects.filter(pk=instance.pk).values(*PAYLOAD_FIELDS).first()
+
+
+def _update_tracking_index(previous, report):
+    """
+    Index one written report. `previous` maps PAYLOAD_FIELDS to the values before the write
+    (None for a new report): only new codes and changes to what a lookup returns touch the index.
+    """
+    code = report.tracking_code
+    if previous is None or previous["tracking_code"] != code:
+        tracking_index.added(code)
+        transaction.on_commit(lambda: tracking_index.publish(code, added=True))
+    if previous is not None and any(previous[field] != getattr(report, field) for field in PAYLOAD_FIELDS):
+        old_code = previous["tracking_code"]
+        tracking_index.forget(old_code)
+        transaction.on_commit(lambda: tracking_index.publish(old_code))
+
+
+@receiver(post_save, sender=Report)
+def update_tracking_index_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_tracking_payload", None)
+    if created or previous is not None:
+        _update_tracking_index(None if created else previous, instance)
+
+
+@receiver(post_delete, sender=Report)
+def update_tracking_index_on_delete(sender, instance, **kwargs):
+    code = instance.tracking_code
+    tracking_index.forget(code)
+    transaction.on_commit(lambda: tracking_index.publish(code))
+
+
+@receiver(reports_bulk_changed, sender=Report)
+def update_tracking_index_on_bulk_change(sender, created=False, instances=None, previous=None, **kwargs):
+    if created and instances:
+        # Inserts only: other workers reload new codes on their next miss, and keep their LRU
+        tracking_index.added_many(report.tracking_code for report in instances)
+        transaction.on_commit(lambda: tracking_index.publish(added=True))
+        return
+    if instances and previous:
+        # In-place updates: only reports whose tracking payload changed
+        for old, new in zip(previous, instances):
+            _update_tracking_index({field: getattr(old, field) for field in PAYLOAD_FIELDS}, new)
+        return
+    tracking_index.mark_stale()
+    # Other workers drop their LRU and pick up new codes on their next miss
+    transaction.on_commit(tracking_index.publish)
+
+
+# ------------------------- Reference-count attachment blobs -------------------------
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        release_blob(instance.blob_id)
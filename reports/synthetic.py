@@ -0,0 +1,31 @@
+from datetime import date
+
+from reports.models import Report, CriminalInfo, Attachment, ARCHIVED_STATUSES
+from reports.signals import reports_bulk_changed
+from reports.tracking_codes import allocate_tracking_codes
+
+# Synthetic data for the report endpoint tests and benchmarks
+
+
+def seed_reports(count, related=3):
+    """Insert `count` reports (half archived), each with `related` criminals and attachments."""
+    codes = allocate_tracking_codes(count)
+    reports = Report.objects.bulk_create([
+        Report(
+            location="القاهرة, مصر",
+            incident_date=date.today(),
+            report_details="بلاغ تجريبي",
+            status=ARCHIVED_STATUSES[0] if i % 2 else "قيد المراجعة",
+            tracking_code=codes[i],
+            is_fake=True,
+        )
+        for i in range(count)
+    ])
+    CriminalInfo.objects.bulk_create(
+        [CriminalInfo(report=r, name=f"مشتبه {n}") for r in reports for n in range(related)]
+    )
+    Attachment.objects.bulk_create(
+        [Attachment(report=r, file=f"attachments/files/{r.tracking_code}-{n}.pdf") for r in reports for n in range(related)]
+    )
+    reports_bulk_changed.send(sender=Report, created=True, instances=reports)
+    return reports
@@ -0,0 +1,839 @@
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+import bleach
+import pandas as pd
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from .batching import MicroBatcher
+from .blobs import new_attachment, store_file
+from .importing import bulk_insert_reports as import_bulk_insert, import_reports_csv
+from .jobs import HANDLERS, claim, enqueue, prune_jobs, run_job
+from .models import AttachmentBlob, BackfillCheckpoint, BackgroundJob, CriminalInfo, ImportCheckpoint, Report, TrackingCodeSequence, UploadSession
+from .sanitize import sanitize_text
+from .serializers import ReportNestedSerializer, ReportViewerSerializer
+from .synthetic import seed_reports
+from .tracking import TrackingIndex, tracking_index
+from .tracking_codes import ALPHABET, TrackingCodeAllocator, encode, normalize_tracking_code, scramble
+from .management.commands.run_jobs import Command as RunJobsCommand
+from .uploads import UploadRateThrottle
+from .utils import import_csv_to_reports
+
+SAMPLE_CSV = os.path.join(settings.BASE_DIR, "analytics", "data", "fake_reports.csv")
+
+# (name, role, url builder, max queries) -- authentication is forced, so budgets
+# cover only the endpoint's own queries and must not grow with the number of rows
+ENDPOINT_BUDGETS = [
+    ("list", "Admin", lambda r: "/api/reports/?page_size=200", 3),
+    ("list", "Viewer", lambda r: "/api/reports/?page_size=200", 1),
+    ("archive", "Admin", lambda r: "/api/reports/archive/?page_size=200", 3),
+    ("archive", "Viewer", lambda r: "/api/reports/archive/?page_size=200", 1),
+    ("detail", "Admin", lambda r: f"/api/reports/{r.id}/", 3),
+    ("detail", "Viewer", lambda r: f"/api/reports/{r.id}/", 1),
+    ("track", None, lambda r: f"/api/reports/track/{r.tracking_code}/", 1),
+]
+
+# Tables whose queries must always be served by an index
+PLAN_CHECKED_TABLES = ("reports_report", "reports_criminalinfo", "reports_attachment")
+
+# (name, role, url builder). Whole-table aggregates (analytics without a year, location
+# substring search) read every row by design and are not listed.
+PLAN_SCENARIOS = [
+    ("list", "Admin", lambda r: "/api/reports/"),
+    ("list by created_at", "Admin", lambda r: "/api/reports/?ordering=-created_at"),
+    ("list filtered", "Admin", lambda r: "/api/reports/?status=قيد المراجعة&severity=حرج&date_from=2024-01-01"),
+    ("list created range", "Viewer", lambda r: "/api/reports/?created_from=2024-01-01&ordering=created_at"),
+    ("list next page", "Viewer", None),  # the cursor of the first page of two
+    ("archive", "Admin", lambda r: "/api/reports/archive/"),
+    ("archive by created_at", "Viewer", lambda r: "/api/reports/archive/?ordering=-created_at"),
+    ("archive by type", "Admin", lambda r: "/api/reports/archive/?report_type=سرقة"),
+    ("detail", "Admin", lambda r: f"/api/reports/{r.id}/"),
+    ("track", None, lambda r: f"/api/reports/track/{r.tracking_code}/"),
+    ("analytics stats (orm, year)", "Admin", lambda r: f"/api/analytics/stats/?year={r.incident_date.year}"),
+]
+
+
+def full_scans(sql):
+    """SQLite plan lines of `sql` that scan a checked table without an index."""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        lines = [row[-1] for row in cursor.fetchall()]
+    pattern = re.compile(r"^SCAN (%s)(?: AS \w+)?$" % "|".join(PLAN_CHECKED_TABLES))
+    return [line for line in lines if pattern.match(line.strip())]
+
+
+class StaffUsersMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            role: CustomUser.objects.create_user(email=f"test-{role.lower()}@example.com", password=None, role=role)
+            for role in ("Admin", "Viewer")
+        }
+
+    def client_for(self, role):
+        client = APIClient()
+        if role:
+            client.force_authenticate(self.users[role])
+        return client
+
+
+class QueryBudgetTests(StaffUsersMixin, TestCase):
+    """Every report endpoint stays within its query budget, at 4 and at 200 reports."""
+
+    def query_counts(self, reports):
+        counts = {}
+        for name, role, url, _ in ENDPOINT_BUDGETS:
+            client = self.client_for(role)
+            client.get(url(reports[-1]))  # warm up: lazily built indexes are not part of the budget
+            tracking_index.forget(reports[0].tracking_code)  # the budget is for a tracking LRU miss
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url(reports[0]))
+            self.assertEqual(response.status_code, 200, f"{name} ({role})")
+            counts[name, role] = len(queries)
+        return counts
+
+    def test_query_budgets(self):
+        reports = seed_reports(4)
+        small = self.query_counts(reports)
+        large = self.query_counts(reports + seed_reports(196))
+        for name, role, _, budget in ENDPOINT_BUDGETS:
+            with self.subTest(endpoint=name, role=role or "anonymous"):
+                self.assertLessEqual(large[name, role], budget)
+                self.assertEqual(small[name, role], large[name, role], "query count grows with rows")
+
+
+class SparseFieldsetTests(StaffUsersMixin, TestCase):
+    """?fields= narrows the payload; without it the payload is what the serializers return."""
+
+    def setUp(self):
+        self.report = seed_reports(2)[0]  # active
+
+    def test_requested_fields_only(self):
+        for role, url in [
+            ("Admin", "/api/reports/?fields=status,id,criminal_infos"),
+            ("Viewer", "/api/reports/?fields=status,id"),
+            ("Admin", f"/api/reports/{self.report.id}/?fields=status,id"),
+            (None, f"/api/reports/track/{self.report.tracking_code}/?fields=status"),
+        ]:
+            with self.subTest(role=role, url=url):
+                data = self.client_for(role).get(url).json()
+                items = data["results"] if "results" in data else [data]
+                self.assertTrue(items)
+                expected = set(url.split("fields=")[1].split(","))
+                self.assertEqual([set(item) for item in items], [expected] * len(items))
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client_for("Admin").get("/api/reports/?fields=id,nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("nope", str(response.json()["fields"]))
+
+    def test_default_payload_unchanged(self):
+        for role, serializer_class in [("Admin", ReportNestedSerializer), ("Viewer", ReportViewerSerializer)]:
+            with self.subTest(role=role):
+                client = self.client_for(role)
+                item = client.get(f"/api/reports/{self.report.id}/").json()
+                request = client.get("/api/reports/").wsgi_request
+                expected = serializer_class(self.report, context={"request": request}).data
+                self.assertEqual(list(item), list(serializer_class.Meta.fields))
+                self.assertEqual(item, json.loads(json.dumps(expected, cls=DjangoJSONEncoder)))
+
+
+# Analytics answers from the DB (no cached payloads) through the ORM backend
+NO_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    "analytics": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Query plans are checked against SQLite only.")
+@override_settings(CACHES=NO_CACHES, ANALYTICS_BACKEND="orm")
+class CursorPaginationTests(StaffUsersMixin, TestCase):
+    """Walking the cursor visits every matching report once, in order, even across equal keys."""
+
+    def setUp(self):
+        seed_reports(24, related=0)
+        self.active = list(Report.objects.filter(status="قيد المراجعة").order_by("id"))
+        start = timezone.now() - timedelta(days=3)
+        for i, report in enumerate(self.active):  # groups of 4 reports created at the same instant
+            report.created_at = start + timedelta(days=i // 4)
+            report.report_type = "تحرش" if i % 3 else "ابتزاز"
+        Report.objects.bulk_update(self.active, ["created_at", "report_type"])
+
+    def walk(self, **params):
+        client, ids, pages = self.client_for("Admin"), [], 0
+        url = "/api/reports/?" + urlencode({"page_size": 3, "fields": "id", **params})
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [item["id"] for item in response.json()["results"]]
+            url, pages = response.json()["next"], pages + 1
+        return ids, pages
+
+    def test_equal_created_at_breaks_ties_on_id(self):
+        by_key = sorted(self.active, key=lambda r: (r.created_at, r.id))
+        for ordering, expected in [("created_at", by_key), ("-created_at", by_key[::-1])]:
+            with self.subTest(ordering=ordering):
+                ids, pages = self.walk(ordering=ordering)
+                self.assertEqual(ids, [r.id for r in expected])
+                self.assertEqual(pages, 4)
+
+    def test_filters_apply_to_every_page(self):
+        created_from = timezone.localdate(self.active[4].created_at)
+        expected = [
+            r.id for r in sorted(self.active, key=lambda r: (r.created_at, r.id), reverse=True)
+            if r.report_type == "تحرش" and timezone.localdate(r.created_at) >= created_from
+        ]
+        ids, pages = self.walk(ordering="-created_at", report_type="تحرش", created_from=created_from)
+        self.assertEqual((ids, pages), (expected, 2))
+        self.assertEqual(len(expected), 6)
+
+        ids, _ = self.walk(report_type="ابتزاز,تحرش", status=self.active[0].status)
+        self.assertEqual(ids, [r.id for r in self.active])
+        self.assertEqual(self.walk(report_type="سرقة")[0], [])
+        self.assertEqual(self.client_for("Admin").get("/api/reports/?created_from=yesterday").status_code, 400)
+
+
+class QueryPlanTests(StaffUsersMixin, TestCase):
+    """No query of the report endpoints scans a whole reports / criminals / attachments table."""
+
+    def test_no_full_table_scans(self):
+        reports = seed_reports(50)
+        for name, role, url in PLAN_SCENARIOS:
+            client = self.client_for(role)
+            url = url(reports[0]) if url else client.get("/api/reports/?page_size=2").data["next"]
+            with self.subTest(scenario=name), CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+                checked = [q["sql"] for q in queries.captured_queries if any(t in q["sql"] for t in PLAN_CHECKED_TABLES)]
+                scans = [f"{line}: {sql}" for sql in checked for line in full_scans(sql)]
+                self.assertEqual(scans, [])
+
+
+class JobLeaseTests(TestCase):
+    kind = "test.noop"
+
+    def setUp(self):
+        HANDLERS[self.kind] = lambda object_id: None
+        self.addCleanup(HANDLERS.pop, self.kind)
+
+    def taken_over(self):
+        """(stale, current): the claim whose lease expired and the other worker's claim of the same job."""
+        enqueue(self.kind, 1)
+        [stale] = claim([self.kind])
+        BackgroundJob.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [current] = claim([self.kind])
+        self.assertNotEqual(stale.locked_by, current.locked_by)
+        return stale, current
+
+    def test_outcome_needs_the_lease(self):
+        stale, current = self.taken_over()
+        with self.assertLogs("reports.jobs", level="WARNING") as logs:
+            run_job(stale)
+        self.assertEqual(logs.output, [f"WARNING:reports.jobs:1 of jobs [{stale.pk}] finished after their lease was taken over"])
+        self.assertEqual(BackgroundJob.objects.get().status, "running")
+        run_job(current)
+        self.assertEqual(BackgroundJob.objects.get().status, "done")
+
+    def test_failure_needs_the_lease(self):
+        HANDLERS[self.kind] = mock.Mock(side_effect=RuntimeError("boom"))
+        stale, current = self.taken_over()
+        with self.assertLogs("reports.jobs", level="WARNING") as logs:
+            run_job(stale)
+        self.assertEqual([r.getMessage() for r in logs.records], [
+            f"Job {stale} failed", f"Job {stale} failed after its lease was taken over; outcome not recorded",
+        ])
+        self.assertEqual(BackgroundJob.objects.get().status, "running")
+
+        with self.assertLogs("reports.jobs", level="ERROR"):
+            run_job(current)
+        job = BackgroundJob.objects.get()
+        self.assertEqual(job.status, "pending")  # retried later
+        self.assertIn("RuntimeError: boom", job.error)
+
+    def test_prune_deletes_old_done_jobs_only(self):
+        for object_id in range(3):
+            enqueue(self.kind, object_id)
+        for job in claim([self.kind], limit=2):
+            run_job(job)
+        self.assertEqual(prune_jobs(3600), 0)
+        BackgroundJob.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(prune_jobs(3600), 2)
+        self.assertEqual(list(BackgroundJob.objects.values_list("status", flat=True)), ["pending"])
+
+
+class TrackingIndexTests(TestCase):
+    def setUp(self):
+        caches[settings.TRACKING_CACHE_ALIAS].clear()
+        self.reports = seed_reports(3, related=0)
+        tracking_index.rebuild()
+        self.other = TrackingIndex()  # another worker sharing the cache
+        self.other.rebuild()
+        for index in (tracking_index, self.other):
+            for report in self.reports:
+                index.lookup(report.tracking_code, self.load)
+
+    @staticmethod
+    def load(code):
+        return Report.objects.filter(tracking_code=code).values("status").first()
+
+    def assertCached(self, index, report, status):
+        with self.assertNumQueries(0):
+            self.assertEqual(index.lookup(report.tracking_code, self.load), {"status": status})
+
+    def test_writes_invalidate_only_changed_payloads(self):
+        first, second, third = self.reports
+        with self.captureOnCommitCallbacks(execute=True):
+            first.severity = "حرج"
+            first.save(update_fields=["severity"])  # not part of the payload
+            second.status = "قيد المعالجة"
+            second.save()
+            created = seed_reports(1, related=0)[0]
+
+        for index in (tracking_index, self.other):
+            self.assertCached(index, first, first.status)
+            self.assertCached(index, third, third.status)
+            with self.assertNumQueries(1):
+                self.assertEqual(index.lookup(second.tracking_code, self.load), {"status": "قيد المعالجة"})
+        self.assertEqual(tracking_index.lookup(created.tracking_code, self.load), {"status": created.status})
+        self.assertEqual(self.other.lookup(created.tracking_code, self.load), {"status": created.status})
+
+    def test_lookups_do_not_wait_for_a_load(self):
+        done = threading.Event()
+        with tracking_index._load_lock:  # as if another thread were reloading the filter
+            threading.Thread(target=lambda: (tracking_index.lookup(self.reports[0].tracking_code, self.load), done.set())).start()
+            self.assertTrue(done.wait(5))
+
+
+def legacy_import_csv_to_reports(path):
+    """import_csv_to_reports before the chunked importer (one Report.objects.create() per row)."""
+    df = pd.read_csv(path)
+    df["incident_date"] = pd.to_datetime(df["incident_date"], errors="coerce")
+    for _, row in df.iterrows():
+        Report.objects.create(
+            location=row.get("location"),
+            location_link=row.get("location_link"),
+            latitude=pd.to_numeric(row.get("latitude"), errors="coerce"),
+            longitude=pd.to_numeric(row.get("longitude"), errors="coerce"),
+            incident_date=row.get("incident_date"),
+            report_details=row.get("report_details"),
+            report_type=row.get("report_type"),
+            status=row.get("status"),
+            contact_info=row.get("contact_info", None) if "contact_info" in row else None,
+            severity=None,
+            is_fake=True,
+        )
+
+
+class CsvFixtureMixin:
+    def write_csv(self, df):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        df.to_csv(path, index=False)
+        return path
+
+    def sample_rows(self, count, **filters):
+        df = pd.read_csv(SAMPLE_CSV, dtype=str, keep_default_na=False)
+        for col, value in filters.items():
+            df = df[df[col] != value]
+        return df.head(count).reset_index(drop=True)
+
+
+def _report_rows():
+    fields = [f.attname for f in Report._meta.concrete_fields if f.attname not in ("id", "tracking_code", "created_at")]
+    return sorted(Report.objects.values_list(*fields), key=str)
+
+
+class ImportTests(CsvFixtureMixin, TestCase):
+    def test_rejects_invalid_rows_only(self):
+        df = self.sample_rows(10)
+        df.loc[2, "report_type"] = "نوع غير معروف"
+        df.loc[5, "incident_date"] = "not a date"
+        df.loc[7, "latitude"] = "95"
+        df.loc[8, "status"] = "تم الاغلاق"  # known misspelling, imported as تم الإغلاق
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        rejects = os.path.join(tmp.name, "rejects.csv")
+
+        checkpoint = import_reports_csv(self.write_csv(df), chunk_size=4, rejects_path=rejects)
+        self.assertEqual((checkpoint.imported, checkpoint.rejected, checkpoint.next_row), (7, 3, 10))
+        self.assertEqual(Report.objects.count(), 7)
+        self.assertTrue(Report.objects.filter(status="تم الإغلاق", report_details=df.loc[8, "report_details"]).exists())
+        reasons = pd.read_csv(rejects, dtype=str)["reason"].tolist()
+        self.assertEqual(reasons, ["unknown report_type", "invalid incident_date", "invalid latitude"])
+
+    def test_duplicate_tracking_code_rolls_back_the_chunk(self):
+        path = self.write_csv(self.sample_rows(6))
+        import_reports_csv(path, chunk_size=3)
+        taken = list(Report.objects.values_list("tracking_code", flat=True)[:3])
+        with mock.patch("reports.importing.allocate_tracking_codes", return_value=taken):
+            with self.assertRaises(IntegrityError):
+                import_reports_csv(path, chunk_size=3)
+        # The failed chunk left neither rows nor checkpoint progress behind
+        self.assertEqual(Report.objects.count(), 6)
+        self.assertEqual(ImportCheckpoint.objects.get().next_row, 0)
+
+    def test_resume_after_interruption(self):
+        df = self.sample_rows(23)
+        df["report_details"] = [f"بلاغ رقم {i}" for i in range(len(df))]  # one row per report
+        path = self.write_csv(df)
+        real_insert, calls = import_bulk_insert, []
+
+        def failing_insert(reports):
+            calls.append(len(reports))
+            if len(calls) == 3:
+                raise DatabaseError("connection lost")
+            return real_insert(reports)
+
+        with mock.patch("reports.importing.bulk_insert_reports", side_effect=failing_insert):
+            with self.assertRaises(DatabaseError):
+                import_reports_csv(path, chunk_size=5)
+        self.assertEqual(Report.objects.count(), 10)
+        self.assertEqual(ImportCheckpoint.objects.get().next_row, 10)
+
+        checkpoint = import_reports_csv(path, chunk_size=5, resume=True)
+        self.assertEqual((checkpoint.next_row, checkpoint.imported, checkpoint.rejected), (23, 23, 0))
+        self.assertEqual(sorted(Report.objects.values_list("report_details", flat=True)), sorted(df["report_details"]))
+
+    def test_same_reports_as_legacy_import(self):
+        # The legacy import kept misspelled statuses as they were
+        path = self.write_csv(self.sample_rows(40, status="تم الاغلاق"))
+        legacy_import_csv_to_reports(path)
+        expected = _report_rows()
+        Report.objects.all().delete()
+        with redirect_stdout(io.StringIO()) as output:
+            import_csv_to_reports(path)
+        self.assertIn("Inserted 40 fake reports", output.getvalue())
+        self.assertEqual(expected, _report_rows())
+
+
+class IntakeSanitizeTests(StaffUsersMixin, TestCase):
+    def test_same_as_bleach_clean(self):
+        samples = [
+            "", None, "نص عادي بدون وسوم", "سطر\nجديد\tوتبويب", "<p>تمت <b>سرقة</b></p><script>alert(1)</script>",
+            "a < b & c > d", "&amp; &#60; &lt;", "<!-- تعليق -->نص", "\x00\x01تحكم\x1f", "<a href='x'>رابط</a>",
+        ]
+        for value in samples:
+            with self.subTest(value=value):
+                expected = bleach.clean(str(value), tags=[], attributes={}, strip=True) if value else value
+                self.assertEqual(sanitize_text(value), expected)
+
+    def test_invalid_criminal_info_rejects_the_report(self):
+        payload = {
+            "location": "القاهرة", "incident_date": "2024-05-01", "report_type": "سرقة",
+            "report_details": "<b>تفاصيل</b>",
+            "criminal_infos": json.dumps([{"name": "<i>مشتبه</i>"}, {"name": "x" * 500}]),
+        }
+        response = APIClient().post("/api/reports/", payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("criminal_infos", response.json())
+        self.assertFalse(Report.objects.exists())
+
+        payload["criminal_infos"] = json.dumps([{"name": "<i>مشتبه</i>"}])
+        response = APIClient().post("/api/reports/", payload)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Report.objects.get().report_details, "تفاصيل")
+        self.assertEqual(list(CriminalInfo.objects.values_list("name", flat=True)), ["مشتبه"])
+
+
+class BatchCreateTests(StaffUsersMixin, TestCase):
+    url = "/api/reports/batch/"
+
+    @staticmethod
+    def item(n, **overrides):
+        item = {
+            "location": "الجيزة", "incident_date": "2024-05-01", "report_type": "سرقة",
+            "report_details": f"<b>بلاغ</b> {n}", "criminal_infos": [{"name": f"مشتبه {n}"}],
+        }
+        item.update(overrides)
+        return item
+
+    def post(self, data):
+        return self.client_for("Admin").post(self.url, data, format="json")
+
+    def test_all_valid(self):
+        response = self.post({"reports": [self.item(0), self.item(1)]})
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual((data["created"], data["failed"]), (2, 0))
+        self.assertEqual([r["index"] for r in data["results"]], [0, 1])
+        for result in data["results"]:
+            report = Report.objects.get(pk=result["id"])
+            self.assertEqual(report.tracking_code, result["tracking_code"])
+            self.assertEqual(report.criminal_infos.count(), 1)
+        self.assertEqual(Report.objects.get(pk=data["results"][0]["id"]).report_details, "بلاغ 0")
+
+    def test_mixed_reports_errors_per_item_in_order(self):
+        items = [
+            self.item(0), self.item(1, report_type="نوع غير معروف"), self.item(2),
+            self.item(3, incident_date="not a date"), self.item(4, criminal_infos=[{"name": "x" * 500}]),
+        ]
+        response = self.post(items)
+        self.assertEqual(response.status_code, 207, response.content)
+        data = response.json()
+        self.assertEqual((data["created"], data["failed"]), (2, 3))
+        self.assertEqual([r["index"] for r in data["results"]], [0, 1, 2, 3, 4])
+        self.assertEqual([sorted(r) for r in data["results"]], [
+            ["id", "index", "tracking_code"], ["errors", "index"], ["id", "index", "tracking_code"], ["errors", "index"], ["errors", "index"],
+        ])
+        self.assertIn("report_type", data["results"][1]["errors"])
+        self.assertIn("incident_date", data["results"][3]["errors"])
+        self.assertIn("criminal_infos", data["results"][4]["errors"])
+        self.assertEqual(Report.objects.count(), 2)
+
+    def test_rejects_malformed_and_oversized_batches(self):
+        for data in [[], {"reports": "not a list"}, {"location": "الجيزة"}, [self.item(0, report_type="نوع غير معروف")]]:
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        with override_settings(REPORTS_BATCH_MAX_ITEMS=2):
+            response = self.post([self.item(n) for n in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("At most 2", response.json()["detail"])
+        self.assertFalse(Report.objects.exists())
+
+
+class MediaRootMixin:
+    """Runs each test against an empty temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class UploadTests(MediaRootMixin, TestCase):
+    data = b"0123456789"
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()  # throttle history
+        self.client = APIClient()
+
+    def open_session(self, size=len(data)):
+        return self.client.post("/api/reports/uploads/", {"filename": "evidence.bin", "size": size}, format="json")
+
+    def put(self, session_id, start, end):
+        return self.client.put(
+            f"/api/reports/uploads/{session_id}/", self.data[start:end + 1], content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.data)}",
+        )
+
+    def upload(self):
+        session_id = self.open_session().json()["id"]
+        self.assertEqual(self.put(session_id, 0, 9).status_code, 200)
+        return session_id
+
+    def test_resume_from_the_session_offset(self):
+        session_id = self.open_session().json()["id"]
+        self.assertEqual(self.put(session_id, 0, 3).json()["offset"], 4)
+
+        response = self.put(session_id, 0, 3)  # retried after a lost response
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("Resume from offset 4", response.json()["detail"])
+        progress = self.client.get(f"/api/reports/uploads/{session_id}/").json()
+        self.assertEqual((progress["offset"], progress["complete"]), (4, False))
+
+        self.assertEqual(self.put(session_id, 6, 9).status_code, 409)
+        done = self.put(session_id, 4, 9).json()
+        self.assertEqual((done["offset"], done["complete"]), (10, True))
+
+    def attach(self, url, report):
+        return self.client.post(url, {"tracking_code": report.tracking_code}, format="json")
+
+    def test_attach(self):
+        report, other = seed_reports(2, related=0)
+        session_id = self.open_session().json()["id"]
+        url = f"/api/reports/uploads/{session_id}/attach/"
+        self.put(session_id, 0, 3)
+        self.assertEqual(self.attach(url, report).status_code, 409)  # incomplete
+        self.put(session_id, 4, 9)
+        self.assertEqual(self.client.post(url, {"tracking_code": "NOPE"}, format="json").status_code, 404)
+
+        response = self.attach(url, report)
+        self.assertEqual(response.status_code, 201, response.content)
+        attachment = report.attachments.get()
+        self.assertTrue(response.json()["url"].endswith(attachment.file.name))
+        with attachment.file.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(os.listdir(os.path.join(settings.MEDIA_ROOT, "uploads", "partial")))
+
+        self.assertEqual(self.attach(url, report).json(), response.json())
+        self.assertEqual(self.attach(url, other).status_code, 409)
+        self.assertEqual(report.attachments.count(), 1)
+
+    def test_size_limit(self):
+        session_id = self.open_session().json()["id"]
+        with override_settings(REPORTS_UPLOAD_MAX_SIZE=8):
+            self.assertEqual(self.open_session().status_code, 400)
+            self.assertEqual(self.put(session_id, 0, 7).status_code, 200)
+            response = self.put(session_id, 8, 9)  # opened under the old limit, checked on every chunk
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("limited to 8 bytes", str(response.json()))
+
+    def test_anonymous_clients_are_throttled(self):
+        with mock.patch.dict(UploadRateThrottle.THROTTLE_RATES, {"uploads": "2/hour"}):
+            self.assertEqual([self.open_session().status_code for _ in range(3)], [201, 201, 429])
+        self.assertEqual(self.put(self.upload(), 0, 9).status_code, 409)  # chunks have their own budget
+
+    def test_run_jobs_purges_stale_uploads(self):
+        session_id = self.upload()
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        RunJobsCommand(stdout=io.StringIO()).prune({"keep_done": 3600})  # also run hourly while polling
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertFalse(os.listdir(os.path.join(settings.MEDIA_ROOT, "uploads", "partial")))
+
+
+class BlobMixin(MediaRootMixin):
+    content = b"%PDF-1.4 evidence"
+
+    def attach_copies(self, count):
+        """`count` attachments of one new report, each uploaded with the same content."""
+        report = seed_reports(1, related=0)[0]
+        for _ in range(count):
+            new_attachment(report, store_file(ContentFile(self.content, name="evidence.pdf"))).save()
+        return report, AttachmentBlob.objects.get()
+
+    @staticmethod
+    def stored(blob):
+        return default_storage.exists(blob.name)
+
+
+class BlobRefCountTests(BlobMixin, TestCase):
+    def test_identical_content_is_stored_once(self):
+        report, blob = self.attach_copies(3)
+        self.assertEqual((blob.ref_count, blob.content_type), (3, "application/pdf"))
+        self.assertEqual({a.file.name for a in report.attachments.all()}, {blob.name})
+        self.assertEqual(len(os.listdir(os.path.dirname(default_storage.path(blob.name)))), 1)
+
+    def test_last_reference_deletes_the_file(self):
+        report, blob = self.attach_copies(2)
+        first, last = report.attachments.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(self.stored(blob))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            last.delete()
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(self.stored(blob))
+
+    def test_file_is_kept_until_the_release_commits(self):
+        report, blob = self.attach_copies(2)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(_Rollback), transaction.atomic():
+                report.attachments.all().delete()
+                self.assertFalse(AttachmentBlob.objects.exists())
+                raise _Rollback
+        self.assertEqual(callbacks, [])
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+        self.assertTrue(self.stored(blob))
+
+
+class BlobConcurrentReleaseTests(BlobMixin, TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Threads cannot write concurrently to the in-memory SQLite test database.")
+        super().setUp()
+
+    def test_concurrent_releases_delete_the_blob_once(self):
+        report, blob = self.attach_copies(4)
+        barrier, errors = threading.Barrier(4), []
+
+        def release(attachment):
+            try:
+                with transaction.atomic():
+                    barrier.wait(timeout=10)
+                    attachment.delete()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=release, args=(a,)) for a in report.attachments.all()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(self.stored(blob))
+
+
+class _Rollback(Exception):
+    pass
+
+
+class TrackingCodeTests(TestCase):
+    key = bytes(range(16))
+
+    def test_scramble_is_a_permutation(self):
+        values = list(range(5000)) + [2 ** 50 - 1 - n for n in range(5000)]
+        scrambled = [scramble(value, self.key) for value in values]
+        self.assertEqual(len(set(scrambled)), len(values))
+        self.assertTrue(all(0 <= n < 2 ** 50 for n in scrambled))
+        self.assertNotEqual(scrambled[:10], values[:10])
+
+    def test_round_trip(self):
+        for value in (0, 1, 12345, 2 ** 50 - 1):
+            code = encode(value, self.key)
+            with self.subTest(code=code):
+                self.assertEqual(len(code), 12)
+                self.assertEqual(normalize_tracking_code(code), code)
+                self.assertEqual(normalize_tracking_code(f"  {code.lower()} "), code)
+                self.assertEqual(normalize_tracking_code(code.replace("1", "I").replace("0", "O")), code)
+        self.assertEqual(normalize_tracking_code("0123456789AB"), "0123456789AB")  # legacy uuid codes
+
+    def test_single_character_typos_are_caught(self):
+        for value in (7, 99991, 2 ** 49):
+            code = encode(value, self.key)
+            for position in range(1, len(code)):
+                for char in ALPHABET:
+                    if char != code[position]:
+                        typo = code[:position] + char + code[position + 1:]
+                        self.assertIsNone(normalize_tracking_code(typo), typo)
+
+    def test_allocations_are_unique(self):
+        first, second = TrackingCodeAllocator(), TrackingCodeAllocator()  # e.g. two worker processes
+        codes = first.allocate(150) + second.allocate(30) + first.allocate(150) + second.allocate(80)
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(normalize_tracking_code(code) == code for code in codes))
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "The exact in-transaction reservation is SQLite only.")
+    def test_sqlite_reserves_exactly_in_the_callers_transaction(self):
+        allocator = TrackingCodeAllocator()
+        allocator.allocate(1)  # creates the sequence row
+        before = TrackingCodeSequence.objects.get().next_value
+        with self.assertRaises(_Rollback), transaction.atomic():
+            self.assertEqual(len(allocator.allocate(7)), 7)
+            self.assertEqual(TrackingCodeSequence.objects.get().next_value, before + 7)
+            raise _Rollback
+        self.assertEqual(TrackingCodeSequence.objects.get().next_value, before)
+
+
+@unittest.skipIf(connection.vendor == "sqlite", "SQLite lets no second connection write during the caller's transaction.")
+class TrackingCodeReservationTests(TransactionTestCase):
+    def test_reservation_survives_the_callers_rollback(self):
+        allocator = TrackingCodeAllocator()
+        with self.assertRaises(_Rollback), transaction.atomic():
+            Report.objects.exists()
+            codes = allocator.allocate(3)
+            raise _Rollback
+        block = settings.TRACKING_CODE_BLOCK_SIZE
+        self.assertEqual(TrackingCodeSequence.objects.get().next_value, block)
+        # The rest of the block is still handed out, and other processes never reuse it
+        self.assertEqual(len(set(codes + allocator.allocate(block - 3) + TrackingCodeAllocator().allocate(3))), block + 3)
+
+
+class StubSeverityClassifier:
+    """Stands in for predict_severities(): records the texts and fails on call number `fail_on`."""
+
+    def __init__(self, fail_on=None):
+        self.texts, self.calls, self.fail_on = [], 0, fail_on
+
+    def __call__(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("model crashed")
+        self.texts += texts
+        return ["متوسطة"] * len(texts)
+
+
+class BackfillSeverityTests(TestCase):
+    def setUp(self):
+        self.reports = seed_reports(7, related=0)
+        for i, report in enumerate(self.reports):
+            Report.objects.filter(pk=report.pk).update(report_details=f"بلاغ {i}")
+        self.details = [f"بلاغ {i}" for i in range(7)]
+
+    def backfill(self, classifier, **options):
+        with mock.patch("reports.severity.predict_severities", side_effect=classifier):
+            call_command("backfill_severity", batch_size=1, chunk_size=3, stdout=io.StringIO(), **options)
+
+    def scored(self):
+        return Report.objects.filter(severity="متوسطة").count()
+
+    def test_resumes_after_the_last_committed_chunk(self):
+        crashing = StubSeverityClassifier(fail_on=5)  # second text of the second chunk
+        with self.assertRaisesMessage(RuntimeError, "model crashed"):
+            self.backfill(crashing)
+        self.assertEqual(self.scored(), 3)
+        checkpoint = BackfillCheckpoint.objects.get()
+        self.assertEqual((checkpoint.last_id, checkpoint.written), (self.reports[2].pk, 3))
+
+        resumed = StubSeverityClassifier()
+        self.backfill(resumed)
+        self.assertEqual(resumed.texts, self.details[3:])
+        self.assertEqual(self.scored(), 7)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.last_id, checkpoint.processed, checkpoint.written), (self.reports[-1].pk, 7, 7))
+
+    def test_restart_starts_from_the_first_report(self):
+        self.backfill(StubSeverityClassifier())
+        for report in Report.objects.all():  # unscored again, through the signals that keep the rollups
+            report.severity = None
+            report.save(update_fields=["severity"])
+        resumed = StubSeverityClassifier()
+        self.backfill(resumed)
+        self.assertEqual((resumed.texts, self.scored()), ([], 0))
+
+        restarted = StubSeverityClassifier()
+        self.backfill(restarted, restart=True)
+        self.assertEqual(restarted.texts, self.details)
+        self.assertEqual(self.scored(), 7)
+        self.assertEqual(BackfillCheckpoint.objects.get().written, 7)
+
+    def test_dry_run_writes_nothing(self):
+        classifier = StubSeverityClassifier()
+        self.backfill(classifier, dry_run=True)
+        self.assertEqual(classifier.texts, self.details)
+        self.assertEqual(self.scored(), 0)
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+
+class MicroBatcherTests(TestCase):
+    def test_wrong_result_count_fails_every_caller(self):
+        batcher = MicroBatcher(lambda items: [], max_batch=4, max_wait=0.05, timeout=5)
+        futures = [batcher.submit(n) for n in range(3)]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, "returned 0 results"):
+                future.result(5)
+
+    def test_callers_wait_at_most_the_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        batcher = MicroBatcher(lambda items: release.wait(5) and items, max_wait=0, timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            batcher.map(["a", "b"])
+        release.set()
+        self.assertEqual(batcher("c", timeout=5), "c")
+
+    def test_bench_rejects_too_few_requests_or_clients(self):
+        for options in [{"requests": 1}, {"clients": 0}]:
+            with self.subTest(**options), self.assertRaisesMessage(CommandError, "at least"):
+                call_command("bench_severity", simulate=True, stdout=io.StringIO(), **options)
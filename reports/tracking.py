@@ -0,0 +1,270 @@
+"""
+In-process index for the public tracking endpoint.
+
+- A Bloom filter of every tracking code answers "no such report" without a query.
+- A bounded LRU keeps tracking payloads of recently looked-up reports.
+
+Writes in this process update both right away. Writes in other workers are published to the
+shared cache (TRACKING_CACHE_ALIAS) as a version key plus a short changelog: new codes are
+added to the filter, and only the LRU entries of reports whose payload changed are dropped
+(the whole LRU when the changelog is incomplete or after bulk writes). With a per-process
+cache, misses older than TRACKING_INDEX_MAX_AGE seconds reload new codes and LRU entries
+expire after TRACKING_CACHE_TTL.
+
+Lookups never wait for the DB while holding the index lock: filter loads run outside it
+(one at a time) and the results are swapped in under it.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import Report
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "reports:tracking_version"
+CHANGE_KEY = "reports:tracking_change"  # CHANGE_KEY:<version> -> (kind, tracking code)
+CHANGELOG_SIZE = 1000  # versions behind after which a worker drops its whole LRU instead
+CHANGELOG_TTL = 60 * 60
+
+# Report columns a tracking payload shows (ReportTrackingSerializer, besides the id)
+PAYLOAD_FIELDS = ("tracking_code", "status", "report_type", "created_at")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ------------------------------- Bloom filter -------------------------------------------
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+# ------------------------------- Tracking index -----------------------------------------
+class TrackingIndex:
+    """Bloom filter of tracking codes + LRU of tracking payloads (thread safe)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()  # guards the structures below, never held during a query
+        self._load_lock = threading.Lock()  # one filter load / refresh at a time
+        self._bloom = None
+        self._loaded_at = None  # wall clock of the last load, for the created_at lookback
+        self._refreshed_at = 0.0
+        self._version = None
+        self._stale = False
+        self._lru = OrderedDict()  # tracking_code -> (payload, stored_at)
+
+    # --- shared version and changelog ---
+    @staticmethod
+    def _cache():
+        return caches[_setting("TRACKING_CACHE_ALIAS", "default")]
+
+    def _shared_version(self):
+        return self._cache().get(VERSION_KEY)
+
+    def publish(self, code=None, added=False):
+        """
+        Tell the other workers that `code` was added (added=True) or that its payload changed
+        or it was deleted. Without a code: reports were inserted in bulk (added=True), or any
+        report may have changed.
+        """
+        cache = self._cache()
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:  # evicted between add and incr: readers drop everything
+            cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
+            return
+        kind = ("added" if code else "new") if added else ("changed" if code else "stale")
+        cache.set(f"{CHANGE_KEY}:{version}", (kind, code), timeout=CHANGELOG_TTL)
+
+    def _changes(self, seen, version):
+        """The changelog entries between two versions, or None when some are unknown."""
+        seen = 0 if seen is None else seen  # nothing published yet: the log starts at 1
+        if not isinstance(seen, int) or not isinstance(version, int) or not 0 < version - seen <= CHANGELOG_SIZE:
+            return None
+        keys = [f"{CHANGE_KEY}:{n}" for n in range(seen + 1, version + 1)]
+        found = self._cache().get_many(keys)
+        if len(found) < len(keys):
+            return None
+        return [found[key] for key in keys]
+
+    def _sync(self):
+        seen = self._version
+        version = self._shared_version()
+        if version == seen:
+            return
+        changes = self._changes(seen, version)
+        with self._lock:
+            if self._version != seen:
+                return  # applied by another thread meanwhile
+            self._version = version
+            if changes is None or any(kind == "stale" for kind, _ in changes):
+                self._lru.clear()
+                self._stale = True
+                return
+            for kind, code in changes:
+                if kind == "added":
+                    self._add(code)
+                elif kind == "new":
+                    self._stale = True  # reload new codes on the next miss, payloads are still valid
+                else:
+                    self._lru.pop(code, None)
+
+    # --- filter maintenance ---
+    def _add(self, code):
+        if self._bloom is not None and code not in self._bloom:
+            self._bloom.add(code)
+
+    def rebuild(self, chunk_size=5000):
+        """Load every tracking code (one streamed query over the unique index)."""
+        with self._load_lock:
+            return self._rebuild(chunk_size)
+
+    def _rebuild(self, chunk_size=5000):
+        qs = Report.objects.order_by().values_list("tracking_code", flat=True)
+        loaded_at, version = timezone.now(), self._shared_version()
+        bloom = BloomFilter(max(2 * qs.count(), _setting("TRACKING_INDEX_MIN_CAPACITY", 10000)))
+        for code in qs.iterator(chunk_size=chunk_size):
+            bloom.add(code)
+        with self._lock:
+            self._bloom, self._loaded_at = bloom, loaded_at
+            self._version = version
+            self._refreshed_at, self._stale = time.monotonic(), False
+            self._lru.clear()
+        return bloom.count
+
+    def _refresh(self):
+        """
+        Add codes of recently created reports (full rebuild once the filter is full).
+        Looks back TRACKING_INDEX_LOOKBACK seconds before the last load, so rows from
+        transactions that committed after it (with older created_at / ids) are not missed.
+        """
+        with self._load_lock:
+            if self._bloom is not None and not self._needs_refresh():
+                return  # another thread refreshed while this one waited
+            if self._bloom is None or self._bloom.full:
+                self._rebuild()
+                return
+            with self._lock:
+                # Cleared before the query: a change published while it runs marks it stale again
+                self._refreshed_at, self._stale = time.monotonic(), False
+                since = self._loaded_at - timedelta(seconds=_setting("TRACKING_INDEX_LOOKBACK", 300))
+            loaded_at = timezone.now()
+            try:
+                recent = list(
+                    Report.objects.filter(created_at__gte=since).order_by().values_list("tracking_code", flat=True)
+                )
+            except Exception:
+                self._stale = True
+                raise
+            with self._lock:
+                for code in recent:
+                    self._add(code)
+                self._loaded_at = loaded_at
+
+    def _needs_refresh(self):
+        return self._stale or time.monotonic() - self._refreshed_at > _setting("TRACKING_INDEX_MAX_AGE", 5)
+
+    # --- lookups ---
+    def lookup(self, code, load):
+        """
+        Tracking payload for `code`, or None if no report has it.
+        `load(code)` fetches the payload from the DB and returns None when missing.
+        """
+        self._sync()
+        if self._bloom is None:
+            self._refresh()
+
+        with self._lock:
+            entry = self._lru.get(code)
+            if entry is not None and time.monotonic() - entry[1] <= _setting("TRACKING_CACHE_TTL", 60):
+                self._lru.move_to_end(code)
+                return entry[0]
+            known = code in self._bloom
+            if not known and not self._needs_refresh():
+                return None  # answered without touching the DB
+
+        if not known:
+            self._refresh()
+            with self._lock:
+                if code not in self._bloom:
+                    return None
+
+        payload = load(code)
+        if payload is not None:
+            self.remember(code, payload)
+        return payload
+
+    def remember(self, code, payload):
+        with self._lock:
+            self._lru[code] = (payload, time.monotonic())
+            self._lru.move_to_end(code)
+            while len(self._lru) > _setting("TRACKING_CACHE_SIZE", 10000):
+                self._lru.popitem(last=False)
+
+    # --- write hooks ---
+    def added(self, code):
+        with self._lock:
+            self._add(code)
+
+    def added_many(self, codes):
+        with self._lock:
+            for code in codes:
+                self._add(code)
+
+    def mark_stale(self):
+        """Reports were written around Report.save(): reload new codes on the next miss."""
+        with self._lock:
+            self._stale = True
+            self._lru.clear()
+
+    def forget(self, code):
+        # Removed codes stay in the filter: a later lookup costs one query and returns None
+        with self._lock:
+            self._lru.pop(code, None)
+
+
+tracking_index = TrackingIndex()
+
+
+def warm_tracking_index():
+    """Build the filter at worker start; on DB errors it is built by the first lookup instead."""
+    try:
+        return tracking_index.rebuild()
+    except DatabaseError:
+        logger.warning("Tracking index not warmed, it will be built on first use.", exc_info=True)
+        return None
@@ -0,0 +1,162 @@
+"""
+Tracking code allocation.
+
+New codes are 'S' + 10 Crockford base32 characters + 1 check character (12 in total):
+- the 10 characters encode a 50-bit sequence number from TrackingCodeSequence,
+  scrambled by a keyed Feistel permutation, so codes are unique by construction
+  but do not reveal how many reports exist or which code comes next;
+- the check character (Luhn mod 32) catches every single-character typo and most
+  transpositions, so mistyped codes are rejected without a lookup.
+
+Numbers are reserved in blocks, so bulk inserts can assign codes without Report.save().
+Legacy codes (12 upper-case hex characters from uuid4) stay valid.
+"""
+import hashlib
+import re
+import secrets
+import threading
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+
+PREFIX = "S"
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"  # Crockford base32 (no I, L, O, U)
+BODY_LENGTH = 10
+HALF_BITS = BODY_LENGTH * 5 // 2  # Feistel half width: 25 bits
+ROUNDS = 4
+
+SEQUENCE_NAME = "tracking_code"
+LEGACY_RE = re.compile(r"^[0-9A-F]{12}$")
+# Crockford decoding: lower case is accepted, I / L read as 1, O as 0
+_TYPO_MAP = str.maketrans({"I": "1", "L": "1", "O": "0"})
+_VALUES = {char: i for i, char in enumerate(ALPHABET)}
+
+
+# ------------------------------- Encoding ---------------------------------------------
+def _round(key, number, value):
+    digest = hashlib.blake2b(value.to_bytes(4, "big"), digest_size=4, key=key, person=bytes([number]) * 16).digest()
+    return int.from_bytes(digest, "big") & ((1 << HALF_BITS) - 1)
+
+
+def scramble(value, key):
+    """Keyed permutation of the 50-bit numbers (balanced Feistel network)."""
+    mask = (1 << HALF_BITS) - 1
+    left, right = value >> HALF_BITS, value & mask
+    for number in range(ROUNDS):
+        left, right = right, left ^ _round(key, number, right)
+    return (left << HALF_BITS) | right
+
+
+def check_character(payload):
+    """Luhn mod 32 check character of a string over ALPHABET."""
+    total, factor = 0, 2
+    for char in reversed(payload):
+        addend = factor * _VALUES[char]
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def encode(value, key):
+    number = scramble(value, key)
+    body = "".join(ALPHABET[(number >> shift) & 31] for shift in range(5 * (BODY_LENGTH - 1), -1, -5))
+    return PREFIX + body + check_character(PREFIX + body)
+
+
+def normalize_tracking_code(code):
+    """
+    Canonical form of a user-typed code, or None if it cannot be a valid code
+    (wrong shape or a failed check character).
+    """
+    code = (code or "").strip().upper()
+    if LEGACY_RE.match(code):
+        return code
+    code = code.translate(_TYPO_MAP)
+    if len(code) != BODY_LENGTH + 2 or not code.startswith(PREFIX) or any(c not in _VALUES for c in code):
+        return None
+    return code if check_character(code[:-1]) == code[-1] else None
+
+
+# ------------------------------- Allocation -------------------------------------------
+class TrackingCodeAllocator:
+    """
+    Hands out tracking codes from blocks reserved in TrackingCodeSequence and kept for later calls.
+    Blocks are always reserved in a transaction of their own: callers inside a transaction get
+    them from a short-lived connection in a helper thread, so the sequence row is never locked
+    until the caller commits (which would queue every other report POST and import behind it).
+    A rollback only burns numbers, and codes just have to be unique.
+    On SQLite the caller's transaction locks the whole database, so a second connection could
+    not write before it commits: there exactly the needed numbers are reserved in that transaction.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._key = None
+
+    @staticmethod
+    def _reserve(count):
+        """First number of `count` consecutive reserved numbers, and the Feistel key."""
+        from .models import TrackingCodeSequence
+
+        sequence = TrackingCodeSequence.objects.filter(name=SEQUENCE_NAME)
+        with transaction.atomic():
+            TrackingCodeSequence.objects.get_or_create(name=SEQUENCE_NAME, defaults={"key": secrets.token_hex(16)})
+            # UPDATE first: it takes the row (or database) write lock before anything is read
+            sequence.update(next_value=F("next_value") + count)
+            end, key = sequence.values_list("next_value", "key").get()
+        return end - count, bytes.fromhex(key)
+
+    @classmethod
+    def _reserve_autocommit(cls, count):
+        """_reserve() on this thread's own connection, committed before it returns."""
+        result = {}
+
+        def reserve():
+            try:
+                result["block"] = cls._reserve(count)
+            except Exception as e:
+                result["error"] = e
+            finally:
+                connections.close_all()  # the helper thread's connections
+
+        thread = threading.Thread(target=reserve, name="tracking-code-reserve")
+        thread.start()
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["block"]
+
+    def allocate(self, count):
+        """`count` new, unique tracking codes."""
+        if count <= 0:
+            return []
+        in_transaction = connection.in_atomic_block
+        if in_transaction and connection.vendor == "sqlite":
+            start, key = self._reserve(count)
+            return [encode(value, key) for value in range(start, start + count)]
+
+        with self._lock:
+            codes = []
+            while len(codes) < count:
+                if self._next == self._end:
+                    block = max(count - len(codes), getattr(settings, "TRACKING_CODE_BLOCK_SIZE", 100))
+                    reserve = self._reserve_autocommit if in_transaction else self._reserve
+                    self._next, self._key = reserve(block)
+                    self._end = self._next + block
+                take = min(count - len(codes), self._end - self._next)
+                codes += [encode(value, self._key) for value in range(self._next, self._next + take)]
+                self._next += take
+            return codes
+
+
+allocator = TrackingCodeAllocator()
+
+
+def allocate_tracking_codes(count):
+    return allocator.allocate(count)
+
+
+def new_tracking_code():
+    return allocator.allocate(1)[0]
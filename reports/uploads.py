@@ -0,0 +1,160 @@
+"""
+Resumable attachment uploads.
+
+A client opens an UploadSession (file name + total size), sends the bytes in one or more
+PUT requests carrying `Content-Range: bytes start-end/total`, and finally attaches the
+completed upload to its report. Each chunk is streamed from the request straight into a
+part file under MEDIA_ROOT in small reads, so memory stays bounded whatever the file size.
+The session offset only moves once bytes are on disk: after a dropped connection the
+client asks for the session and resumes from `offset`.
+
+The endpoints are open to anonymous reporters, so they are rate limited per client address
+(the "uploads" and "upload_chunks" scopes of DEFAULT_THROTTLE_RATES), every chunk is checked
+against REPORTS_UPLOAD_MAX_SIZE, and run_jobs purges uploads never attached within REPORTS_UPLOAD_TTL.
+"""
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.throttling import AnonRateThrottle
+
+from .blobs import new_attachment, store_path
+from .models import UploadSession
+
+PARTIAL_DIR = os.path.join("uploads", "partial")
+READ_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The upload is not at this offset."
+    default_code = "conflict"
+
+
+class UploadRateThrottle(AnonRateThrottle):
+    """Upload sessions an anonymous client may open."""
+    scope = "uploads"
+
+
+class UploadChunkRateThrottle(AnonRateThrottle):
+    """Chunk, progress and attach requests of an anonymous client."""
+    scope = "upload_chunks"
+
+
+def max_upload_size():
+    return getattr(settings, "REPORTS_UPLOAD_MAX_SIZE", 100 * 1024 * 1024)
+
+
+def max_chunk_size():
+    return getattr(settings, "REPORTS_UPLOAD_MAX_CHUNK", 8 * 1024 * 1024)
+
+
+def lease_seconds():
+    return getattr(settings, "REPORTS_UPLOAD_LEASE", 300)
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f"{session.pk}.part")
+
+
+def parse_content_range(value, session):
+    """'bytes start-end/total' -> (start, length), checked against the session."""
+    match = _CONTENT_RANGE.match(value or "")
+    if not match:
+        raise ValidationError({"Content-Range": "Send 'bytes start-end/total'."})
+    start, end, total = (int(g) for g in match.groups())
+    if total != session.size or end < start or end >= total:
+        raise ValidationError({"Content-Range": f"Range must lie within 0-{session.size - 1}/{session.size}."})
+    if end >= max_upload_size():  # the limit may have been lowered since the session was opened
+        raise ValidationError({"Content-Range": f"Uploads are limited to {max_upload_size()} bytes."})
+    length = end - start + 1
+    if length > max_chunk_size():
+        raise ValidationError({"Content-Range": f"Chunks are limited to {max_chunk_size()} bytes."})
+    return start, length
+
+
+def write_chunk(session, start, length, stream):
+    """
+    Append `length` bytes read from `stream` at `start` (which must be the session offset).
+    A lease on the session row keeps two requests from writing the same upload at once;
+    whatever reached the disk is acknowledged even if the client disconnects mid-chunk.
+    Returns the new offset.
+    """
+    if session.attachment_id is not None:
+        raise UploadConflict("This upload is already attached.")
+    now = timezone.now()
+    claimed = (
+        UploadSession.objects
+        .filter(pk=session.pk, offset=start, attachment__isnull=True)
+        .exclude(lease_until__gt=now)
+        .update(lease_until=now + timedelta(seconds=lease_seconds()))
+    )
+    if not claimed:
+        session.refresh_from_db(fields=["offset"])
+        raise UploadConflict(f"Resume from offset {session.offset}.")
+
+    written = 0
+    try:
+        path = partial_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(start)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+    finally:
+        UploadSession.objects.filter(pk=session.pk).update(
+            offset=start + written, lease_until=None, updated_at=timezone.now()
+        )
+    session.offset = start + written
+    if written < length:
+        raise ValidationError({"detail": f"Received {written} of {length} bytes.", "offset": session.offset})
+    return session.offset
+
+
+def attach_upload(session_id, report):
+    """Store a complete upload as a blob and attach it to `report` (idempotent)."""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related("attachment").get(pk=session_id)
+        if session.attachment is not None:
+            if session.attachment.report_id != report.pk:
+                raise UploadConflict("This upload is attached to another report.")
+            return session.attachment
+        if session.offset < session.size:
+            raise UploadConflict(f"Upload incomplete: {session.offset} of {session.size} bytes received.")
+
+        source = partial_path(session)
+        if not os.path.exists(source):
+            raise UploadConflict("The uploaded data is no longer available; upload the file again.")
+        with open(source, "r+b") as f:
+            f.truncate(session.size)  # drop bytes of an unacknowledged retry
+        attachment = new_attachment(report, store_path(source))
+        attachment.save()
+        session.attachment = attachment
+        session.save(update_fields=["attachment", "updated_at"])
+    return attachment
+
+
+def purge_stale_uploads(max_age):
+    """Delete sessions never attached within `max_age` seconds, with their part files. Returns the count."""
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = UploadSession.objects.filter(attachment__isnull=True, updated_at__lt=cutoff)
+    count = 0
+    for session in stale.iterator():
+        try:
+            os.remove(partial_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
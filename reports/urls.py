@@ -4,6 +4,12 @@ from .views import (
     ReportRetrieveUpdateDestroyView,
     ReportTrackView,
     ReportArchiveListView,
+    ReportBatchCreateView,
+    UploadSessionCreateView,
+    UploadSessionDetailView,
+    UploadSessionAttachView,
+    ModelStatusView,
+    JobStatusView,
 )
 
 urlpatterns = [
@@ -17,4 +23,18 @@ urlpatterns = [
     path('reports/track/<str:tracking_code>/', ReportTrackView.as_view(), name='report-track'),
 
     path('reports/archive/', ReportArchiveListView.as_view(), name='report-archive-list'),
+
+    # POST many reports at once (JSON array or NDJSON)
+    path('reports/batch/', ReportBatchCreateView.as_view(), name='report-batch-create'),
+
+    # Resumable attachment uploads: open, PUT byte ranges / GET progress, attach to a report
+    path('reports/uploads/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('reports/uploads/<uuid:id>/', UploadSessionDetailView.as_view(), name='upload-session-detail'),
+    path('reports/uploads/<uuid:id>/attach/', UploadSessionAttachView.as_view(), name='upload-session-attach'),
+
+    # Severity model load state and worker memory (Admin)
+    path('reports/models/status/', ModelStatusView.as_view(), name='model-status'),
+
+    # Background job queue depth (Admin)
+    path('reports/jobs/status/', JobStatusView.as_view(), name='job-status'),
 ]
\ No newline at end of file
@@ -1,30 +1,91 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions, status
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
-from .models import Report
-from .serializers import ReportNestedSerializer, ReportTrackingSerializer, ReportViewerSerializer
-# from .ml_model import predict_severity
+from .fieldsets import project, requested_fields, values_projection
+from .filters import filter_reports
+from .importing import bulk_insert_reports
+from .jobs import backlog
+from .ml_model import inference_settings, process_memory, registry as model_registry, severity_batcher
+from .models import Report, UploadSession, ARCHIVED_STATUSES
+from .pagination import ReportCursorPagination
+from .parsers import NDJSONParser
+from .serializers import (
+    ReportNestedSerializer, ReportTrackingSerializer, ReportViewerSerializer, ReportBatchItemSerializer,
+    UploadSessionSerializer, AttachmentNestedSerializer,
+)
+from .severity import queue_severity_scoring
+from .tracking import tracking_index
+from .tracking_codes import normalize_tracking_code
+from .uploads import UploadChunkRateThrottle, UploadRateThrottle, attach_upload, parse_content_range, write_chunk
 
 # ----------------------------- Helper ------------------------------------
 def is_active_user(user):
     return user.is_authenticated and user.status == 'active'
 
+class SparseFieldsetMixin:
+    """
+    ?fields=a,b on GET: the serializer drops the other fields and the SQL loads only their columns.
+    Serializers flagged `values_fast_path` are rendered straight from values() rows.
+    """
+    def sparse_fields(self):
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = requested_fields(self.request, self.get_serializer_class())
+        return self._sparse_fields
+
+    def project_queryset(self, queryset):
+        if self.request.method != "GET":
+            return queryset  # writes need complete instances
+        return project(queryset, self.sparse_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == "GET":
+            kwargs["fields"] = self.sparse_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_projection(self):
+        serializer_class = self.get_serializer_class()
+        if self.request.method == "GET" and getattr(serializer_class, "values_fast_path", False):
+            return values_projection(serializer_class, tuple(self.sparse_fields()))
+        return None
+
+    def list(self, request, *args, **kwargs):
+        projection = self.get_values_projection()
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.render(page))
+        return Response(projection.render(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        projection = self.get_values_projection()
+        if projection is None:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(queryset, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return Response(projection.render_one(row))
+
 # ----------------------------List & create reports--------------------------
-class ReportListCreateView(generics.ListCreateAPIView):
+class ReportListCreateView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Create a new Report along with optional CriminalInfo and Attachments.
     Handles JSON parsing for criminals and differentiates audio/file attachments.
     """
     parser_classes = (MultiPartParser, FormParser)
+    pagination_class = ReportCursorPagination
 
     def perform_create(self, serializer):
         instance = serializer.save()
-        # ------------------ AI Model Part (Commented for GitHub) ------------------
-        # if instance.report_details:
-        #     from .ml_model import predict_severity
-        #     instance.severity = predict_severity(instance.report_details)
-        #     instance.save(update_fields=["severity"])
-        # --------------------------------------------------------------------------
+        # Severity is predicted by the job worker (run_jobs), not while the reporter waits
+        queue_severity_scoring([instance])
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -48,18 +109,66 @@ class ReportListCreateView(generics.ListCreateAPIView):
         Anonymous: none.
         """
         user = self.request.user
-        qs = Report.objects.exclude(status__in=["تم الحل", "تم الإغلاق"]).order_by('id')
+        qs = Report.objects.exclude(status__in=ARCHIVED_STATUSES)
 
         if not is_active_user(user):
             return Report.objects.none()  # inactive or anonymous users see nothing
-        return qs
+        qs = self.project_queryset(qs)
+        return filter_reports(qs, self.request.query_params)  # ordering comes from the paginator
+
+# ----------------------------Batch create (partner organisations)--------------------------
+class ReportBatchCreateView(generics.GenericAPIView):
+    """
+    Create many reports in one request: a JSON array, {"reports": [...]} or NDJSON.
+    Items may carry criminal_infos (no attachments). Every item is validated, the valid ones
+    are inserted together in one transaction, and each item gets its tracking code or errors.
+    """
+    parser_classes = (JSONParser, NDJSONParser)
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ReportBatchItemSerializer
+
+    def post(self, request, *args, **kwargs):
+        user = request.user
+        if not is_active_user(user):
+            return Response({"detail": "Inactive user."}, status=status.HTTP_403_FORBIDDEN)
+        if user.role not in ["Admin", "Employee"]:
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        items = request.data.get("reports") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Send a non-empty list of reports."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, "REPORTS_BATCH_MAX_ITEMS", 500)
+        if len(items) > limit:
+            return Response({"detail": f"At most {limit} reports per batch."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, valid = [], []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({"index": index, "errors": serializer.errors})
+
+        if valid:
+            reports = [Report(**{k: v for k, v in data.items() if k != "criminal_infos"}) for _, data in valid]
+            with transaction.atomic():
+                bulk_insert_reports(reports, [data.get("criminal_infos", []) for _, data in valid])
+                queue_severity_scoring(reports)
+            for (index, _), report in zip(valid, reports):
+                results[index] = {"index": index, "id": report.pk, "tracking_code": report.tracking_code}
+
+        failed = len(items) - len(valid)
+        code = status.HTTP_201_CREATED if not failed else (status.HTTP_207_MULTI_STATUS if valid else status.HTTP_400_BAD_REQUEST)
+        return Response({"created": len(valid), "failed": failed, "results": results}, status=code)
 
 # -------------------------------Archived reports------------------------------------------
-class ReportArchiveListView(generics.ListAPIView):
+class ReportArchiveListView(SparseFieldsetMixin, generics.ListAPIView):
     """
     List reports that are archived (status solved/closed).
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReportCursorPagination
 
     def get_serializer_class(self):
         user = self.request.user
@@ -71,14 +180,15 @@ class ReportArchiveListView(generics.ListAPIView):
         user = self.request.user
         if not is_active_user(user):
             return Report.objects.none()
-        return Report.objects.filter(status__in=["تم الحل", "تم الإغلاق"]).order_by('id')
+        qs = Report.objects.filter(status__in=ARCHIVED_STATUSES)
+        qs = self.project_queryset(qs)
+        return filter_reports(qs, self.request.query_params)
 
 # -----------------------------Retrieve, update, or delete a report----------------------------
-class ReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ReportRetrieveUpdateDestroyView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a specific report by id.
     """
-    queryset = Report.objects.all()
     lookup_field = "id"
 
     def get_serializer_class(self):
@@ -87,6 +197,9 @@ class ReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return ReportViewerSerializer
         return ReportNestedSerializer
 
+    def get_queryset(self):
+        return self.project_queryset(Report.objects.all())
+
     def get_permissions(self):
         return [permissions.IsAuthenticated()]
 
@@ -116,12 +229,131 @@ class ReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
 
 # ------------------------Track a report using tracking_code-----------------------
-class ReportTrackView(generics.RetrieveAPIView):
+class ReportTrackView(SparseFieldsetMixin, generics.RetrieveAPIView):
     """
     Retrieve a report using its tracking_code.
     Used by anonymous users to track their report status.
     """
-    queryset = Report.objects.all()
     serializer_class = ReportTrackingSerializer
     lookup_field = "tracking_code"
     permission_classes = [permissions.AllowAny]  # => Open to everyone
+
+    def get_queryset(self):
+        return self.project_queryset(Report.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Malformed codes (bad shape or check character) are rejected before any lookup,
+        unknown codes by the tracking index; known ones are served from its LRU.
+        """
+        code = normalize_tracking_code(kwargs[self.lookup_field])
+        payload = tracking_index.lookup(code, self.load_payload) if code else None
+        if payload is None:
+            raise Http404("No Report matches the given query.")
+        return Response({name: payload[name] for name in self.sparse_fields()})
+
+    def load_payload(self, tracking_code):
+        fields = tuple(ReportTrackingSerializer.Meta.fields)
+        projection = values_projection(ReportTrackingSerializer, fields)
+        row = projection.values(Report.objects.filter(tracking_code=tracking_code)).first()
+        return projection.render_one(row) if row is not None else None
+
+# ----------------------------Resumable attachment uploads--------------------------
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    POST {filename, size}: open a resumable upload. Open to everyone, like report submission,
+    but rate limited per client; the returned session id is the only key to the upload.
+    """
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [UploadRateThrottle]
+    serializer_class = UploadSessionSerializer
+
+
+class UploadSessionDetailView(generics.RetrieveAPIView):
+    """
+    GET: upload progress (resume from `offset`).
+    PUT with `Content-Range: bytes start-end/total` and the raw bytes as body: store one chunk.
+    The body is streamed to disk, never parsed or buffered.
+    """
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [UploadChunkRateThrottle]
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    lookup_field = "id"
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        start, length = parse_content_range(request.headers.get("Content-Range"), session)
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            content_length = 0
+        if content_length != length:
+            return Response({"detail": "Content-Length must match Content-Range."}, status=status.HTTP_400_BAD_REQUEST)
+        write_chunk(session, start, length, request.stream)
+        return Response(self.get_serializer(session).data)
+
+
+class UploadSessionAttachView(generics.GenericAPIView):
+    """
+    POST {tracking_code}: attach a complete upload to the report with that tracking code.
+    Repeating the call returns the same attachment.
+    """
+    parser_classes = (JSONParser, FormParser)
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [UploadChunkRateThrottle]
+    queryset = UploadSession.objects.all()
+    lookup_field = "id"
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_object()
+        code = normalize_tracking_code(str(request.data.get("tracking_code", "")))
+        report = Report.objects.filter(tracking_code=code).first() if code else None
+        if report is None:
+            raise Http404("No Report matches the given query.")
+        attachment = attach_upload(session.pk, report)
+        data = AttachmentNestedSerializer(attachment, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+# ----------------------------ML model status--------------------------
+class ModelStatusView(generics.GenericAPIView):
+    """
+    Admin only: which models this worker process has loaded, how long loading took,
+    and the process memory (shared pages include weights inherited from a preloading master).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        if not is_active_user(user):
+            return Response({"detail": "Inactive user."}, status=status.HTTP_403_FORBIDDEN)
+        if user.role != "Admin":
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            "pid": os.getpid(),
+            "models": model_registry.status(),
+            "inference": inference_settings(),
+            "batching": severity_batcher.stats(),
+            "memory": process_memory(),
+        })
+
+
+# ----------------------------Background job backlog--------------------------
+class JobStatusView(generics.GenericAPIView):
+    """
+    Admin only: depth of the background job queue per kind (runnable / delayed for retry /
+    running / failed, age of the oldest runnable job) and how many reports await a severity.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        if not is_active_user(user):
+            return Response({"detail": "Inactive user."}, status=status.HTTP_403_FORBIDDEN)
+        if user.role != "Admin":
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            "jobs": backlog(),
+            "unscored_reports": Report.objects.filter(severity__isnull=True).count(),
+        })